@@ -0,0 +1,296 @@
+"""
+Helpers for pyopencl arrays used with gpyfft.
+
+In-place real-to-complex and complex-to-real transforms use the
+standard padded storage: the (last) real axis of length n is padded
+to 2*(n//2+1) elements, so the same buffer can hold the n//2+1 complex
+results. `empty_padded` and `zeros_padded` allocate such arrays,
+`complex_view` and `real_view` reinterpret them without copying.
+"""
+
+from __future__ import absolute_import, division, print_function
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+
+_ctypes = {np.dtype(np.float32): 'float',
+           np.dtype(np.float64): 'double',
+           np.dtype(np.complex64): 'float2',
+           np.dtype(np.complex128): 'double2',
+          }
+
+_kernels = {}
+
+
+def _component(array):
+    """first (real part) array of planar (real, imag) pair, array itself otherwise"""
+    if isinstance(array, tuple):
+        return array[0]
+    return array
+
+
+def padded_shape(shape, axis=-1):
+    """storage shape of real array for in-place real transforms along axis"""
+    shape = list(shape)
+    shape[axis] = 2*(shape[axis]//2 + 1)
+    return tuple(shape)
+
+
+def _padded(alloc, queue, shape, dtype, allocator, axis):
+    dtype = np.dtype(dtype)
+    assert dtype in (np.float32, np.float64), 'expected real dtype'
+    storage = alloc(queue, padded_shape(shape, axis), dtype, allocator=allocator)
+    index = [slice(None)] * len(shape)
+    index[axis] = slice(0, shape[axis])
+    return storage[tuple(index)]
+
+
+def empty_padded(queue, shape, dtype=np.float32, allocator=None, axis=-1):
+    """real array with padded storage, suitable for in-place real transforms"""
+    return _padded(cla.empty, queue, shape, dtype, allocator, axis)
+
+
+def zeros_padded(queue, shape, dtype=np.float32, allocator=None, axis=-1):
+    """zero-filled real array with padded storage, see `empty_padded`"""
+    return _padded(cla.zeros, queue, shape, dtype, allocator, axis)
+
+
+def complex_view(array, axis=-1):
+    """complex array of length n//2+1 along axis, sharing storage of padded real array"""
+    dtype = np.dtype(array.dtype)
+    assert dtype in (np.float32, np.float64), 'expected real array'
+    cdtype = np.dtype(np.complex64 if dtype == np.float32 else np.complex128)
+    axis = axis % array.ndim
+    assert array.strides[axis] == dtype.itemsize, 'padded axis must be contiguous'
+    assert array.offset % cdtype.itemsize == 0
+
+    shape = list(array.shape)
+    shape[axis] = shape[axis]//2 + 1
+    strides = list(array.strides)
+    strides[axis] = cdtype.itemsize
+    for a in range(array.ndim):
+        if a != axis and shape[a] > 1:
+            assert strides[a] % cdtype.itemsize == 0 and strides[a] >= shape[axis] * cdtype.itemsize, \
+                'array is not padded for in-place real transform'
+    nbytes = array.offset + sum((n-1)*abs(s) for n, s in zip(shape, strides)) + cdtype.itemsize
+    assert nbytes <= array.base_data.size, 'array is not padded for in-place real transform'
+
+    return cla.Array(array.queue, tuple(shape), cdtype, strides=tuple(strides),
+                     data=array.base_data, offset=array.offset)
+
+
+def real_view(array, n=None, axis=-1):
+    """real array of length n along axis, sharing storage of complex array
+
+    Inverse of `complex_view`. Default `n`: 2*(m-1) for complex length m.
+    """
+    cdtype = np.dtype(array.dtype)
+    assert cdtype in (np.complex64, np.complex128), 'expected complex array'
+    dtype = np.dtype(np.float32 if cdtype == np.complex64 else np.float64)
+    axis = axis % array.ndim
+    assert array.strides[axis] == cdtype.itemsize, 'padded axis must be contiguous'
+    m = array.shape[axis]
+    if n is None:
+        n = 2*(m - 1)
+    if n//2 + 1 != m:
+        raise ValueError('length %d does not match complex length %d' % (n, m))
+
+    shape = list(array.shape)
+    shape[axis] = n
+    strides = list(array.strides)
+    strides[axis] = dtype.itemsize
+    return cla.Array(array.queue, tuple(shape), dtype, strides=tuple(strides),
+                     data=array.base_data, offset=array.offset)
+
+
+def _transform_output(shape, dtype, axes, real=False, out_shape=None):
+    """shape and dtype of transform result, returns (out_shape, out_dtype)
+
+    real input dtypes select real-to-complex transforms (first
+    transform axis shortened to n//2+1), `real` selects
+    complex-to-real transforms, which need `out_shape`.
+    """
+    dtype = np.dtype(dtype)
+    if dtype in (np.float32, np.float64):
+        out_dtype = np.dtype(np.complex64 if dtype == np.float32 else np.complex128)
+        out_shape = list(shape)
+        out_shape[axes[0]] = shape[axes[0]]//2 + 1
+    elif real:
+        out_dtype = np.dtype(np.float32 if dtype == np.complex64 else np.float64)
+        if out_shape is None:
+            raise ValueError('complex-to-real transform requires out_shape')
+    else:
+        out_dtype = dtype
+        out_shape = shape
+    return tuple(out_shape), out_dtype
+
+
+def _copy_region_kernel(context, ndim, src_dtype, dst_dtype):
+    key = (context, ndim, src_dtype, dst_dtype)
+    kernel = _kernels.get(key)
+    if kernel is not None:
+        return kernel
+
+    src_t, dst_t = _ctypes[src_dtype], _ctypes[dst_dtype]
+    if src_dtype == dst_dtype:
+        convert = 'src[j]'
+    elif src_dtype.kind == 'f' and dst_dtype.kind == 'c' and dst_dtype.itemsize == 2*src_dtype.itemsize:
+        convert = '(%s)(src[j], 0)' % dst_t
+    else:
+        raise TypeError('cannot convert %s to %s' % (src_dtype, dst_dtype))
+
+    args = ''.join(', long dst_n%d, long dst_s%d, long src_n%d, long src_s%d, long start%d, int wrap%d' % ((d,)*6)
+                   for d in range(ndim))
+    index = ''.join("""
+    k = rem %% dst_n%(d)d; rem /= dst_n%(d)d;
+    jd += k * dst_s%(d)d;
+    s = k + start%(d)d;
+    if (wrap%(d)d) { s %%= src_n%(d)d; if (s < 0) s += src_n%(d)d; }
+    else if (s < 0 || s >= src_n%(d)d) inside = 0;
+    j += s * src_s%(d)d;""" % {'d': d} for d in reversed(range(ndim)))
+
+    source = """
+#if defined(cl_khr_fp64)
+#pragma OPENCL EXTENSION cl_khr_fp64: enable
+#endif
+
+__kernel void copy_region(__global %(dst_t)s *dst, long dst_offset,
+                          __global const %(src_t)s *src, long src_offset%(args)s)
+{
+    long i = get_global_id(0);
+    long rem = i, j = src_offset, jd = dst_offset, k, s;
+    int inside = 1;
+    %(index)s
+    if (inside)
+        dst[jd] = %(convert)s;
+    else
+        dst[jd] = (%(dst_t)s)(0);
+}
+""" % dict(dst_t=dst_t, src_t=src_t, args=args, index=index, convert=convert)
+
+    kernel = cl.Kernel(cl.Program(context, source).build(), 'copy_region')
+    _kernels[key] = kernel
+    return kernel
+
+
+def _copy_region(src, shape, starts=None, wrap=False, dtype=None, out=None, allocator=None, queue=None,
+                 wait_for=None):
+    """copy region of `src` to new C contiguous array (or `out`) of given shape
+
+    Element k of the result along axis d is taken from element
+    k + starts[d] of `src`. Elements outside of `src` are set to zero
+    (zero padding), or wrapped around periodically if `wrap` is
+    True for that axis. `src` and `out` can have arbitrary strides, a
+    real `src` can be converted to a complex result `dtype`. The copy
+    waits for events of `src` and `out` and for `wait_for`.
+    """
+    queue = queue or src.queue
+    ndim = src.ndim
+    shape = tuple(int(n) for n in shape)
+    assert len(shape) == ndim
+    if starts is None:
+        starts = (0,)*ndim
+    if np.isscalar(wrap):
+        wrap = (wrap,)*ndim
+    dtype = np.dtype(dtype or src.dtype)
+
+    if out is None:
+        out = cla.empty(queue, shape, dtype, allocator=allocator)
+    assert out.shape == shape and out.dtype == dtype
+    if out.size == 0:
+        return out
+
+    src_itemsize = src.dtype.itemsize
+    assert all(s % src_itemsize == 0 for s in src.strides)
+    assert all(s % dtype.itemsize == 0 for s in out.strides)
+    args = []
+    for d in range(ndim):
+        args += [np.int64(shape[d]), np.int64(out.strides[d]//dtype.itemsize),
+                 np.int64(src.shape[d]), np.int64(src.strides[d]//src_itemsize),
+                 np.int64(starts[d]), np.int32(bool(wrap[d]))]
+
+    kernel = _copy_region_kernel(queue.context, ndim, src.dtype, dtype)
+    event = kernel(queue, (out.size,), None,
+                   out.base_data, np.int64(out.offset//dtype.itemsize),
+                   src.base_data, np.int64(src.offset//src_itemsize),
+                   *args,
+                   wait_for=src.events + out.events + list(wait_for or []))
+    out.add_event(event)
+    return out
+
+
+_overlap_add_source = """
+#if defined(cl_khr_fp64)
+#pragma OPENCL EXTENSION cl_khr_fp64: enable
+#endif
+
+__kernel void overlap_add(__global %(T)s *out, long out_offset, long out_sb, long out_s,
+                          __global const %(T)s *frames, long frames_offset, long frames_sb,
+                          long frames_sf, long frames_s, long n_frames, long frame_length,
+                          long hop, __global const %(R)s *scale, int accumulate)
+{
+    long t = get_global_id(0);
+    long batch = get_global_id(1);
+    long b_first = t >= frame_length ? (t - frame_length) / hop + 1 : 0;
+    long b_last = min(t / hop, n_frames - 1);
+    %(T)s sum = (%(T)s)(0);
+    for (long b = b_first; b <= b_last; b++)
+        sum += frames[frames_offset + batch*frames_sb + b*frames_sf + (t - b*hop)*frames_s];
+    if (scale)
+        sum *= scale[t];
+    long j = out_offset + batch*out_sb + t*out_s;
+    out[j] = accumulate ? out[j] + sum : sum;
+}
+"""
+
+
+def _batch_stride(array, n_batch_axes):
+    """element stride of (collapsible) leading batch axes"""
+    itemsize = array.dtype.itemsize
+    shape, strides = array.shape[:n_batch_axes], array.strides[:n_batch_axes]
+    for d in range(n_batch_axes - 1):
+        assert strides[d] == strides[d+1] * shape[d+1], 'batch axes must be collapsible'
+    return strides[-1] // itemsize if n_batch_axes else 0
+
+
+def _overlap_add(frames, hop, out, accumulate=False, scale=None, queue=None):
+    """overlap-add frames (..., n_frames, frame_length) into out (..., length)
+
+    out[..., t] = sum over b of frames[..., b, t - b*hop], or added to
+    the previous content of `out` if `accumulate` is True. The sum is
+    multiplied by scale[t] if a (contiguous, real) `scale` array of
+    length `length` is given.
+    """
+    queue = queue or frames.queue
+    assert frames.dtype == out.dtype
+    assert frames.shape[:-2] == out.shape[:-1]
+    n_frames, frame_length = frames.shape[-2:]
+    length = out.shape[-1]
+    n_batch = int(np.prod(out.shape[:-1]))
+    if out.size == 0:
+        return out
+    real_dtype = np.dtype(np.float64 if out.dtype in (np.float64, np.complex128) else np.float32)
+    events = frames.events + out.events
+    if scale is not None:
+        assert scale.shape == (length,) and scale.dtype == real_dtype and scale.flags.c_contiguous
+        events = events + scale.events
+
+    key = (queue.context, 'overlap_add', out.dtype)
+    kernel = _kernels.get(key)
+    if kernel is None:
+        source = _overlap_add_source % dict(T=_ctypes[out.dtype], R=_ctypes[real_dtype])
+        kernel = _kernels[key] = cl.Kernel(cl.Program(queue.context, source).build(), 'overlap_add')
+
+    itemsize = out.dtype.itemsize
+    event = kernel(queue, (length, n_batch), None,
+                   out.base_data, np.int64(out.offset//itemsize),
+                   np.int64(_batch_stride(out, out.ndim-1)), np.int64(out.strides[-1]//itemsize),
+                   frames.base_data, np.int64(frames.offset//itemsize),
+                   np.int64(_batch_stride(frames, frames.ndim-2)),
+                   np.int64(frames.strides[-2]//itemsize), np.int64(frames.strides[-1]//itemsize),
+                   np.int64(n_frames), np.int64(frame_length), np.int64(hop),
+                   scale.data if scale is not None else None,
+                   np.int32(bool(accumulate)),
+                   wait_for=events)
+    out.add_event(event)
+    return out
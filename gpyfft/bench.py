@@ -0,0 +1,416 @@
+"""
+Benchmark suite for gpyfft.
+
+Sweeps transform sizes over the radices supported by clFFT (2, 3, 5,
+7, 11, 13 and mixed), batch counts, precisions, complex and real
+transforms, in- and out-of-place transforms, memory layouts (C and
+Fortran order, planar complex data) and padding. For each case the result is checked against numpy.fft, and
+measured are
+
+* wall time per transform (host view, many transforms enqueued back to back)
+* device time per transform, from event profiling (interval between
+  completion of consecutive transforms)
+* time of numpy.fft for the same transform
+
+Results are printed, and optionally written as JSON or CSV. A JSON
+result file can be used as baseline for later runs, cases slower
+than the baseline by more than a threshold are flagged as
+regressions. Run on the command line::
+
+    python -m gpyfft.bench --preset quick --json results.json
+    python -m gpyfft.bench --baseline results.json
+
+Works on CPU OpenCL implementations such as pocl as well; set
+`PYOPENCL_CTX` to select the device.
+"""
+
+from __future__ import absolute_import, division, print_function
+import argparse
+import csv
+import json
+import sys
+import timeit
+from collections import namedtuple
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from gpyfft.fft import FFT, GFFT
+from gpyfft.arrays import complex_view
+from gpyfft.version import __version__
+
+# kind: 'c2c', 'r2c' or 'c2r', shape: transform shape, layout: 'C', 'F' or
+# 'P' (C order, complex arrays planar), padding: extra elements along the
+# innermost axis in memory
+Case = namedtuple('Case', ['kind', 'shape', 'batch', 'precision', 'inplace', 'layout', 'padding'])
+
+RADIX_SIZES = {'2': [256, 4096],
+               '3': [243, 2187],
+               '5': [125, 3125],
+               '7': [343, 2401],
+               '11': [121, 1331],
+               '13': [169, 2197],
+               'mixed': [210, 1000, 6006],
+              }
+
+PRESETS = ('quick', 'full', '2d', '3d')
+
+
+def case_name(case):
+    return '%s-%s-%sx%d-%s-%s-pad%d' % (case.kind, case.precision,
+                                        'x'.join(str(n) for n in case.shape), case.batch,
+                                        'inplace' if case.inplace else 'outofplace',
+                                        case.layout, case.padding)
+
+
+def valid(case):
+    """in-place real transforms need (C contiguous) padded storage"""
+    if case.inplace and case.kind != 'c2c':
+        return case.layout == 'C' and case.padding == 0
+    return True
+
+
+def generate_cases(preset='quick', precisions=('single',), max_elements=None):
+    """list of `Case` for preset, skipping invalid cases and cases with more than `max_elements`"""
+    cases = []
+    def add(kinds, shapes, batches, inplaces=(False,), layouts=('C',), paddings=(0,)):
+        for precision in precisions:
+            for shape in shapes:
+                for batch in batches:
+                    for kind in kinds:
+                        for inplace in inplaces:
+                            for layout in layouts:
+                                for padding in paddings:
+                                    cases.append(Case(kind, tuple(shape), batch, precision,
+                                                      inplace, layout, padding))
+
+    kinds = ('c2c', 'r2c', 'c2r')
+    if preset == 'quick':
+        sizes = [sizes[0] for sizes in RADIX_SIZES.values()] + RADIX_SIZES['mixed'][1:2]
+        add(kinds, [(n,) for n in sizes], (1, 64))
+        add(kinds, [(256,), (210,)], (64,), inplaces=(True,))
+        add(kinds, [(256,), (210,)], (64,), layouts=('F',), paddings=(0, 3))
+        add(kinds, [(256,), (210,)], (64,), layouts=('P',))
+        add(kinds, [(256, 256), (210, 210)], (1,), inplaces=(False, True))
+        add(('c2c',), [(256, 256)], (1,), inplaces=(True,), layouts=('P',))
+        add(('c2c', 'r2c'), [(64, 64, 64)], (1,))
+    elif preset == 'full':
+        sizes = sorted(n for sizes in RADIX_SIZES.values() for n in sizes)
+        add(kinds, [(n,) for n in sizes], (1, 16, 256), inplaces=(False, True),
+            layouts=('C', 'F', 'P'), paddings=(0, 1))
+        add(kinds, [(n, n) for n in (128, 210, 256, 343, 1000, 1024)], (1, 4),
+            inplaces=(False, True), layouts=('C', 'F', 'P'), paddings=(0, 1))
+        add(kinds, [(n, n, n) for n in (32, 60, 64, 100, 128)], (1,),
+            inplaces=(False, True), paddings=(0, 1))
+    elif preset == '2d':
+        add(('c2c',), [(1024, 1024)], (1,), inplaces=(False, True), layouts=('C', 'F'))
+    elif preset == '3d':
+        add(('c2c',), [(256, 256, 256)], (1,), inplaces=(False, True), paddings=(0, 1, 2, 3))
+    else:
+        raise ValueError('unknown preset %r' % (preset,))
+
+    return [case for case in cases
+            if valid(case) and (max_elements is None or case.batch*np.prod(case.shape) <= max_elements)]
+
+
+class _Setup(object):
+    """arrays and transform for a case"""
+
+    def __init__(self, context, queue, case):
+        double = case.precision == 'double'
+        real_dtype = np.dtype(np.float64 if double else np.float32)
+        complex_dtype = np.dtype(np.complex128 if double else np.complex64)
+        shape = ((case.batch,) if case.batch > 1 else ()) + case.shape
+        ndim = len(shape)
+        t_axes = tuple(range(ndim - len(case.shape), ndim)) #numpy order, last axis halved for real transforms
+        self.t_axes = t_axes
+        self.case = case
+        n = shape[-1]
+        m = n//2 + 1
+        c_shape = shape[:-1] + (m,)
+
+        rng = np.random.RandomState(0)
+        x = rng.standard_normal(shape)
+        if case.kind == 'c2c':
+            x = x + 1j*rng.standard_normal(shape)
+            in_shape, in_dtype = shape, complex_dtype
+            out_shape, out_dtype = shape, complex_dtype
+            self.reference = np.fft.fftn(x, axes=t_axes)
+            self.numpy_transform = lambda: np.fft.fftn(self.host_input, axes=t_axes)
+        elif case.kind == 'r2c':
+            in_shape, in_dtype = shape, real_dtype
+            out_shape, out_dtype = c_shape, complex_dtype
+            self.reference = np.fft.rfftn(x, axes=t_axes)
+            self.numpy_transform = lambda: np.fft.rfftn(self.host_input, axes=t_axes)
+        else:
+            self.reference = x
+            x = np.fft.rfftn(x, axes=t_axes)
+            in_shape, in_dtype = c_shape, complex_dtype
+            out_shape, out_dtype = shape, real_dtype
+            self.numpy_transform = lambda: np.fft.irfftn(self.host_input, case.shape, axes=t_axes)
+        self.host_input = x.astype(in_dtype)
+
+        if case.inplace and case.kind != 'c2c':
+            # padded real storage, complex view
+            storage = np.zeros(shape[:-1] + (2*m,), real_dtype)
+            self.storage = cla.to_device(queue, storage)
+            real = self.storage[..., :n]
+            cplx = complex_view(real)
+            data, result = (real, cplx) if case.kind == 'r2c' else (cplx, real)
+            self.input = data
+            self.output_index = None
+        else:
+            self.storage, data, self.index = self._array(queue, in_shape, in_dtype, case)
+            if case.inplace:
+                result = None
+                self.output_storage, self.output_index = self.storage, self.index
+            else:
+                self.output_storage, result, self.output_index = self._array(queue, out_shape, out_dtype, case)
+            self.input = data
+        self.upload(queue)
+
+        self.plan_time = timeit.default_timer()
+        self.transform = FFT(context, queue, data, result, axes=t_axes[::-1], real=case.kind == 'c2r')
+        self.plan_time = timeit.default_timer() - self.plan_time
+        self.forward = case.kind != 'c2r'
+
+    def _array(self, queue, shape, dtype, case):
+        """(device storage, view, index of view) with layout and padding of case
+
+        For planar layout of complex data storage and view are tuples
+        (real part, imaginary part).
+        """
+        if case.layout == 'P' and dtype.kind == 'c':
+            part_dtype = np.dtype(np.float64 if dtype == np.complex128 else np.float32)
+            parts = [self._array(queue, shape, part_dtype, case) for i in range(2)]
+            return tuple(p[0] for p in parts), tuple(p[1] for p in parts), parts[0][2]
+        padded = list(shape)
+        axis = 0 if case.layout == 'F' else -1
+        padded[axis] += case.padding
+        host = np.zeros(padded, dtype, order=_order(case))
+        storage = cla.to_device(queue, host)
+        index = [slice(None)]*len(shape)
+        index[axis] = slice(0, shape[axis])
+        index = tuple(index)
+        return storage, storage[index], index
+
+    def upload(self, queue):
+        case = self.case
+        if case.inplace and case.kind != 'c2c':
+            host = np.zeros(self.storage.shape, self.storage.dtype)
+            if case.kind == 'r2c':
+                host[..., :self.host_input.shape[-1]] = self.host_input
+            else:
+                host.view(self.host_input.dtype)[...] = self.host_input
+        elif isinstance(self.storage, tuple): #planar
+            for storage, part in zip(self.storage, (self.host_input.real, self.host_input.imag)):
+                host = np.zeros(storage.shape, storage.dtype)
+                host[self.index] = part
+                storage.set(host)
+            return
+        else:
+            host = np.zeros(self.storage.shape, self.storage.dtype, order=_order(case))
+            host[self.index] = self.host_input
+        self.storage.set(host)
+
+    def result(self):
+        case = self.case
+        if case.inplace and case.kind != 'c2c':
+            host = self.storage.get()
+            if case.kind == 'r2c':
+                return host.view(np.result_type(host.dtype, np.complex64))
+            return host[..., :self.reference.shape[-1]]
+        if isinstance(self.output_storage, tuple): #planar
+            re, im = (storage.get()[self.output_index] for storage in self.output_storage)
+            return re + 1j*im
+        return self.output_storage.get()[self.output_index]
+
+
+def _order(case):
+    return 'F' if case.layout == 'F' else 'C'
+
+
+def _relative_error(result, reference):
+    scale = np.max(np.abs(reference)) or 1
+    return float(np.max(np.abs(result - reference)) / scale)
+
+
+def _time(run, min_time, max_runs):
+    """seconds per call of run(), repeated for at least min_time"""
+    tic = timeit.default_timer()
+    run()
+    t1 = max(timeit.default_timer() - tic, 1e-7)
+    n_run = int(min(max(min_time / t1, 3), max_runs))
+    tic = timeit.default_timer()
+    for i in range(n_run):
+        run()
+    return (timeit.default_timer() - tic) / n_run, n_run
+
+
+def measure(context, queue, case, min_time=0.2, max_runs=1000):
+    """dict with results for case"""
+    record = dict(name=case_name(case), kind=case.kind, shape=list(case.shape), batch=case.batch,
+                  precision=case.precision, inplace=case.inplace, layout=case.layout,
+                  padding=case.padding, error=None)
+    try:
+        setup = _Setup(context, queue, case)
+        transform = setup.transform
+        forward = setup.forward
+        record['plan_ms'] = 1e3*setup.plan_time
+
+        transform.enqueue(forward=forward)
+        queue.finish()
+        result = setup.result()
+        record['max_error'] = _relative_error(result, setup.reference)
+        tolerance = 1e-10 if case.precision == 'double' else 1e-4
+        record['ok'] = bool(record['max_error'] < tolerance*np.log2(max(np.prod(case.shape), 2)))
+
+        def run_many(n=10):
+            for i in range(n):
+                transform.enqueue(forward=forward)
+            queue.finish()
+        def run_finish():
+            transform.enqueue(forward=forward)
+            queue.finish()
+        t_wall, n_run = _time(run_many, min_time, max_runs)
+        record['wall_ms'] = 1e3*t_wall/10
+        record['latency_ms'] = 1e3*_time(run_finish, min_time/4, max_runs)[0]
+
+        # device time: interval between completion of back-to-back transforms
+        n_prof = max(min(10*n_run, 100), 2)
+        events = [transform.enqueue(forward=forward)[-1] for i in range(n_prof)]
+        queue.finish()
+        record['device_ms'] = 1e-6*(events[-1].profile.end - events[0].profile.end)/(n_prof - 1)
+
+        record['numpy_ms'] = 1e3*_time(setup.numpy_transform, min_time/2, max_runs)[0]
+        n = np.prod(case.shape)
+        flops = 5*n*np.log2(max(n, 2))*case.batch * (0.5 if case.kind != 'c2c' else 1)
+        record['gflops'] = float(1e-9*flops/(1e-3*record['device_ms'])) if record['device_ms'] > 0 else None
+        record['speedup_numpy'] = record['numpy_ms']/record['wall_ms']
+    except Exception as e:
+        record['error'] = '%s: %s' % (type(e).__name__, e)
+    return record
+
+
+def device_info(queue):
+    device = queue.device
+    return dict(device=device.name.strip(),
+                platform=device.platform.name.strip(),
+                driver_version=device.driver_version.strip(),
+                clfft_version='.'.join(str(v) for v in GFFT.get_version()),
+                gpyfft_version=__version__)
+
+
+def compare(results, baseline, threshold=0.1):
+    """list of (name, metric, value, baseline value) of cases slower than baseline by more than threshold"""
+    reference = dict((record['name'], record) for record in baseline['results'])
+    regressions = []
+    for record in results['results']:
+        base = reference.get(record['name'])
+        if base is None or record['error'] or base.get('error'):
+            continue
+        for metric in ('wall_ms', 'device_ms'):
+            value, base_value = record.get(metric), base.get(metric)
+            if value and base_value and value > base_value*(1 + threshold):
+                regressions.append((record['name'], metric, value, base_value))
+    return regressions
+
+
+_columns = ['name', 'plan_ms', 'wall_ms', 'latency_ms', 'device_ms', 'numpy_ms', 'gflops',
+            'speedup_numpy', 'max_error', 'ok', 'error']
+
+
+def print_record(record, file=sys.stdout):
+    if record['error']:
+        print('%-50s ERROR %s' % (record['name'], record['error']), file=file)
+        return
+    print('%-50s %9.3f %9.3f %9.3f %8.2f %7.2f %8.1e %s'
+          % (record['name'], record['wall_ms'], record['device_ms'], record['numpy_ms'],
+             record['gflops'] or 0, record['speedup_numpy'], record['max_error'],
+             'ok' if record['ok'] else 'INACCURATE'), file=file)
+
+
+def write_csv(results, filename):
+    with open(filename, 'w') as f:
+        writer = csv.DictWriter(f, _columns, extrasaction='ignore')
+        writer.writeheader()
+        for record in results['results']:
+            writer.writerow(record)
+
+
+def run_cases(cases, context=None, queue=None, min_time=0.2, verbose=True):
+    """measure cases, returns dict with device info and list of results"""
+    if context is None:
+        context = cl.create_some_context(interactive=False)
+    if queue is None:
+        queue = cl.CommandQueue(context, properties=cl.command_queue_properties.PROFILING_ENABLE)
+    results = device_info(queue)
+    if verbose:
+        print('%s (%s), clFFT %s' % (results['device'], results['platform'], results['clfft_version']))
+        print('%-50s %9s %9s %9s %8s %7s %8s' % ('case', 'wall ms', 'device ms', 'numpy ms',
+                                               'Gflops', 'speedup', 'error'))
+    records = []
+    for case in cases:
+        if case.precision == 'double' and not queue.device.double_fp_config:
+            continue
+        record = measure(context, queue, case, min_time)
+        records.append(record)
+        if verbose:
+            print_record(record)
+    results['results'] = records
+    return results
+
+
+def run_preset(preset='quick', precisions=('single',), **kwargs):
+    return run_cases(generate_cases(preset, precisions), **kwargs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m gpyfft.bench', description='gpyfft benchmark suite')
+    parser.add_argument('--preset', choices=PRESETS, default='quick')
+    parser.add_argument('--precision', default='single', help='comma separated: single,double')
+    parser.add_argument('--filter', default='', help='only cases whose name contains this string')
+    parser.add_argument('--max-elements', type=int, help='skip cases with more elements (incl. batch)')
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds per measurement')
+    parser.add_argument('--json', help='write results to JSON file')
+    parser.add_argument('--csv', help='write results to CSV file')
+    parser.add_argument('--baseline', help='JSON results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative slowdown flagged as regression (default 0.1)')
+    parser.add_argument('--list', action='store_true', help='list cases and exit')
+    args = parser.parse_args(argv)
+
+    cases = generate_cases(args.preset, args.precision.split(','), args.max_elements)
+    cases = [case for case in cases if args.filter in case_name(case)]
+    if args.list:
+        for case in cases:
+            print(case_name(case))
+        return 0
+
+    results = run_cases(cases, min_time=args.min_time)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+    if args.csv:
+        write_csv(results, args.csv)
+
+    status = 0
+    failed = [record['name'] for record in results['results'] if record['error'] or not record['ok']]
+    if failed:
+        print('%d cases failed or inaccurate' % len(failed))
+        status = 1
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, metric, value, base_value in regressions:
+            print('REGRESSION %-50s %s %.3f ms (baseline %.3f ms, %+.0f%%)'
+                  % (name, metric, value, base_value, 100*(value/base_value - 1)))
+        if regressions:
+            status = 1
+        else:
+            print('no regressions against %s' % args.baseline)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
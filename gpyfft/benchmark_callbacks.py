@@ -0,0 +1,80 @@
+"""
+Benchmark of fused callbacks: windowed power spectrum of a batch of
+real frames, computed with separate elementwise kernels (window
+multiply, transform, power) and with window and power fused into the
+pre and post callbacks of the transform.
+"""
+
+from __future__ import absolute_import, division, print_function
+import timeit
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from pyopencl.elementwise import ElementwiseKernel
+from gpyfft import FFT
+from gpyfft.callbacks import Window, Power
+
+
+def timeit_enqueue(enqueue, queue, n_run):
+    enqueue()
+    queue.finish()
+    tic = timeit.default_timer()
+    for i in range(n_run):
+        enqueue()
+    queue.finish()
+    toc = timeit.default_timer()
+    return 1e3*(toc-tic)/n_run
+
+
+def run(batch=1024, n=4096, n_run=20):
+    context = cl.create_some_context()
+    queue = cl.CommandQueue(context)
+
+    nd_data = np.random.normal(size=(batch, n)).astype(np.float32)
+    window = np.hanning(n).astype(np.float32)
+    data = cla.to_device(queue, nd_data)
+    windowed = cla.empty_like(data)
+    spectrum = cla.empty(queue, (batch, n//2+1), np.complex64)
+    power = cla.empty(queue, (batch, n//2+1), np.float32)
+    cl_window = cla.to_device(queue, window)
+
+    window_kernel = ElementwiseKernel(context,
+                                      'float *out, const float *data, const float *window, long length',
+                                      'out[i] = data[i] * window[i % length]')
+    power_kernel = ElementwiseKernel(context,
+                                     'float *out, const cfloat_t *spectrum',
+                                     'out[i] = spectrum[i].x*spectrum[i].x + spectrum[i].y*spectrum[i].y')
+
+    # separate kernels
+    transform = FFT(context, queue, windowed, spectrum, axes=(1,))
+
+    def separate():
+        window_kernel(windowed, data, cl_window, np.int64(n))
+        transform.enqueue()
+        power_kernel(power, spectrum)
+
+    # window and power fused into callbacks
+    fused_transform = FFT(context, queue, data, spectrum, axes=(1,),
+                          callbacks={'pre': [Window(window)],
+                                     'post': [Power(out=power)]})
+
+    def fused():
+        fused_transform.enqueue()
+
+    nd_power = abs(np.fft.rfft(nd_data*window, axis=1))**2
+    t_separate = timeit_enqueue(separate, queue, n_run)
+    assert np.allclose(power.get(), nd_power, rtol=1e-3, atol=1e-1)
+    t_fused = timeit_enqueue(fused, queue, n_run)
+    assert np.allclose(power.get(), nd_power, rtol=1e-3, atol=1e-1)
+
+    # memory traffic avoided: window kernel (read data, write windowed),
+    # complex result written by transform and read by power kernel
+    saved_bytes = 2*data.nbytes + 2*spectrum.nbytes
+    print('windowed power spectrum, batch %d x %d, %s' % (batch, n, queue.device.name.strip()))
+    print('separate kernels  %8.3f ms' % t_separate)
+    print('fused callbacks   %8.3f ms (%.2fx)' % (t_fused, t_separate/t_fused))
+    print('memory traffic avoided: %.1f MB per transform' % (1e-6*saved_bytes))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,84 @@
+"""
+Benchmark of replaying a recorded graph versus eager dispatch.
+
+Pipeline: upload of a batch of real signals, forward transform,
+multiplication with a filter spectrum (kernel), inverse transform,
+download. For small transforms the host overhead dominates, replay
+saves per command validation, sub-buffer creation and setting of
+kernel arguments.
+"""
+
+from __future__ import absolute_import, division, print_function
+import timeit
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from gpyfft import FFT
+from gpyfft.graph import Graph
+
+_filter_source = """
+__kernel void apply_filter(__global float2 *spectrum, __global const float2 *h, uint m)
+{
+    uint i = get_global_id(0);
+    float2 v = spectrum[i], w = h[i % m];
+    spectrum[i] = (float2)(v.x*w.x - v.y*w.y, v.x*w.y + v.y*w.x);
+}
+"""
+
+
+def timeit_pipeline(run_once, queue, n_run):
+    """(host time, total time) per pipeline run in microseconds"""
+    run_once()
+    queue.finish()
+    tic = timeit.default_timer()
+    for i in range(n_run):
+        run_once()
+    toc_host = timeit.default_timer()
+    queue.finish()
+    toc = timeit.default_timer()
+    return 1e6*(toc_host - tic)/n_run, 1e6*(toc - tic)/n_run
+
+
+def run(sizes=(64, 256, 1024), batch=16, n_run=1000):
+    context = cl.create_some_context()
+    queue = cl.CommandQueue(context)
+    apply_filter = cl.Program(context, _filter_source).build().apply_filter
+
+    print('pipeline upload, rfft, filter, irfft, download, batch %d, %s' % (batch, queue.device.name.strip()))
+    print('     n  eager host/total (us)  replay host/total (us)')
+    for n in sizes:
+        m = n//2 + 1
+        host_data = np.random.normal(size=(batch, n)).astype(np.float32)
+        host_result = np.empty_like(host_data)
+        nd_h = np.fft.rfft(np.random.normal(size=n)).astype(np.complex64)
+        data = cla.empty(queue, (batch, n), np.float32)
+        spectrum = cla.empty(queue, (batch, m), np.complex64)
+        h = cla.to_device(queue, nd_h)
+        forward = FFT(context, queue, data, spectrum, axes=(1,))
+        inverse = FFT(context, queue, spectrum, data, axes=(1,), real=True)
+
+        def eager():
+            cl.enqueue_copy(queue, data.data, host_data, is_blocking=False)
+            forward.enqueue_arrays(data, spectrum)
+            apply_filter(queue, (batch*m,), None, spectrum.data, h.data, np.uint32(m))
+            inverse.enqueue_arrays(spectrum, data, forward=False)
+            cl.enqueue_copy(queue, host_result, data.data, is_blocking=False)
+
+        graph = Graph(queue)
+        graph.add_copy(data, host_data)
+        graph.add_fft(forward)
+        graph.add_kernel(apply_filter, (batch*m,), None, spectrum, h, np.uint32(m))
+        graph.add_fft(inverse, forward=False)
+        graph.add_copy(host_result, data)
+
+        nd_result = np.fft.irfft(np.fft.rfft(host_data, axis=1)*nd_h, n, axis=1)
+        t_eager = timeit_pipeline(eager, queue, n_run)
+        assert np.allclose(host_result, nd_result, rtol=1e-3, atol=1e-3)
+        host_result[:] = 0
+        t_replay = timeit_pipeline(graph.replay, queue, n_run)
+        assert np.allclose(host_result, nd_result, rtol=1e-3, atol=1e-3)
+        print('%6d  %9.1f / %9.1f  %10.1f / %9.1f' % ((n,) + t_eager + t_replay))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,55 @@
+"""
+Microbenchmark of the host overhead per enqueued transform.
+
+For small transforms (64 to 256 points, small batches) the Python
+overhead of an enqueue can exceed the execution time on the device.
+Measured is the host time per transform for enqueues with explicitly
+passed arrays (validated, sub-buffers for offsets created per call),
+the fast path of `FFT.enqueue` (buffers of bound arrays cached), and
+`FFT.enqueue_many` (a single call for many transforms).
+"""
+
+from __future__ import absolute_import, division, print_function
+import timeit
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from gpyfft import FFT
+
+
+def host_time(enqueue, queue, n_call, n_per_call=1):
+    """host time per transform (microseconds), excluding waiting for completion"""
+    enqueue()
+    queue.finish()
+    tic = timeit.default_timer()
+    for i in range(n_call):
+        enqueue()
+    toc = timeit.default_timer()
+    queue.finish()
+    return 1e6*(toc - tic)/(n_call*n_per_call)
+
+
+def run(sizes=(64, 128, 256), batch=8, n_arrays=64, n_call=2000):
+    context = cl.create_some_context()
+    queue = cl.CommandQueue(context)
+    print('host overhead per transform (us), batch %d, %s' % (batch, queue.device.name.strip()))
+    print('  size  enqueue_arrays  enqueue  enqueue_many')
+    for n in sizes:
+        nd_data = np.random.normal(size=(batch, n)).astype(np.complex64)
+        # arrays with offset into a larger buffer: enqueue with explicit arrays creates sub-buffers
+        storage = cla.to_device(queue, np.concatenate([nd_data]*(n_arrays + 1)))
+        datas = [storage[(i+1)*batch:(i+2)*batch] for i in range(n_arrays)]
+        results = [cla.empty_like(data) for data in datas]
+        transform = FFT(context, queue, datas[0], results[0], axes=(1,))
+
+        t_arrays = host_time(lambda: transform.enqueue_arrays(datas[1], results[1]), queue, n_call)
+        t_enqueue = host_time(lambda: transform.enqueue(), queue, n_call)
+        pairs = list(zip(datas, results))
+        t_many = host_time(lambda: transform.enqueue_many(pairs), queue, n_call//n_arrays + 1, n_arrays)
+
+        assert np.allclose(results[-1].get(), np.fft.fft(nd_data, axis=1), rtol=1e-3, atol=1e-3)
+        print('%6d  %14.2f  %7.2f  %12.2f' % (n, t_arrays, t_enqueue, t_many))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,67 @@
+"""
+Benchmark of concurrent enqueues from several Python threads.
+
+Each thread transforms its own batch of small 1D transforms, on its
+own command queue, as fast as possible. The GIL is released during
+the clFFT enqueue call, so dispatch throughput scales with the number
+of threads as long as the Python part of an enqueue is not dominant.
+"""
+
+from __future__ import absolute_import, division, print_function
+import threading
+import timeit
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from gpyfft import FFT
+
+
+def dispatch(transforms, n_run):
+    """enqueue each transform n_run times, from one thread per transform, returns seconds"""
+    barrier = threading.Barrier(len(transforms) + 1)
+
+    def worker(transform):
+        barrier.wait()
+        for i in range(n_run):
+            transform.enqueue()
+        transform.queue.finish()
+
+    threads = [threading.Thread(target=worker, args=(transform,)) for transform in transforms]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    tic = timeit.default_timer()
+    for thread in threads:
+        thread.join()
+    return timeit.default_timer() - tic
+
+
+def run(n=256, batch=16, n_run=2000, thread_counts=(1, 2, 4, 8)):
+    context = cl.create_some_context()
+    device = context.devices[0]
+    nd_data = np.random.normal(size=(batch, n)).astype(np.complex64)
+
+    print('concurrent enqueues, %d x %d point transforms, %s' % (batch, n, device.name.strip()))
+    print('threads  enqueues/s   us/enqueue  speedup')
+    base = None
+    for n_threads in thread_counts:
+        transforms = []
+        for i in range(n_threads):
+            queue = cl.CommandQueue(context)
+            data = cla.to_device(queue, nd_data)
+            result = cla.empty_like(data)
+            transforms.append(FFT(context, queue, data, result, axes=(1,)))
+        for transform in transforms:
+            transform.enqueue()
+            transform.queue.finish()
+            assert np.allclose(transform.result.get(), np.fft.fft(nd_data, axis=1), rtol=1e-3, atol=1e-3)
+
+        seconds = dispatch(transforms, n_run)
+        rate = n_threads*n_run/seconds
+        if base is None:
+            base = rate
+        print('%7d  %10.0f  %11.2f  %7.2f' % (n_threads, rate, 1e6/rate, rate/base))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,211 @@
+from __future__ import absolute_import, division, print_function
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+import threading
+import json
+
+# All parameters that determine a baked clFFT plan (besides context and device)
+PlanSignature = namedtuple('PlanSignature',
+                           ['t_shape',
+                            'strides_in',
+                            'strides_out',
+                            'distances',
+                            'batch_size',
+                            'precision',
+                            'layouts',
+                            'inplace',
+                            'scales', #(forward, backward), None: clFFT default
+                            'callbacks', #tuple of (callback type, source, userdata buffer or None)
+                           ])
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+MANIFEST_VERSION = 1
+
+
+class PlanCache(object):
+    """Process-wide least recently used cache of baked plans.
+
+    Baking a plan compiles OpenCL kernels, which is by far the most
+    expensive part of creating an `FFT` object. Plans are looked up
+    by (context, device, signature), identical transforms share the
+    same baked plan. Note that modifying the plan of an `FFT` object
+    (e.g. scaling) affects all other `FFT` instances sharing this
+    plan.
+
+    Set `maxsize` to 0 to disable caching.
+
+    The cache is thread-safe. Entries are futures, plans can be baked
+    in background threads (`gpyfft.bake_async`); requests for a plan
+    being baked wait for it instead of baking it again.
+    """
+
+    def __init__(self, maxsize=32):
+        self._entries = OrderedDict() #key -> Future
+        self._lock = threading.RLock()
+        self._maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def maxsize(self):
+        """maximum number of cached plans"""
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, value):
+        with self._lock:
+            self._maxsize = value
+            self._evict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, create):
+        """return cached entry for key, call create() to make a new entry if missing"""
+        return self.get_future(key, create).result()
+
+    def get_future(self, key, create, executor=None):
+        """return future of cached entry for key
+
+        A missing entry is made by create(), in the calling thread, or
+        by submitting it to `executor` if given. Failed (or cancelled)
+        creations are not cached.
+        """
+        with self._lock:
+            future = self._entries.pop(key, None)
+            if future is None:
+                self.misses += 1
+                future = Future()
+                pending = True
+            else:
+                self.hits += 1
+                pending = False
+            if self._maxsize > 0:
+                self._entries[key] = future #most recently used goes last
+                self._evict()
+        if pending:
+            if executor is None:
+                self._create(key, future, create)
+            else:
+                executor.submit(self._create, key, future, create)
+        return future
+
+    def _create(self, key, future, create):
+        if future.set_running_or_notify_cancel():
+            try:
+                entry = create()
+            except BaseException as e:
+                self._discard(key, future)
+                future.set_exception(e)
+            else:
+                future.set_result(entry)
+        else:
+            self._discard(key, future)
+
+    def _discard(self, key, future):
+        with self._lock:
+            if self._entries.get(key) is future:
+                del self._entries[key]
+
+    def keys(self):
+        """list of keys of cached entries, least recently used first"""
+        with self._lock:
+            return list(self._entries)
+
+    def discard(self, key):
+        """remove entry for key if cached"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _evict(self):
+        while len(self._entries) > max(self._maxsize, 0):
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """remove all cached plans and reset statistics"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def cache_info(self):
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self._maxsize, len(self._entries))
+
+    def manifest(self):
+        """JSON serializable description of the signatures of cached plans
+
+        Used by `gpyfft.warmup` to bake the same plans at startup, e.g.
+        of a service. Plans with callbacks using userdata buffers
+        cannot be recreated and are omitted.
+        """
+        plans = []
+        for key in self.keys():
+            signature = key[2]
+            if any(user_data is not None for _, _, user_data in signature.callbacks or ()):
+                continue
+            entry = signature_to_json(signature)
+            if entry not in plans:
+                plans.append(entry)
+        return {'version': MANIFEST_VERSION, 'plans': plans}
+
+    def save_manifest(self, filename):
+        """write `manifest` to JSON file"""
+        with open(filename, 'w') as f:
+            json.dump(self.manifest(), f, indent=1)
+
+
+def signature_to_json(signature):
+    """JSON serializable dict of `PlanSignature` without userdata buffers"""
+    # FFT computes shapes and strides with numpy, convert to Python numbers
+    entry = dict(t_shape=[int(n) for n in signature.t_shape],
+                 strides_in=[int(n) for n in signature.strides_in],
+                 strides_out=[int(n) for n in signature.strides_out],
+                 distances=[int(n) for n in signature.distances],
+                 batch_size=int(signature.batch_size),
+                 precision=int(signature.precision),
+                 layouts=[int(layout) for layout in signature.layouts],
+                 inplace=bool(signature.inplace),
+                 scales=[float(s) for s in signature.scales] if signature.scales is not None else None,
+                 callbacks=None)
+    if signature.callbacks is not None:
+        entry['callbacks'] = [[callback_type, source.decode()]
+                              for callback_type, source, user_data in signature.callbacks]
+    return entry
+
+
+def signature_from_json(entry):
+    """`PlanSignature` from dict made by `signature_to_json`"""
+    return PlanSignature(t_shape=tuple(entry['t_shape']),
+                         strides_in=tuple(entry['strides_in']),
+                         strides_out=tuple(entry['strides_out']),
+                         distances=tuple(entry['distances']),
+                         batch_size=entry['batch_size'],
+                         precision=entry['precision'],
+                         layouts=tuple(entry['layouts']),
+                         inplace=entry['inplace'],
+                         scales=tuple(entry['scales']) if entry['scales'] is not None else None,
+                         callbacks=(tuple((callback_type, source.encode(), None)
+                                          for callback_type, source in entry['callbacks'])
+                                    if entry['callbacks'] is not None else None))
+
+
+def load_manifest(filename):
+    """read manifest written by `PlanCache.save_manifest`, returns list of `PlanSignature`"""
+    with open(filename) as f:
+        manifest = json.load(f)
+    return manifest_signatures(manifest)
+
+
+def manifest_signatures(manifest):
+    """list of `PlanSignature` of manifest (dict)"""
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError('unsupported manifest version %s' % manifest.get('version'))
+    return [signature_from_json(entry) for entry in manifest['plans']]
+
+
+plan_cache = PlanCache()
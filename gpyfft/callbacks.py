@@ -0,0 +1,404 @@
+"""
+Ready-made elementwise stages fused into clFFT pre and post callbacks.
+
+Elementwise operations before or after a transform (windowing,
+scaling, filtering, magnitude, type conversion) usually need a
+separate kernel and thus an extra pass over memory. Stages of this
+module are combined into a single pre or post callback, which clFFT
+inlines into its transform kernels::
+
+    from gpyfft.callbacks import Window, Scale, Multiply, Conjugate
+    transform = FFT(context, queue, data, result,
+                    callbacks={'pre': [Window(np.hanning(n)), Scale(2.)],
+                               'post': [Multiply(h), Conjugate()]})
+
+Pre stages act on the loaded input value, post stages on the
+transform result before it is stored. Stages using an array pass it
+as userdata: `Window` (coefficients uploaded to the device, cached by
+content so equal windows share plans), `Scale` with an array,
+`Multiply` and stages writing to an output array (`Magnitude`,
+`Power` with `out`, `Convert`). clFFT supports a single userdata
+buffer, so at most one of these stages per callback is allowed, e.g.
+a window and a filter go into the pre and post callback respectively.
+These arrays must have the same shape as the transform data the
+callback acts on (input array for pre, output array for post
+callbacks), or a shape that can be broadcast to it (size 1 along some
+axes). Output arrays must also have the same element strides.
+
+Input arrays of integer or half precision dtype are converted to
+single precision floats by the pre callback (real-to-complex
+transforms only).
+"""
+
+from __future__ import absolute_import, division, print_function
+import threading
+from collections import OrderedDict
+import numpy as np
+import pyopencl.array as cla
+
+_scalar_types = {np.dtype(np.float16): 'half',
+                 np.dtype(np.float32): 'float',
+                 np.dtype(np.float64): 'double',
+                 np.dtype(np.int8): 'char',
+                 np.dtype(np.uint8): 'uchar',
+                 np.dtype(np.int16): 'short',
+                 np.dtype(np.uint16): 'ushort',
+                 np.dtype(np.int32): 'int',
+                 np.dtype(np.uint32): 'uint',
+                }
+
+_complex_types = {np.dtype(np.complex64): 'float2',
+                  np.dtype(np.complex128): 'double2',
+                 }
+
+
+def transform_dtype(dtype):
+    """dtype used by the transform for input data of given dtype"""
+    dtype = np.dtype(dtype)
+    if dtype in (np.float32, np.float64, np.complex64, np.complex128):
+        return dtype
+    if dtype in _scalar_types:
+        return np.dtype(np.float32) #converted by pre callback
+    raise TypeError('unsupported dtype %s' % dtype)
+
+
+def _literal(x, T):
+    return repr(float(x)) + ('f' if T == 'float' else '')
+
+
+class _Info(object):
+    """layout of data a callback acts on"""
+
+    def __init__(self, callback_type, array, kind, double, loop_axes=(), queue=None):
+        self.callback_type = callback_type
+        self.queue = queue if queue is not None else getattr(array, 'queue', None) #for uploads
+        self.loop_axes = [a % len(array.shape) for a in loop_axes] #enqueued separately, offsets relative to slice
+        self.array = array #array offsets refer to (real part for planar data)
+        self.kind = kind #'complex', 'real' or 'planar'
+        self.T = 'double' if double else 'float'
+        self.dtype = np.dtype(np.float64 if double else np.float32)
+        self.cdtype = np.dtype(np.complex128 if double else np.complex64)
+        self.real = kind == 'real' #type of value
+        self.offset = 'inoffset' if callback_type == 'pre' else 'outoffset'
+
+    @property
+    def V(self):
+        return self.T if self.real else self.T + '2'
+
+    def element_strides(self, array):
+        return tuple(s // array.dtype.itemsize for s in array.strides)
+
+    def check_layout(self, array):
+        if array.shape != self.array.shape or \
+           self.element_strides(array) != self.element_strides(self.array):
+            raise ValueError('layout of array %s%s does not match %s callback data %s%s'
+                             % (array.shape, array.strides, self.callback_type,
+                                self.array.shape, self.array.strides))
+
+    def gather(self, array):
+        """index expression for element of array, which has same shape as
+        callback data or can be broadcast to it"""
+        shape = self.array.shape
+        if array.shape == shape and self.element_strides(array) == self.element_strides(self.array) \
+           and not self.loop_axes:
+            return self.offset
+        if len(array.shape) != len(shape) or any(n not in (1, m) for n, m in zip(array.shape, shape)):
+            raise ValueError('array of shape %s cannot be broadcast to %s callback data %s'
+                             % (array.shape, self.callback_type, shape))
+        terms = ['%s*%du' % (self.index(a), s)
+                 for a, (n, s) in enumerate(zip(array.shape, self.element_strides(array))) if n > 1]
+        return ' + '.join(terms) or '0'
+
+    def index(self, axis):
+        """expression of index along axis, computed from element offset"""
+        shape = self.array.shape
+        strides = self.element_strides(self.array)
+        axis = axis % len(shape)
+        if axis in self.loop_axes:
+            raise ValueError('callback depends on index along axis %d, which is not a batch axis of the plan' % axis)
+        stride = strides[axis]
+        outer = [s for s, n in zip(strides, shape) if s > stride and n > 1]
+        expr = self.offset
+        if outer:
+            expr = '(%s %% %du)' % (expr, min(outer))
+        if stride > 1:
+            expr = '(%s / %du)' % (expr, stride)
+        return expr
+
+
+class Callback(object):
+    """elementwise stage of a pre or post callback
+
+    Subclasses implement `code`. `userdata` is the array accessed
+    through the callback's userdata buffer (None if not needed),
+    `stores` is True for stages writing the final value to that array
+    instead of the transform output, `loads` is True for (first) pre
+    stages reading the input value themselves instead of from the
+    input offset.
+    """
+    userdata = None
+    stores = False
+    loads = False
+
+    def setup(self, info):
+        """prepare for callback data described by `info`, before code generation"""
+        pass
+
+    def code(self, info):
+        """code modifying value `v`"""
+        raise NotImplementedError('callback stages implement code()')
+
+    def _userdata(self, info, dtype):
+        return '((__global %s*)userdata)[%s]' % (dtype, info.gather(self.userdata))
+
+
+_coefficients = OrderedDict() #(context, dtype, shape, bytes) -> device array, least recently used first
+_coefficients_lock = threading.Lock()
+_coefficients_cache_size = 32
+
+
+def _upload(queue, values):
+    """device array of `values`, cached by content"""
+    key = (queue.context, values.dtype, values.shape, values.tobytes())
+    with _coefficients_lock:
+        array = _coefficients.pop(key, None)
+        if array is None:
+            array = cla.to_device(queue, values)
+        _coefficients[key] = array
+        while len(_coefficients) > _coefficients_cache_size:
+            _coefficients.popitem(last=False)
+    return array
+
+
+class Window(Callback):
+    """multiply with window coefficients along an axis of the data (uses userdata)"""
+
+    def __init__(self, window, axis=-1):
+        self.window = np.asarray(window, dtype=np.float64)
+        assert self.window.ndim == 1
+        self.axis = axis
+
+    def setup(self, info):
+        shape = info.array.shape
+        axis = self.axis % len(shape)
+        if len(self.window) != shape[axis]:
+            raise ValueError('window length %d does not match axis length %d'
+                             % (len(self.window), shape[axis]))
+        broadcast = [1]*len(shape)
+        broadcast[axis] = len(self.window)
+        self.userdata = _upload(info.queue, self.window.astype(info.dtype).reshape(broadcast))
+
+    def code(self, info):
+        return 'v *= %s;' % self._userdata(info, info.T)
+
+
+class Scale(Callback):
+    """multiply with scalar, or elementwise with real array (broadcast to data shape)"""
+
+    def __init__(self, factor):
+        if np.isscalar(factor):
+            self.factor = float(factor)
+        else:
+            self.factor = None
+            self.userdata = factor
+
+    def code(self, info):
+        if self.factor is not None:
+            return 'v *= %s;' % _literal(self.factor, info.T)
+        if self.userdata.dtype != info.dtype:
+            raise ValueError('scale array must have dtype %s' % info.dtype)
+        return 'v *= %s;' % self._userdata(info, info.T)
+
+
+class Multiply(Callback):
+    """elementwise complex multiplication with array (e.g. filter), broadcast to data shape"""
+
+    def __init__(self, array):
+        self.userdata = array
+
+    def code(self, info):
+        if info.real:
+            raise ValueError('complex multiplication of real %s callback data' % info.callback_type)
+        if self.userdata.dtype != info.cdtype:
+            raise ValueError('multiplier must have dtype %s' % info.cdtype)
+        return ('{ %(V)s h = %(h)s; v = (%(V)s)(v.x*h.x - v.y*h.y, v.x*h.y + v.y*h.x); }'
+                % dict(V=info.V, h=self._userdata(info, info.V)))
+
+
+class Conjugate(Callback):
+    """complex conjugate"""
+
+    def code(self, info):
+        if info.real:
+            raise ValueError('conjugate of real %s callback data' % info.callback_type)
+        return 'v.y = -v.y;'
+
+
+class _Real(Callback):
+    # real valued function of (complex) value, stored as (f, 0) or to out array
+
+    def __init__(self, out=None):
+        self.userdata = out
+        self.stores = out is not None
+
+    def code(self, info):
+        f = self.function(info)
+        if self.userdata is None:
+            if info.real:
+                return 'v = %s;' % f
+            return 'v = (%s)(%s, 0);' % (info.V, f)
+        if info.callback_type != 'post':
+            raise ValueError('output array only supported for post callbacks')
+        info.check_layout(self.userdata)
+        return _store(info, self.userdata.dtype, f, real=True)
+
+
+class Magnitude(_Real):
+    """absolute value |v|, optionally written to real array `out`"""
+
+    def function(self, info):
+        return 'fabs(v)' if info.real else 'length(v)'
+
+
+class Power(_Real):
+    """squared magnitude |v|**2, optionally written to real array `out`"""
+
+    def function(self, info):
+        return 'v*v' if info.real else '(v.x*v.x + v.y*v.y)'
+
+
+class Convert(Callback):
+    """write result converted to dtype of array `out` (post callbacks only)
+
+    real results can be stored as half, float, double or (saturated)
+    integers, complex results as complex64 or complex128.
+    """
+
+    stores = True
+
+    def __init__(self, out):
+        self.userdata = out
+
+    def code(self, info):
+        if info.callback_type != 'post':
+            raise ValueError('Convert is only supported for post callbacks')
+        info.check_layout(self.userdata)
+        return _store(info, self.userdata.dtype, 'v', real=info.real)
+
+
+def _store(info, dtype, value, real):
+    """code writing value to userdata, converted to dtype"""
+    dtype = np.dtype(dtype)
+    if real:
+        if dtype not in _scalar_types:
+            raise ValueError('cannot store real value as %s' % dtype)
+        t = _scalar_types[dtype]
+        if t == 'half':
+            return 'vstore_half(%s, %s, (__global half*)userdata);' % (value, info.offset)
+        if dtype.kind in 'iu':
+            value = 'convert_%s_sat_rte(%s)' % (t, value)
+        else:
+            value = '(%s)(%s)' % (t, value)
+        return '((__global %s*)userdata)[%s] = %s;' % (t, info.offset, value)
+    if dtype not in _complex_types:
+        raise ValueError('cannot store complex value as %s' % dtype)
+    t = _complex_types[dtype]
+    return '((__global %s*)userdata)[%s] = convert_%s(%s);' % (t, info.offset, t, value)
+
+
+def _load(info, dtype, index='inoffset'):
+    """code loading input value `v` from element `index` (pre callback)"""
+    dtype = np.dtype(dtype)
+    T, V = info.T, info.V
+    if info.kind == 'planar':
+        return '%s v = (%s)(((__global %s*)inRe)[%s], ((__global %s*)inIm)[%s]);' % (V, V, T, index, T, index)
+    if dtype in (info.dtype, info.cdtype):
+        return '%s v = ((__global %s*)in)[%s];' % (V, V, index)
+    t = _scalar_types[dtype]
+    if t == 'half':
+        return '%s v = vload_half(%s, (__global half*)in);' % (T, index)
+    return '%s v = convert_%s(((__global %s*)in)[%s]);' % (T, T, t, index)
+
+
+def compose(stages, callback_type, array, kind, double=False, dtype=None, loop_axes=(), queue=None):
+    """generate source of pre or post callback combining stages
+
+    Parameters
+    ----------
+    stages : list of `Callback`
+
+    callback_type : 'pre' or 'post'
+
+    array : pyopencl.array.Array
+        data the callback acts on (input array for pre, output array
+        for post callbacks, real part for planar data)
+
+    kind : 'complex', 'real' or 'planar'
+        layout of the data
+
+    double : bool
+        double precision transform
+
+    dtype : numpy dtype, optional
+        dtype of input data, if it needs conversion (pre callbacks)
+
+    loop_axes : list of int
+        axes not handled by the plan's batch, but by separate enqueues
+
+    queue : pyopencl.CommandQueue, optional
+        queue for uploads of stages (e.g. window coefficients),
+        default: queue of `array`
+
+    Returns
+    -------
+    (source, userdata) : source (bytes) of function named `callback_type`,
+        userdata array (None if no stage needs one)
+    """
+    info = _Info(callback_type, array, kind, double, loop_axes, queue)
+    if isinstance(stages, Callback):
+        stages = [stages]
+    for stage in stages:
+        stage.setup(info)
+
+    userdata = [stage.userdata for stage in stages if stage.userdata is not None]
+    if len(userdata) > 1:
+        raise ValueError('at most one stage using an array (Window, Scale with array, Multiply, '
+                         'output to array) allowed per callback, clFFT supports a single userdata buffer')
+    for stage in stages[:-1]:
+        if stage.stores:
+            raise ValueError('stage writing to array must be last stage of callback')
+    for stage in stages[1:]:
+        if stage.loads:
+            raise ValueError('stage reading input must be first stage of callback')
+    loads = bool(stages) and stages[0].loads
+    if loads and callback_type != 'pre':
+        raise ValueError('stage reading input only supported for pre callbacks')
+
+    body = [stage.code(info) for stage in stages]
+
+    T, V = info.T, info.V
+    if callback_type == 'pre':
+        if kind == 'planar':
+            head = '%s pre(__global void* inRe, __global void* inIm, uint inoffset, __global void* userdata)' % V
+        else:
+            head = '%s pre(__global void* in, uint inoffset, __global void* userdata)' % V
+        if not loads:
+            body.insert(0, _load(info, dtype if dtype is not None else array.dtype))
+        body.append('return v;')
+    else:
+        if kind == 'planar':
+            head = ('void post(__global void* outputRe, __global void* outputIm, uint outoffset, '
+                    '__global void* userdata, %s fftoutputRe, %s fftoutputIm)' % (T, T))
+            body.insert(0, '%s v = (%s)(fftoutputRe, fftoutputIm);' % (V, V))
+            store = ('((__global %s*)outputRe)[outoffset] = v.x; ((__global %s*)outputIm)[outoffset] = v.y;'
+                     % (T, T))
+        else:
+            head = ('void post(__global void* output, uint outoffset, __global void* userdata, %s fftoutput)'
+                    % V)
+            body.insert(0, '%s v = fftoutput;' % V)
+            store = '((__global %s*)output)[outoffset] = v;' % V
+        if not (stages and stages[-1].stores):
+            body.append(store)
+
+    source = head + '\n{\n' + ''.join('    %s\n' % line for line in body) + '}\n'
+    return source.encode(), (userdata[0] if userdata else None)
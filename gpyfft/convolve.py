@@ -0,0 +1,386 @@
+"""
+FFT based convolution and correlation of pyopencl arrays.
+
+`Convolution` convolves (or correlates) arrays with a fixed kernel.
+The spectrum of the kernel is computed once, the multiplication with
+it is fused into a post callback of the forward transform, so a
+convolution takes a zero-padding copy, two transforms and a cropping
+copy. Transform sizes are padded to lengths with small prime factors
+(2, 3, 5, 7), for which clFFT is fast, or to the fastest length
+measured on the device (see `gpyfft.sizes.next_fast_len`).
+`fftconvolve` and `correlate` are the functional interface, similar
+to `scipy.signal`. They keep recently used `Convolution` objects per
+queue and shapes, so repeated calls reuse plans and buffers; only the
+kernel spectrum is computed again, into the same buffer.
+
+`BlockConvolution` convolves long 1D signals (along the last axis)
+with a short kernel in blocks of fixed size, using the overlap-save or
+overlap-add method. All blocks of a chunk are transformed by one
+batched plan; for overlap-save the overlapping input blocks are read
+directly from the signal segment by a plan with distance (hop) smaller
+than the transform length.
+"""
+
+from __future__ import absolute_import, division, print_function
+import threading
+from collections import OrderedDict
+import numpy as np
+import pyopencl.array as cla
+from .fft import FFT
+from .arrays import _copy_region, _overlap_add
+from .callbacks import Multiply, Conjugate
+from .numpy_fft import _allocator, _complex_dtypes
+from .sizes import next_fast_len, RADICES, FAST_RADICES
+
+__all__ = ['Convolution', 'BlockConvolution', 'fftconvolve', 'correlate']
+
+
+def _fast_len(n, fast_len, queue, real, double):
+    """transform length for zero padding to at least n, see `Convolution`"""
+    if fast_len == 'measure':
+        return next_fast_len(n, real=real, queue=queue, double=double)
+    return next_fast_len(n, radices=FAST_RADICES if fast_len else RADICES)
+
+
+def _work_dtypes(dtype, kernel_dtype):
+    """(work dtype, complex dtype), work dtype is real if both inputs are real"""
+    dtype = np.result_type(dtype, kernel_dtype)
+    if dtype not in _complex_dtypes:
+        raise TypeError('unsupported dtype %s' % dtype)
+    cdtype = _complex_dtypes[dtype]
+    return (dtype if dtype.kind == 'f' else cdtype), cdtype
+
+
+def _spectrum_shape(shape, axis, real):
+    shape = list(shape)
+    if real:
+        shape[axis] = shape[axis]//2 + 1
+    return tuple(shape)
+
+
+class _KernelSpectrum(object):
+    """spectrum of zero padded kernel (conjugated for correlation), computed into a fixed buffer"""
+
+    def __init__(self, context, queue, kernel, shape, axes, work_dtype, cdtype, correlate):
+        self.queue = queue
+        self.kernel_shape, self.kernel_dtype = kernel.shape, kernel.dtype
+        self.work = cla.empty(queue, tuple(shape), work_dtype)
+        callbacks = {'post': [Conjugate()]} if correlate else None
+        # first transform axis is the one with hermitian symmetry
+        if work_dtype.kind == 'f':
+            self.spectrum = cla.empty(queue, _spectrum_shape(shape, axes[-1], True), cdtype)
+            self._transform = FFT(context, queue, self.work, self.spectrum, axes=axes[::-1], callbacks=callbacks)
+        else:
+            self.spectrum = self.work
+            self._transform = FFT(context, queue, self.work, axes=axes[::-1], callbacks=callbacks)
+        self.compute(kernel)
+
+    def compute(self, kernel):
+        """enqueue computation of spectrum of `kernel` (same shape and dtype as before)"""
+        assert kernel.shape == self.kernel_shape and kernel.dtype == self.kernel_dtype
+        _copy_region(kernel, self.work.shape, dtype=self.work.dtype, out=self.work, queue=self.queue)
+        for event in self._transform.enqueue(wait_for_events=self.work.events):
+            self.spectrum.add_event(event)
+
+
+class Convolution(object):
+    """FFT convolution (or correlation) with a fixed kernel
+
+    Parameters
+    ----------
+    context : pyopencl.Context
+
+    queue : pyopencl.CommandQueue
+
+    kernel : pyopencl.array.Array
+        same number of dimensions as input arrays. Along axes not
+        convolved, size 1 (same kernel for all) or same size as input.
+
+    shape : tuple
+        shape of input arrays
+
+    dtype : numpy dtype
+        dtype of input arrays
+
+    axes : tuple of int, optional
+        axes to convolve over, default: all axes
+
+    mode : 'full', 'same' or 'valid'
+        size of result, as for `scipy.signal.fftconvolve`
+
+    correlate : bool
+        compute cross-correlation (as `scipy.signal.correlate`)
+        instead of convolution
+
+    fast_len : True, False or 'measure'
+        zero padding of transforms: to lengths with prime factors 2,
+        3, 5, 7 (True), to the smallest length supported by clFFT
+        (False) or to the fastest length measured on the device
+    """
+
+    def __init__(self, context, queue, kernel, shape, dtype, axes=None, mode='full', correlate=False,
+                 fast_len=True):
+        self.context = context
+        self.queue = queue
+        self.shape = shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        ndim = len(shape)
+        if kernel.ndim != ndim:
+            raise ValueError('kernel must have same number of dimensions as input')
+        if axes is None:
+            axes = range(ndim)
+        axes = sorted(a % ndim for a in axes)
+        for a in range(ndim):
+            if a not in axes and kernel.shape[a] not in (1, shape[a]):
+                raise ValueError('kernel shape %s does not match input shape %s' % (kernel.shape, shape))
+
+        work_dtype, cdtype = _work_dtypes(self.dtype, kernel.dtype)
+        real = work_dtype.kind == 'f'
+        double = cdtype == np.complex128
+
+        fast_shape = list(shape)
+        kernel_shape = list(kernel.shape)
+        out_shape = list(shape)
+        starts = [0] * ndim
+        for a in axes:
+            n, m = shape[a], kernel.shape[a]
+            fast_shape[a] = kernel_shape[a] = _fast_len(n + m - 1, fast_len, queue, real, double)
+            if mode == 'full':
+                out_shape[a], starts[a] = n + m - 1, 0
+            elif mode == 'same':
+                out_shape[a], starts[a] = n, (m - 1)//2
+            elif mode == 'valid':
+                if m > n:
+                    raise ValueError('kernel larger than input in valid mode')
+                out_shape[a], starts[a] = n - m + 1, m - 1
+            else:
+                raise ValueError('invalid mode %r' % (mode,))
+            if correlate:
+                starts[a] -= m - 1 #negative lags wrap around
+        self.out_shape = tuple(out_shape)
+        self.out_dtype = work_dtype
+        self._starts = starts
+        self._wrap = [correlate and a in axes for a in range(ndim)]
+
+        self._kernel = _KernelSpectrum(context, queue, kernel, kernel_shape, axes, work_dtype, cdtype, correlate)
+        self.kernel_spectrum = self._kernel.spectrum
+
+        # forward transform with fused multiplication, inverse transform
+        self.work = cla.empty(queue, tuple(fast_shape), work_dtype)
+        multiply = {'post': [Multiply(self.kernel_spectrum)]}
+        t_axes = axes[::-1]
+        if real:
+            self.spectrum = cla.empty(queue, _spectrum_shape(fast_shape, axes[-1], True), cdtype)
+            self._forward = FFT(context, queue, self.work, self.spectrum, axes=t_axes, callbacks=multiply)
+            self._inverse = FFT(context, queue, self.spectrum, self.work, axes=t_axes, real=True)
+        else:
+            self.spectrum = self.work
+            self._forward = FFT(context, queue, self.work, axes=t_axes, callbacks=multiply)
+            self._inverse = FFT(context, queue, self.work, axes=t_axes)
+
+    def set_kernel(self, kernel):
+        """replace kernel by one of same shape and dtype, plans are kept"""
+        self._kernel.compute(kernel)
+
+    def __call__(self, a, out=None):
+        """convolve array `a`, returns result (new array or `out`)"""
+        assert a.shape == self.shape and a.dtype == self.dtype
+        _copy_region(a, self.work.shape, dtype=self.work.dtype, out=self.work, queue=self.queue)
+        events = self._forward.enqueue(wait_for_events=self.work.events + self.kernel_spectrum.events)
+        events = self._inverse.enqueue(forward=False, wait_for_events=events)
+        for event in events:
+            self.work.add_event(event)
+        if out is None:
+            out = cla.empty(self.queue, self.out_shape, self.out_dtype, allocator=_allocator(self.queue))
+        return _copy_region(self.work, self.out_shape, starts=self._starts, wrap=self._wrap,
+                            out=out, queue=self.queue)
+
+
+_convolutions = OrderedDict() #key -> (Convolution, lock), least recently used first
+_convolutions_lock = threading.Lock()
+_convolutions_cache_size = 8
+
+
+def _convolve(a, b, mode, axes, correlate, fast_len):
+    """convolve with cached `Convolution` for queue, shapes and parameters"""
+    if axes is not None:
+        axes = tuple(sorted(ax % a.ndim for ax in axes))
+    key = (a.queue, a.shape, a.dtype, b.shape, b.dtype, axes, mode, correlate, fast_len)
+    with _convolutions_lock:
+        entry = _convolutions.pop(key, None)
+        new = entry is None
+        if new:
+            entry = (Convolution(a.context, a.queue, b, a.shape, a.dtype, axes=axes, mode=mode,
+                                 correlate=correlate, fast_len=fast_len), threading.Lock())
+        _convolutions[key] = entry
+        while len(_convolutions) > _convolutions_cache_size:
+            _convolutions.popitem(last=False)
+    convolution, lock = entry
+    with lock: #work arrays are shared
+        if not new:
+            convolution.set_kernel(b)
+        return convolution(a)
+
+
+def fftconvolve(a, b, mode='full', axes=None, fast_len=True):
+    """convolve pyopencl arrays `a` and `b` using FFTs, see `scipy.signal.fftconvolve`
+
+    `b` is the kernel, it can be broadcast along axes not convolved.
+    For `fast_len` see `Convolution`.
+    """
+    return _convolve(a, b, mode, axes, False, fast_len)
+
+
+def correlate(a, b, mode='full', axes=None, fast_len=True):
+    """cross-correlate pyopencl arrays `a` and `b` using FFTs, see `scipy.signal.correlate`"""
+    return _convolve(a, b, mode, axes, True, fast_len)
+
+
+class _Chunk(object):
+    # work arrays and transforms for blocks of one chunk, for given batch shape
+
+    def __init__(self, context, queue, batch_shape, n_blocks, fft_size, hop, method,
+                 work_dtype, cdtype, kernel_spectrum):
+        real = work_dtype.kind == 'f'
+        L = fft_size
+        itemsize = work_dtype.itemsize
+        if method == 'save':
+            # overlapping blocks, read from signal segment
+            self.segment = cla.empty(queue, batch_shape + ((n_blocks-1)*hop + L,), work_dtype)
+            self.blocks = cla.Array(queue, batch_shape + (n_blocks, L), work_dtype,
+                                    strides=self.segment.strides[:-1] + (hop*itemsize, itemsize),
+                                    data=self.segment.base_data)
+        else:
+            self.segment = cla.empty(queue, batch_shape + (n_blocks*hop,), work_dtype)
+            self.blocks = cla.empty(queue, batch_shape + (n_blocks, L), work_dtype)
+        self.result = cla.empty(queue, batch_shape + (n_blocks, L), work_dtype)
+
+        multiply = {'post': [Multiply(kernel_spectrum.reshape((1,)*(len(batch_shape)+1) + kernel_spectrum.shape))]}
+        if real:
+            self.spectrum = cla.empty(queue, batch_shape + (n_blocks, L//2 + 1), cdtype)
+            self.forward = FFT(context, queue, self.blocks, self.spectrum, axes=(-1,), callbacks=multiply)
+            self.inverse = FFT(context, queue, self.spectrum, self.result, axes=(-1,), real=True)
+        else:
+            self.forward = FFT(context, queue, self.blocks, self.result, axes=(-1,), callbacks=multiply)
+            self.inverse = FFT(context, queue, self.result, axes=(-1,))
+
+
+class BlockConvolution(object):
+    """convolution of long signals with a short 1D kernel in blocks
+
+    Signals are convolved along their last axis, leading axes are
+    batch axes. Blocks of `fft_size` are transformed by a batched plan
+    of fixed size, `n_blocks` blocks at a time.
+
+    Parameters
+    ----------
+    context : pyopencl.Context
+
+    queue : pyopencl.CommandQueue
+
+    kernel : pyopencl.array.Array
+        1D kernel of length m
+
+    dtype : numpy dtype
+        dtype of signals
+
+    fft_size : int, optional
+        transform length, default: fast length of at least 4*m (and
+        at least 1024), with `fast_len` as for `Convolution`
+
+    method : 'save' or 'add'
+        overlap-save or overlap-add
+
+    n_blocks : int
+        number of blocks per chunk (batched transform)
+    """
+
+    def __init__(self, context, queue, kernel, dtype=np.float32, fft_size=None, method='save', n_blocks=16,
+                 fast_len=True):
+        assert kernel.ndim == 1
+        if method not in ('save', 'add'):
+            raise ValueError('invalid method %r' % (method,))
+        self.context = context
+        self.queue = queue
+        self.dtype = np.dtype(dtype)
+        self.m = m = kernel.shape[0]
+        self._work_dtype, self._cdtype = _work_dtypes(self.dtype, kernel.dtype)
+        if fft_size is None:
+            fft_size = _fast_len(max(4*m, 1024), fast_len, queue, self._work_dtype.kind == 'f',
+                                 self._cdtype == np.complex128)
+        if fft_size < m:
+            raise ValueError('fft_size must not be smaller than kernel')
+        self.fft_size = fft_size
+        self.hop = fft_size - m + 1 #new samples per block
+        self.method = method
+        self.n_blocks = n_blocks
+
+        self.kernel_spectrum = _KernelSpectrum(context, queue, kernel, (fft_size,), [0],
+                                               self._work_dtype, self._cdtype, False).spectrum
+        self._chunks = {} #batch shape -> _Chunk
+
+    def _chunk(self, batch_shape):
+        chunk = self._chunks.get(batch_shape)
+        if chunk is None:
+            chunk = _Chunk(self.context, self.queue, batch_shape, self.n_blocks, self.fft_size, self.hop,
+                           self.method, self._work_dtype, self._cdtype, self.kernel_spectrum)
+            self._chunks[batch_shape] = chunk
+        return chunk
+
+    def _transform(self, chunk):
+        events = chunk.forward.enqueue(wait_for_events=chunk.blocks.events + self.kernel_spectrum.events)
+        events = chunk.inverse.enqueue(forward=False, wait_for_events=events)
+        for event in events:
+            chunk.result.add_event(event)
+
+    def __call__(self, signal, out=None):
+        """full convolution of `signal` (..., n), returns result (..., n+m-1)"""
+        assert signal.dtype == self.dtype
+        batch_shape = signal.shape[:-1]
+        n = signal.shape[-1]
+        m, hop, L = self.m, self.hop, self.fft_size
+        length = n + m - 1
+        if out is None:
+            out = cla.empty(self.queue, batch_shape + (length,), self._work_dtype,
+                            allocator=_allocator(self.queue))
+        assert out.shape == batch_shape + (length,) and out.dtype == self._work_dtype
+
+        chunk = self._chunk(batch_shape)
+        zeros = (0,) * len(batch_shape)
+        chunk_length = self.n_blocks * hop
+        queue = self.queue
+        if self.method == 'add':
+            out.fill(0)
+
+        for t0 in range(0, length, chunk_length):
+            if self.method == 'save':
+                # input block b of chunk starts at t0 + b*hop - (m-1), valid output from m-1
+                _copy_region(signal, chunk.segment.shape, starts=zeros + (t0 - (m-1),),
+                             out=chunk.segment, queue=queue)
+                self._transform(chunk)
+                count = min(chunk_length, length - t0)
+                n_full, rest = divmod(count, hop)
+                valid = chunk.result[..., m-1:]
+                if n_full:
+                    itemsize = out.dtype.itemsize
+                    dst = cla.Array(queue, batch_shape + (n_full, hop), out.dtype,
+                                    strides=out.strides[:-1] + (hop*out.strides[-1], out.strides[-1]),
+                                    data=out.base_data, offset=out.offset + t0*out.strides[-1])
+                    assert dst.offset % itemsize == 0
+                    _copy_region(valid[..., :n_full, :], dst.shape, out=dst, queue=queue)
+                if rest:
+                    start = t0 + n_full*hop
+                    _copy_region(valid[..., n_full, :rest], batch_shape + (rest,),
+                                 out=out[..., start:start+rest], queue=queue)
+            else:
+                if t0 >= n:
+                    break #remaining output is overlap of previous blocks
+                # non-overlapping input blocks, zero padded to fft size
+                _copy_region(signal, chunk.segment.shape, starts=zeros + (t0,),
+                             out=chunk.segment, queue=queue)
+                segment = chunk.segment.reshape(batch_shape + (self.n_blocks, hop))
+                _copy_region(segment, chunk.blocks.shape, out=chunk.blocks, queue=queue)
+                self._transform(chunk)
+                stop = min(length, t0 + (self.n_blocks-1)*hop + L)
+                _overlap_add(chunk.result, hop, out[..., t0:stop], accumulate=True, queue=queue)
+        return out
@@ -0,0 +1,258 @@
+"""
+Cost model and roofline report of transforms.
+
+`estimate` models a baked plan: floating point operations, the number
+of kernel passes, bytes moved through global memory (input and output
+plus intermediate results of multi-pass transforms) and memory access
+issues like strides that are multiples of a large power of two. clFFT
+does not expose the kernels it generates, the number of passes
+follows clFFT's decomposition: a transform axis of length n is done in a single pass
+if n complex values fit into local memory, otherwise in
+ceil(log(n)/log(n_max)) passes.
+
+`report` measures a transform and compares it with the peak memory
+bandwidth and compute rate of the device (measured once per device by
+`device_peaks`, or given explicitly). Whether a transform is memory
+or compute bound follows from its arithmetic intensity (flops per
+byte) relative to the ridge point of the device::
+
+    print(format_report(transform.report()))
+"""
+
+from __future__ import absolute_import, division, print_function
+import threading
+import numpy as np
+import pyopencl as cl
+import gpyfft.gpyfftlib as gfft
+
+__all__ = ['flops', 'io_bytes', 'estimate', 'device_peaks', 'report', 'format_report']
+
+
+_conflict_bytes = 2048 #strides that are multiples of this hit the same memory channels
+
+
+def _real_size(signature):
+    return 8 if signature.precision == gfft.clfftPrecision_.CLFFT_DOUBLE else 4
+
+
+def _n_hermitian(t_shape):
+    n = int(np.prod(t_shape))
+    return n//t_shape[0]*(t_shape[0]//2 + 1)
+
+
+def _itemsize(layout, real_size):
+    """bytes per element (per array for planar layouts)"""
+    if layout in (gfft.clfftLayout_.CLFFT_COMPLEX_INTERLEAVED, gfft.clfftLayout_.CLFFT_HERMITIAN_INTERLEAVED):
+        return 2*real_size
+    return real_size
+
+
+def flops(signature):
+    """floating point operations of transform (5 N log2 N per complex transform, half for real)"""
+    n = int(np.prod(signature.t_shape))
+    result = 5.*n*np.log2(max(n, 2))*signature.batch_size
+    if gfft.clfftLayout_.CLFFT_REAL in signature.layouts:
+        result /= 2
+    return result
+
+
+def io_bytes(signature):
+    """bytes of input and output of transform (each accessed once)"""
+    real_size = _real_size(signature)
+    n = int(np.prod(signature.t_shape))
+    sizes = {gfft.clfftLayout_.CLFFT_REAL: n*real_size,
+             gfft.clfftLayout_.CLFFT_HERMITIAN_INTERLEAVED: _n_hermitian(signature.t_shape)*2*real_size,
+             gfft.clfftLayout_.CLFFT_HERMITIAN_PLANAR: _n_hermitian(signature.t_shape)*2*real_size}
+    return signature.batch_size*sum(sizes.get(layout, n*2*real_size) for layout in signature.layouts)
+
+
+def _max_single_pass(local_mem_size, real_size):
+    """longest power of two length transformed in local memory (clFFT: at most 4096 single, 2048 double)"""
+    n = min(local_mem_size // (2*real_size), 4096 if real_size == 4 else 2048)
+    return 2**int(np.log2(max(n, 2)))
+
+
+def _stride_issues(signature, real_size):
+    """list of warnings about memory access patterns"""
+    issues = []
+    for name, strides, layout in (('input', signature.strides_in, signature.layouts[0]),
+                                  ('output', signature.strides_out, signature.layouts[1])):
+        itemsize = _itemsize(layout, real_size)
+        if strides[0] != 1:
+            issues.append('%s: first transform axis has stride %d, accesses are not contiguous'
+                          % (name, strides[0]))
+        for axis, stride in enumerate(strides):
+            nbytes = stride*itemsize
+            if axis > 0 and nbytes % _conflict_bytes == 0:
+                issues.append('%s: transform axis %d has stride %d (%d bytes, multiple of %d), '
+                              'memory channel conflicts likely, consider padding (gpyfft.sizes)'
+                              % (name, axis, stride, nbytes, _conflict_bytes))
+    return issues
+
+
+def estimate(signature, local_mem_size=32768):
+    """cost model of transform with `PlanSignature`
+
+    Returns dict with flops, passes (per transform axis and total),
+    io_bytes (input and output), bytes (including intermediate
+    results of additional passes), intensity (flops per byte) and a
+    list of memory access issues.
+    """
+    real_size = _real_size(signature)
+    n_max = _max_single_pass(local_mem_size, real_size)
+    axis_passes = [int(np.ceil(np.log(n)/np.log(n_max) - 1e-9)) if n > n_max else 1
+                   for n in signature.t_shape]
+    passes = sum(axis_passes)
+
+    n = int(np.prod(signature.t_shape))
+    if gfft.clfftLayout_.CLFFT_REAL in signature.layouts:
+        n = _n_hermitian(signature.t_shape)
+    intermediate = signature.batch_size*n*2*real_size #complex intermediate result, written and read
+    total_bytes = io_bytes(signature) + 2*(passes - 1)*intermediate
+    result_flops = flops(signature)
+    return dict(flops=result_flops,
+                passes=passes,
+                axis_passes=axis_passes,
+                max_single_pass=n_max,
+                io_bytes=io_bytes(signature),
+                bytes=total_bytes,
+                intensity=result_flops/total_bytes,
+                issues=_stride_issues(signature, real_size))
+
+
+_peak_source = """
+#ifdef USE_DOUBLE
+#pragma OPENCL EXTENSION cl_khr_fp64: enable
+#endif
+__kernel void peak_flops(__global T *out, T a, T b)
+{
+    T x0 = get_global_id(0), x1 = x0 + 1, x2 = x0 + 2, x3 = x0 + 3;
+    T x4 = x0 + 4, x5 = x0 + 5, x6 = x0 + 6, x7 = x0 + 7;
+    for (int i = 0; i < N_ITER; i++) {
+        x0 = mad(x0, a, b); x1 = mad(x1, a, b); x2 = mad(x2, a, b); x3 = mad(x3, a, b);
+        x4 = mad(x4, a, b); x5 = mad(x5, a, b); x6 = mad(x6, a, b); x7 = mad(x7, a, b);
+    }
+    out[get_global_id(0)] = x0 + x1 + x2 + x3 + x4 + x5 + x6 + x7;
+}
+"""
+
+_n_iter = 1024
+_peaks = {} #(device, double) -> dict
+_peaks_lock = threading.Lock()
+
+
+def _best_duration(queue, enqueue, n_run):
+    """minimum duration (s) of commands enqueued by `enqueue()`, from event profiling"""
+    durations = []
+    for i in range(n_run):
+        event = enqueue()
+        event.wait()
+        durations.append(1e-9*(event.profile.end - event.profile.start))
+    return min(durations)
+
+
+def _profiling_queue(context, device):
+    return cl.CommandQueue(context, device, properties=cl.command_queue_properties.PROFILING_ENABLE)
+
+
+def device_peaks(context, device, double=False, n_run=5):
+    """measured peak memory bandwidth (GB/s, device to device copy) and
+    compute rate (Gflops, multiply-add) of device, cached per device"""
+    key = (device.int_ptr, double)
+    with _peaks_lock:
+        if key in _peaks:
+            return _peaks[key]
+    queue = _profiling_queue(context, device)
+
+    size = int(min(64*2**20, device.max_mem_alloc_size // 4))
+    src = cl.Buffer(context, cl.mem_flags.READ_WRITE, size)
+    dest = cl.Buffer(context, cl.mem_flags.READ_WRITE, size)
+    cl.enqueue_fill_buffer(queue, src, np.uint8(0), 0, size)
+    copy_time = _best_duration(queue, lambda: cl.enqueue_copy(queue, dest, src), n_run)
+
+    dtype = np.float64 if double else np.float32
+    options = ['-D', 'T=double', '-D', 'USE_DOUBLE'] if double else ['-D', 'T=float']
+    program = cl.Program(context, _peak_source).build(options=options + ['-D', 'N_ITER=%d' % _n_iter])
+    kernel = program.peak_flops
+    global_size = device.max_compute_units*device.max_work_group_size*4
+    out = cl.Buffer(context, cl.mem_flags.WRITE_ONLY, global_size*np.dtype(dtype).itemsize)
+    kernel.set_args(out, dtype(0.999), dtype(0.001))
+    compute_time = _best_duration(queue, lambda: cl.enqueue_nd_range_kernel(queue, kernel, (global_size,), None),
+                                  n_run)
+
+    peaks = dict(gbps=1e-9*2*size/copy_time, gflops=1e-9*2*8*_n_iter*global_size/compute_time)
+    with _peaks_lock:
+        _peaks[key] = peaks
+    return peaks
+
+
+def _measure(transform, queue, n_run):
+    """median device time (s) of transform, marker before transform gives its start"""
+    durations = []
+    for i in range(n_run):
+        marker = cl.enqueue_marker(queue)
+        events = transform.enqueue_arrays(queue=queue)
+        events[-1].wait()
+        durations.append(1e-9*(events[-1].profile.end - marker.profile.end))
+    return float(np.median(durations))
+
+
+def report(transform, measure=True, peaks=None, n_run=20):
+    """cost model and roofline analysis of `FFT` object
+
+    `peaks` is a dict with peak 'gbps' and 'gflops' of the device,
+    measured if not given. With `measure`, the transform (bound
+    arrays) is executed `n_run` times, on a separate profiling
+    command queue.
+
+    Returns dict with the estimate (summed over stages of transforms
+    over more than 3 axes), temp_size, peaks, ridge point (flops per
+    byte), bound ('memory' or 'compute'), time_bound_ms (lower bound
+    for the time from the roofline) and with `measure` time_ms,
+    gflops, gbps and efficiency (fraction of the roofline bound).
+    """
+    device = transform.queue.device
+    stages = [stage for stage, source, target in transform.stages] if transform.stages else [transform]
+    estimates = [estimate(stage.signature, device.local_mem_size) for stage in stages]
+    result = dict(estimates[0])
+    if len(estimates) > 1:
+        for key in ('flops', 'passes', 'io_bytes', 'bytes'):
+            result[key] = sum(e[key] for e in estimates)
+        result['axis_passes'] = [p for e in estimates for p in e['axis_passes']]
+        result['issues'] = [issue for e in estimates for issue in e['issues']]
+        result['intensity'] = result['flops']/result['bytes']
+    result['temp_size'] = transform.temp_size
+
+    double = stages[0].signature.precision == gfft.clfftPrecision_.CLFFT_DOUBLE
+    if peaks is None:
+        peaks = device_peaks(transform.context, device, double)
+    ridge = peaks['gflops']/peaks['gbps']
+    result.update(peaks=peaks, ridge=ridge,
+                  bound='memory' if result['intensity'] < ridge else 'compute',
+                  time_bound_ms=1e3*max(1e-9*result['flops']/peaks['gflops'],
+                                        1e-9*result['bytes']/peaks['gbps']))
+    if measure:
+        transform.queue.finish()
+        time = _measure(transform, _profiling_queue(transform.context, device), n_run)
+        result.update(time_ms=1e3*time,
+                      gflops=1e-9*result['flops']/time,
+                      gbps=1e-9*result['bytes']/time,
+                      efficiency=1e-3*result['time_bound_ms']/time)
+    return result
+
+
+def format_report(result):
+    """report as text"""
+    lines = ['%.3g Gflop, %d kernel pass(es) %s, %.1f MB moved (%.1f MB input/output), '
+             'temp buffer %d bytes'
+             % (1e-9*result['flops'], result['passes'], result['axis_passes'], 1e-6*result['bytes'],
+                1e-6*result['io_bytes'], result['temp_size']),
+             'intensity %.2f flop/byte, device ridge point %.2f flop/byte (%.1f Gflops, %.1f GB/s): %s bound'
+             % (result['intensity'], result['ridge'], result['peaks']['gflops'], result['peaks']['gbps'],
+                result['bound']),
+             'roofline time bound %.3f ms' % result['time_bound_ms']]
+    if 'time_ms' in result:
+        lines.append('measured %.3f ms, %.1f Gflops, %.1f GB/s, %.0f%% of roofline'
+                     % (result['time_ms'], result['gflops'], result['gbps'], 100*result['efficiency']))
+    lines.extend('warning: ' + issue for issue in result['issues'])
+    return '\n'.join(lines)
@@ -1,43 +1,193 @@
 from __future__ import absolute_import, division, print_function
 from .gpyfftlib import GpyFFT
 import gpyfft.gpyfftlib as gfft
+from .cache import PlanSignature, plan_cache, load_manifest as _load_manifest, \
+    manifest_signatures as _manifest_signatures
+from .wisdom import wisdom as global_wisdom
+from .scratch import scratch_buffer
+from .arrays import _component, complex_view, real_view
+from .callbacks import compose as _compose_callbacks, transform_dtype as _transform_dtype
+from . import profiling as _profiling, cost as _cost
 import pyopencl as cl
+import pyopencl.array as cla
 GFFT = GpyFFT(debug=False)
 
 import pyopencl as cl
 import numpy as np
+import os as _os
+import threading as _threading
+import timeit as _timeit
+from collections import OrderedDict as _OrderedDict
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor, wait as _wait_futures
 
 # TODO:
 
+def create_baked_plan(context, queue, signature):
+    """create and bake plan for given `PlanSignature`"""
+    plan = GFFT.create_plan(context, signature.t_shape)
+    plan.inplace = signature.inplace
+    plan.strides_in = signature.strides_in
+    plan.strides_out = signature.strides_out
+    plan.distances = signature.distances
+    plan.batch_size = signature.batch_size
+    plan.precision = signature.precision
+    plan.layouts = signature.layouts
+    if signature.scales is not None:
+        plan.scale_forward, plan.scale_backward = signature.scales
+
+    # callbacks: function has to be named 'pre' or 'post'
+    if signature.callbacks is not None:
+        for callback_type, source, user_data in signature.callbacks:
+            plan.set_callback(callback_type.encode(), source, callback_type, user_data=user_data)
+
+    tic = _timeit.default_timer()
+    plan.bake(queue)
+    profiler = _profiling.active
+    if profiler is not None:
+        profiler._bake(signature, tic, _timeit.default_timer())
+    return plan
+
+
+_bake_executor = None
+_bake_executor_lock = _threading.Lock()
+
+def _executor():
+    # worker threads for baking, GPYFFT_BAKE_THREADS: number of threads
+    global _bake_executor
+    with _bake_executor_lock:
+        if _bake_executor is None:
+            n_threads = int(_os.environ.get('GPYFFT_BAKE_THREADS', 0)) or None
+            _bake_executor = _ThreadPoolExecutor(max_workers=n_threads)
+        return _bake_executor
+
+
+def bake_async(context, queue, signature):
+    """bake plan for `PlanSignature` in a background thread
+
+    Returns a `concurrent.futures.Future` of the plan. The plan is
+    entered into the plan cache at once, `FFT` objects for the same
+    transform wait for it instead of baking it again.
+    """
+    key = (context, queue.device, signature)
+    return plan_cache.get_future(key, lambda: create_baked_plan(context, queue, signature),
+                                 executor=_executor())
+
+
+def warmup(context, queue, manifest, wait=True):
+    """bake all plans of a manifest in parallel
+
+    `manifest` is a filename or dict written by
+    `plan_cache.save_manifest` (or `plan_cache.manifest()`), e.g. at
+    the end of a previous run. Calling this at startup avoids
+    compile latency on first use of these transforms. Make sure
+    `plan_cache.maxsize` is large enough to keep all plans.
+
+    Returns list of futures of plans, with `wait` all are baked (and
+    errors raised) before returning.
+    """
+    if isinstance(manifest, dict):
+        signatures = _manifest_signatures(manifest)
+    else:
+        signatures = _load_manifest(manifest)
+    futures = [bake_async(context, queue, signature) for signature in signatures]
+    if wait:
+        _wait_futures(futures)
+        for future in futures:
+            future.result()
+    return futures
+
+
 class FFT(object):
+    sub_buffer_cache_size = 64 #sub-buffers for arrays with offsets, cached per transform
+
     def __init__(self, context, queue, in_array, out_array=None, axes = None,
                  fast_math = False,
                  real=False,
-                 callbacks=None, #dict: 'pre', 'post'
+                 callbacks=None, #dict: 'pre', 'post': source or list of gpyfft.callbacks stages
+                 wisdom=None, #None: use global wisdom, False: ignore wisdom
+                 tune=False,
+                 norm=None, #None/'backward', 'ortho', 'forward', as numpy.fft
+                 sub_buffer_cache_size=None, #None: class default, 0: no caching
     ):
         # Callbacks: dict(pre=b'pre source (kernel named pre!)')
         self.context = context
         self.queue = queue
+        if sub_buffer_cache_size is not None:
+            self.sub_buffer_cache_size = sub_buffer_cache_size
+        self._sub_buffers = _OrderedDict() #(buffer, offset) -> sub-buffer, least recently used first
+        self._sub_buffers_lock = _threading.Lock()
+        self._queue_scratch = {} #queue -> scratch buffer, for enqueue on other queues
+
+        # planar complex data: tuple of real arrays (real part, imaginary part)
+        in_planar = isinstance(in_array, tuple)
+        out_planar = isinstance(out_array, tuple)
+        if in_planar:
+            self._check_planar(in_array)
+        if out_planar:
+            self._check_planar(out_array)
+        in_ref, out_ref = _component(in_array), _component(out_array)
 
         # if no axes are given, transform all axes, select axes order for good performance depending on memory layout
         if axes is None:
-            if in_array.flags.c_contiguous:
-                axes = np.arange(in_array.ndim)[::-1]
-            elif in_array.flags.f_contiguous:
-                axes = np.arange(in_array.ndim)
+            if in_ref.flags.c_contiguous:
+                axes = np.arange(in_ref.ndim)[::-1]
+            elif in_ref.flags.f_contiguous:
+                axes = np.arange(in_ref.ndim)
             else:
-                axes = np.arange(in_array.ndim)[::-1]
+                axes = np.arange(in_ref.ndim)[::-1]
                 # TODO: find good heuristics for this (rare), e.g. based on strides
         else:
             axes = np.asarray(axes)
-            
-        t_strides_in, t_distance_in, t_batchsize_in, t_shape, axes_transform = self.calculate_transform_strides(axes, in_array)
+
+        # in-place real transforms: complex view of padded real storage, and vice versa
+        if out_array is None and not in_planar:
+            if in_ref.dtype in (np.float32, np.float64):
+                out_array = out_ref = complex_view(in_array, axes[0])
+            elif real:
+                out_array = out_ref = real_view(in_array, axis=axes[0])
+
+        # apply tuned axes order
+        if wisdom is None:
+            wisdom = global_wisdom
+        if wisdom is not False:
+            decision = wisdom.lookup(queue.device, in_array, out_array, axes, real)
+            if decision is None and tune:
+                decision = wisdom.tune(context, queue, in_array, out_array, axes, real)
+            if decision is not None:
+                axes = np.asarray(decision['axes'])
+
+        if len(axes) > 3:
+            # clFFT supports 1D to 3D transforms only
+            self._init_stages(in_array, out_array, axes, fast_math, real, callbacks, norm)
+            return
+        self.stages = None
+
+        # input of integer or half dtype: converted by pre callback
+        in_dtype = _transform_dtype(in_ref.dtype)
+        if in_dtype != in_ref.dtype:
+            callbacks = dict(callbacks or {})
+            assert not isinstance(callbacks.setdefault('pre', []), bytes), \
+                'input of dtype %s needs pre callback stages, not source' % in_ref.dtype
+            assert out_array is not None, 'input of dtype %s needs out-of-place transform' % in_ref.dtype
+
+        # non-transformed axes, which cannot be collapsed into a single batch axis, are looped over
+        batch_axes, loop_axes = self.calculate_batch_axes(axes, [a for a in (in_ref, out_ref) if a is not None])
+        self._loop_axes = loop_axes
+        loop_shape = [in_ref.shape[a] for a in loop_axes]
+        self._offsets = [(sum(i*in_ref.strides[a] for i, a in zip(index, loop_axes)),
+                          sum(i*(out_ref if out_ref is not None else in_ref).strides[a]
+                              for i, a in zip(index, loop_axes)))
+                         for index in np.ndindex(*loop_shape)]
+        if len(self._offsets) > 1:
+            self._check_loop_alignment(queue.device, in_ref, out_ref)
+
+        t_strides_in, t_distance_in, t_batchsize_in, t_shape, axes_transform = self.calculate_transform_strides(axes, in_ref, batch_axes)
 
         if out_array is not None:
             t_inplace = False
             t_strides_out, t_distance_out, t_batchsize_out, t_shape_out, axes_transform_out = self.calculate_transform_strides(
-                axes, out_array)
-            if in_array.base_data is out_array.base_data:
+                axes, out_ref, batch_axes)
+            if in_ref.base_data is out_ref.base_data:
                 t_inplace = True
 
             #assert t_batchsize_out == t_batchsize_in and t_shape == t_shape_out, 'input and output size does not match' #TODO: fails for real-to-complex
@@ -46,6 +196,7 @@ class FFT(object):
         else:
             t_inplace = True
             t_strides_out, t_distance_out = t_strides_in, t_distance_in
+            out_planar = in_planar
 
         
         #assert np.issubclass(in_array.dtype, np.complexfloating) and \
@@ -55,60 +206,69 @@ class FFT(object):
         #complex64 <-> complex64
         #complex128 <-> complex128
 
-        if in_array.dtype in (np.float32, np.complex64):
+        if in_dtype in (np.float32, np.complex64):
             precision = gfft.clfftPrecision_.CLFFT_SINGLE
-        elif in_array.dtype in (np.float64, np.complex128):
+        elif in_dtype in (np.float64, np.complex128):
             precision = gfft.clfftPrecision_.CLFFT_DOUBLE
 
         #TODO: add assertions that precision match
-        if in_array.dtype in (np.float32, np.float64):
+        if in_dtype in (np.float32, np.float64) and not in_planar:
             layout_in = gfft.clfftLayout_.CLFFT_REAL
-            layout_out = gfft.clfftLayout_.CLFFT_HERMITIAN_INTERLEAVED
+            if out_planar:
+                layout_out = gfft.clfftLayout_.CLFFT_HERMITIAN_PLANAR
+            else:
+                layout_out = gfft.clfftLayout_.CLFFT_HERMITIAN_INTERLEAVED
 
-            expected_out_shape = list(in_array.shape)
+            expected_out_shape = list(in_ref.shape)
             expected_out_shape[axes_transform[0]] = expected_out_shape[axes_transform[0]]//2 + 1
-            assert out_array.shape == tuple(expected_out_shape), \
-                'output array shape %s does not match expected shape: %s'%(out_array.shape,expected_out_shape)
+            assert out_ref.shape == tuple(expected_out_shape), \
+                'output array shape %s does not match expected shape: %s'%(out_ref.shape,expected_out_shape)
 
-        elif in_array.dtype in (np.complex64, np.complex128):
+        else:
             if not real:
-                layout_in = gfft.clfftLayout_.CLFFT_COMPLEX_INTERLEAVED
-                layout_out = gfft.clfftLayout_.CLFFT_COMPLEX_INTERLEAVED
+                layout_in = gfft.clfftLayout_.CLFFT_COMPLEX_PLANAR if in_planar else gfft.clfftLayout_.CLFFT_COMPLEX_INTERLEAVED
+                layout_out = gfft.clfftLayout_.CLFFT_COMPLEX_PLANAR if out_planar else gfft.clfftLayout_.CLFFT_COMPLEX_INTERLEAVED
             else:
                 # complex-to-real transform
-                layout_in = gfft.clfftLayout_.CLFFT_HERMITIAN_INTERLEAVED
+                layout_in = gfft.clfftLayout_.CLFFT_HERMITIAN_PLANAR if in_planar else gfft.clfftLayout_.CLFFT_HERMITIAN_INTERLEAVED
                 layout_out = gfft.clfftLayout_.CLFFT_REAL
                 t_shape = t_shape_out
 
         if t_inplace and ((layout_in is gfft.clfftLayout_.CLFFT_REAL) or
                           (layout_out is gfft.clfftLayout_.CLFFT_REAL)):
-            assert ((in_array.strides[axes_transform[0]] == in_array.dtype.itemsize) and
-                    (out_array.strides[axes_transform[0]] == out_array.dtype.itemsize)), \
+            assert ((in_ref.strides[axes_transform[0]] == in_ref.dtype.itemsize) and
+                    (out_ref.strides[axes_transform[0]] == out_ref.dtype.itemsize)), \
                     'inline real transforms need stride 1 for first transform axis'
 
 
         self.t_shape = t_shape
         self.batchsize = t_batchsize_in
 
-        plan = GFFT.create_plan(context, t_shape)
-        plan.inplace = t_inplace
-        plan.strides_in = t_strides_in
-        plan.strides_out = t_strides_out
-        plan.distances = (t_distance_in, t_distance_out)
-        plan.batch_size = self.batchsize
-        plan.precision = precision
-        plan.layouts = (layout_in, layout_out)
-
-        if callbacks is not None:
-            if callbacks.has_key('pre'):
-                plan.set_callback(b'pre',
-                                  callbacks['pre'],
-                                  'pre')
-            if 'post' in callbacks:
-                plan.set_callback(b'post',
-                                  callbacks['post'],
-                                  'post')
-        
+        n = np.prod(t_shape)
+        if norm is None or norm == 'backward':
+            scales = None #clFFT default: 1, 1/n
+        elif norm == 'ortho':
+            scales = (float(1/np.sqrt(n)), float(1/np.sqrt(n)))
+        elif norm == 'forward':
+            scales = (float(1/n), 1.)
+        else:
+            raise ValueError('invalid norm %r' % (norm,))
+
+        callbacks = self._callback_signature(callbacks, in_ref, out_ref if out_ref is not None else in_ref,
+                                             (layout_in, layout_out),
+                                             precision == gfft.clfftPrecision_.CLFFT_DOUBLE)
+        signature = PlanSignature(t_shape = tuple(t_shape),
+                                  strides_in = t_strides_in,
+                                  strides_out = t_strides_out,
+                                  distances = (t_distance_in, t_distance_out),
+                                  batch_size = self.batchsize,
+                                  precision = precision,
+                                  layouts = (layout_in, layout_out),
+                                  inplace = t_inplace,
+                                  scales = scales,
+                                  callbacks = callbacks,
+                                  )
+
         if False:
             print('axes', axes        )
             print('in_array.shape:          ', in_array.shape)
@@ -122,20 +282,176 @@ class FFT(object):
             print('t_stride_out             ', t_strides_out)
             print('inplace                  ', t_inplace)
 
-        plan.bake(self.queue)
-        temp_size = plan.temp_array_size
-        if temp_size:
-            #print 'temp_size:', plan.temp_array_size
-            self.temp_buffer = cl.Buffer(self.context, cl.mem_flags.READ_WRITE, size = temp_size)
-        else:
-            self.temp_buffer = None
+        key = (context, queue.device, signature)
+        plan = plan_cache.get(key, lambda: create_baked_plan(context, queue, signature))
+
+        # temporary buffer, shared with other transforms on same queue
+        self.temp_size = plan.temp_array_size
+        self._scratch = scratch_buffer(queue)
+        self._scratch.reserve(self.temp_size)
 
         self.plan = plan
+        self.signature = signature
+        self.data = in_array
+        self.result = out_array
+        self._bound = None #buffers of bound arrays, see _enqueue_buffers
+
+    def _callback_signature(self, callbacks, in_array, out_array, layouts, double):
+        """tuple of (callback type, source, userdata buffer) for plan signature"""
+        if callbacks is None:
+            return None
+        kinds = {gfft.clfftLayout_.CLFFT_REAL: 'real',
+                 gfft.clfftLayout_.CLFFT_COMPLEX_PLANAR: 'planar',
+                 gfft.clfftLayout_.CLFFT_HERMITIAN_PLANAR: 'planar'}
+        result = []
+        for callback_type, stages in sorted(callbacks.items()):
+            if isinstance(stages, bytes): #source, function named 'pre' or 'post'
+                result.append((callback_type, stages, None))
+                continue
+            if callback_type == 'pre':
+                array, layout = in_array, layouts[0]
+            else:
+                array, layout = out_array, layouts[1]
+            source, user_data = _compose_callbacks(stages, callback_type, array,
+                                                   kinds.get(layout, 'complex'), double,
+                                                   dtype=array.dtype, loop_axes=self._loop_axes,
+                                                   queue=self.queue)
+            if user_data is not None:
+                user_data = self._buffers(user_data)[0]
+            result.append((callback_type, source, user_data))
+        return tuple(result)
+
+    def _init_stages(self, in_array, out_array, axes, fast_math, real, callbacks, norm):
+        """compose transform over more than 3 axes from several plans
+
+        Axes are split into groups of up to 3 axes, each transformed
+        by its own (batched) plan. The first stage transforms from
+        input to output array, the following ones in-place on the
+        output array. For complex-to-real transforms the complex
+        stages are applied in-place on the input array first (the
+        input array is overwritten). Stages are chained by events.
+        """
+        groups = [axes[i:i+3] for i in range(0, len(axes), 3)]
+        inplace = out_array is None
+        result_role = 'data' if inplace else 'result'
+
+        # (axes, source, target) for each stage, in order of execution
+        if real:
+            plan = [(group, 'data', None) for group in groups[1:]]
+            plan.append((groups[0], 'data', result_role))
+        else:
+            plan = [(groups[0], 'data', None if inplace else 'result')]
+            plan.extend((group, result_role, None) for group in groups[1:])
+
+        arrays = {'data': in_array, 'result': out_array}
+        self.stages = []
+        for i, (group, source, target) in enumerate(plan):
+            stage_callbacks = {}
+            if callbacks is not None:
+                if i == 0 and 'pre' in callbacks:
+                    stage_callbacks['pre'] = callbacks['pre']
+                if i == len(plan) - 1 and 'post' in callbacks:
+                    stage_callbacks['post'] = callbacks['post']
+            transform = FFT(self.context, self.queue,
+                            arrays[source], arrays[target] if target else None,
+                            axes=group, fast_math=fast_math,
+                            real=real and target is not None,
+                            callbacks=stage_callbacks or None,
+                            wisdom=False, norm=norm,
+                            sub_buffer_cache_size=self.sub_buffer_cache_size)
+            self.stages.append((transform, source, target))
+
+        shape = _component(in_array if not real else out_array).shape
+        self.t_shape = tuple(shape[a] for a in axes)
+        self.batchsize = self.stages[0][0].batchsize
+        self.plan = self.stages[0][0].plan
+        self.signature = None #stages are profiled individually
+        self.temp_size = max(transform.temp_size for transform, source, target in self.stages)
+        self._scratch = scratch_buffer(self.queue)
         self.data = in_array
         self.result = out_array
+        self._bound = None #buffers of bound arrays, see _enqueue_buffers
+
+    def _enqueue_stages(self, data, result, forward, wait_for_events, queue):
+        arrays = {'data': data, 'result': result}
+        events = wait_for_events
+        for transform, source, target in self.stages:
+            events = transform.enqueue_arrays(data=arrays[source],
+                                              result=arrays[target] if target else None,
+                                              forward=forward, wait_for_events=events, queue=queue)
+        return events
+
+    @staticmethod
+    def _check_planar(arrays):
+        re, im = arrays
+        assert re.dtype in (np.float32, np.float64), 'planar data needs real arrays'
+        assert re.dtype == im.dtype and re.shape == im.shape and re.strides == im.strides, \
+            'real and imaginary part must have same dtype, shape and strides'
+
+    @property
+    def temp_buffer(self):
+        return self._scratch.get(self.temp_size)
+
+    def _queue_temp_buffer(self, queue):
+        """command queue (default: queue given at creation) and temporary buffer for enqueue"""
+        if queue is None or queue == self.queue:
+            return self.queue, self.temp_buffer
+        with self._sub_buffers_lock:
+            scratch = self._queue_scratch.get(queue)
+            if scratch is None:
+                scratch = self._queue_scratch[queue] = scratch_buffer(queue)
+        return queue, scratch.get(self.temp_size)
+
+    def _check_loop_alignment(self, device, in_ref, out_ref):
+        # loop slices are enqueued as sub-buffers, their origin must be aligned for the device
+        align = device.mem_base_addr_align//8 #bits -> bytes
+        for k, ref in enumerate((in_ref, out_ref)):
+            if ref is None:
+                continue
+            for offsets in self._offsets:
+                if (ref.offset + offsets[k]) % align:
+                    raise ValueError('%s slice at byte offset %d along loop axes %s is not aligned to '
+                                     '%d bytes (CL_DEVICE_MEM_BASE_ADDR_ALIGN), use a contiguous copy '
+                                     'or transform more axes'
+                                     % (('input', 'output')[k], ref.offset + offsets[k],
+                                        tuple(self._loop_axes), align))
+
+    @classmethod
+    def calculate_batch_axes(cls, axes_transform, arrays):
+        """split non-transformed axes into batch axes and loop axes
+
+        Batch axes can be collapsed into a single batch dimension of
+        the clFFT plan, for all `arrays` (input and output). If not all
+        non-transformed axes are collapsible, the largest group of
+        collapsible axes is used as batch, the plan is enqueued for
+        each index of the remaining loop axes.
+
+        Returns (batch_axes, loop_axes), batch axes sorted by increasing stride.
+        """
+        shape = arrays[0].shape
+        ddim = len(shape)
+        axes_transform = [a % ddim for a in axes_transform]
+
+        # remaining, non-transformed axes (ignore unit size axes), sorted by stride
+        axes_notransform = [a for a in range(ddim) if a not in axes_transform and shape[a] > 1]
+        axes_notransform.sort(key=lambda a: (arrays[0].strides[a], -a))
+
+        groups = []
+        for a in axes_notransform:
+            if groups and all(array.strides[a] == array.strides[groups[-1][-1]] * shape[groups[-1][-1]]
+                              for array in arrays):
+                groups[-1].append(a)
+            else:
+                groups.append([a])
+
+        if not groups:
+            return [], []
+        batch_axes = max(groups, key=lambda group: np.prod([shape[a] for a in group]))
+        loop_axes = [a for group in groups if group is not batch_axes for a in group]
+        return batch_axes, loop_axes
 
     @classmethod
-    def calculate_transform_strides(cls, axes_transform, array):
+    def calculate_transform_strides(cls, axes_transform, array, batch_axes=None):
     
         shape = np.array(array.shape)
         strides = np.array(array.strides)
@@ -148,6 +464,29 @@ class FFT(object):
         # transform negative axis values (e.g. -1 for last axis) to positive
         axes_transform[axes_transform<0] += ddim
         
+        if batch_axes is not None:
+            axes_notransform = np.array(batch_axes, dtype=int)
+        else:
+            axes_notransform = cls._collapsed_notransform_axes(axes_transform, shape, strides)
+
+        t_distances = strides[axes_notransform]//dtype.itemsize
+                
+        if len(t_distances) == 0:
+            t_distance = 0
+        else:
+            t_distance = t_distances[0] #takes smalles stride (axes_notransform have been sorted by stride size)
+                       
+        batchsize = np.prod(shape[axes_notransform])
+        
+        t_shape = shape[axes_transform]
+        t_strides = strides[axes_transform]//dtype.itemsize
+        
+        return (tuple(t_strides), t_distance, batchsize, tuple(t_shape), tuple(axes_transform)) #, tuple(axes_notransform))
+
+    @staticmethod
+    def _collapsed_notransform_axes(axes_transform, shape, strides):
+        ddim = len(shape)
+
         # remaining, non-transformed axes
         axes_notransform = np.setdiff1d(range(ddim), axes_transform)
         
@@ -168,59 +507,185 @@ class FFT(object):
         collapsable_axes_list.append(collapsable_axes_candidates) #append last intermediate list to 
         
         assert len(collapsable_axes_list) == 1, 'data layout not supported (only single non-transformed axis allowd)' #all non-transformed axes collapsed
-        axes_notransform = collapsable_axes_list[0] #all axes collapsable: take single group of collapsable axes
-        
-        t_distances = strides[axes_notransform]//dtype.itemsize
-                
-        if len(t_distances) == 0:
-            t_distance = 0
-        else:
-            t_distance = t_distances[0] #takes smalles stride (axes_notransform have been sorted by stride size)
-                       
-        batchsize = np.prod(shape[axes_notransform])
-        
-        t_shape = shape[axes_transform]
-        t_strides = strides[axes_transform]//dtype.itemsize
-        
-        return (tuple(t_strides), t_distance, batchsize, tuple(t_shape), tuple(axes_transform)) #, tuple(axes_notransform))
+        return collapsable_axes_list[0] #all axes collapsable: take single group of collapsable axes
 
 
     def enqueue(self, forward = True, wait_for_events = None):
-        return self.enqueue_arrays(forward=forward, data=self.data, result=self.result, wait_for_events=wait_for_events)
+        return self.enqueue_arrays(forward=forward, wait_for_events=wait_for_events)
+
+    def enqueue_arrays(self, data = None, result = None, forward = True, wait_for_events = None, queue = None):
+        """enqueue transform
+
+        `queue` (optional) is a command queue for the same device to
+        use instead of the queue given at creation"""
+        data, result = self._arrays(data, result)
+
+        if self.stages is not None:
+            return self._enqueue_stages(data, result, forward, wait_for_events, queue)
+
+        profiler = _profiling.active
+        if profiler is not None:
+            return profiler._enqueue(self, queue or self.queue, lambda: self._enqueue_arrays(
+                data, result, forward, wait_for_events, queue), len(self._offsets), wait_for_events)
+        return self._enqueue_arrays(data, result, forward, wait_for_events, queue)
+
+    def _enqueue_arrays(self, data, result, forward, wait_for_events, queue):
+        queue, temp_buffer = self._queue_temp_buffer(queue)
+
+        # one enqueue for each index of loop axes (non-collapsible batch axes), all sharing the same plan
+        enqueue_buffers = self._enqueue_buffers(data, result)
+        all_events = []
+        events = () #nothing to enqueue for an empty loop axis
+        for data_buffers, result_buffers in enqueue_buffers:
+            events = self.plan.enqueue_transform((queue,), data_buffers, result_buffers,
+                                                 direction_forward = forward, temp_buffer = temp_buffer, wait_for_events = wait_for_events)
+            all_events.extend(events)
+            if temp_buffer is not None:
+                wait_for_events = events #temp buffer is reused, serialize (for out-of-order queues)
+
+        if len(enqueue_buffers) > 1:
+            return (cl.enqueue_marker(queue, wait_for=all_events),)
+        return events
+
+    def enqueue_many(self, arrays, forward = True, wait_for_events = None, queue = None):
+        """enqueue transforms of several (data, result) array pairs
+
+        Arrays need the same layout as the arrays given at creation,
+        result is None for in-place transforms. All transforms are
+        dispatched by a single call of `Plan.enqueue_many`, which
+        saves Python overhead for small transforms. Transforms are
+        executed in order, returns tuple with event of last one.
+        """
+        if self.stages is not None:
+            events = wait_for_events
+            for data, result in arrays:
+                events = self.enqueue_arrays(data, result, forward, events, queue)
+            return events
+
+        queue, temp_buffer = self._queue_temp_buffer(queue)
+
+        data_list, result_list = [], []
+        for data, result in arrays:
+            for data_buffers, result_buffers in self._enqueue_buffers(*self._arrays(data, result)):
+                data_list.append(data_buffers)
+                result_list.append(result_buffers)
+        def enqueue():
+            return self.plan.enqueue_many(queue, data_list, result_list if self.result is not None else None,
+                                          direction_forward=forward, wait_for_events=wait_for_events,
+                                          temp_buffer=temp_buffer)
+        profiler = _profiling.active
+        if profiler is not None:
+            return profiler._enqueue(self, queue, enqueue, len(data_list), wait_for_events)
+        return enqueue()
 
-    def enqueue_arrays(self, data = None, result = None, forward = True, wait_for_events = None):
-        """enqueue transform"""
+    def report(self, measure=True, peaks=None, n_run=20):
+        """cost model and roofline analysis, see `gpyfft.cost.report`"""
+        return _cost.report(self, measure=measure, peaks=peaks, n_run=n_run)
+
+    def _arrays(self, data, result):
+        """data and result arrays for enqueue, bound arrays if None"""
         if data is None:
             data = self.data
-        else:
-            assert data.shape == self.data.shape
-            assert data.strides == self.data.strides
-            assert data.dtype == self.data.dtype
+        elif data is not self.data:
+            self._check_like(data, self.data)
         if result is None:
             result = self.result
+        elif result is not self.result:
+            self._check_like(result, self.result)
+        return data, result
+
+    def _enqueue_buffers(self, data, result):
+        """list of (data buffers, result buffers or None) for each enqueue
+
+        Buffers of the bound arrays are created once, sub-buffers for
+        other arrays on each call.
+        """
+        if data is self.data and result is self.result and self._bound is not None:
+            return self._bound
+        buffers = [(self._buffers(data, offset_in),
+                     self._buffers(result, offset_out) if result is not None else None)
+                   for offset_in, offset_out in self._offsets]
+        if data is self.data and result is self.result:
+            self._bound = buffers
+        return buffers
+
+    @classmethod
+    def _check_like(cls, array, reference):
+        if isinstance(reference, tuple):
+            assert isinstance(array, tuple) and len(array) == 2, 'expected planar (real, imag) arrays'
+            for a, r in zip(array, reference):
+                cls._check_like(a, r)
         else:
-            assert result.shape == self.result.shape
-            assert result.strides == self.result.strides
-            assert result.dtype == self.result.dtype
-
-        # get buffer for data
-        if data.offset != 0:
-            data = data._new_with_changes(data=data.base_data[data.offset:], offset=0)
-        data_buffer = data.base_data
-
-        if result is not None:
-            # get buffer for result
-            if result.offset != 0:
-                result = result._new_with_changes(data=result.base_data[result.offset:], offset=0)
-            result_buffer = result.base_data
-
-            events = self.plan.enqueue_transform((self.queue,), (data_buffer,), (result_buffer),
-                                        direction_forward = forward, temp_buffer = self.temp_buffer, wait_for_events = wait_for_events)
-        else:
-            events = self.plan.enqueue_transform((self.queue,), (data_buffer,),
-                                        direction_forward = forward, temp_buffer = self.temp_buffer, wait_for_events = wait_for_events)
+            assert array.shape == reference.shape
+            assert array.strides == reference.strides
+            assert array.dtype == reference.dtype
 
-        return events
+    def _buffers(self, array, offset=0):
+        """buffers starting at first element of array (plus offset in bytes),
+        two buffers for planar data"""
+        arrays = array if isinstance(array, tuple) else (array,)
+        return tuple(self._sub_buffer(a.base_data, a.offset + offset) for a in arrays)
+
+    def _sub_buffer(self, buffer, offset):
+        """sub-buffer of `buffer` starting at `offset`, buffer itself for offset 0
+
+        Sub-buffers are cached (least recently used are dropped), so
+        transforms of views into e.g. a ring buffer do not create a
+        new OpenCL memory object for each enqueue. The cache holds
+        strong references: pyopencl buffers cannot be weakly
+        referenced, and a sub-buffer retains its parent buffer in
+        any case. Up to `sub_buffer_cache_size` parent buffers are
+        thus kept alive by the transform, set it lower (0 disables
+        the cache) for transforms of many short-lived arrays, or call
+        `clear_sub_buffers`.
+        """
+        if offset == 0:
+            return buffer
+        key = (buffer, offset)
+        with self._sub_buffers_lock:
+            sub_buffer = self._sub_buffers.pop(key, None)
+            if sub_buffer is None:
+                sub_buffer = buffer[offset:]
+            self._sub_buffers[key] = sub_buffer
+            while len(self._sub_buffers) > self.sub_buffer_cache_size:
+                self._sub_buffers.popitem(last=False)
+        return sub_buffer
+
+    def clear_sub_buffers(self):
+        """drop cached sub-buffers, releasing the buffers they belong to"""
+        with self._sub_buffers_lock:
+            self._sub_buffers.clear()
+        for transform, source, target in self.stages or ():
+            transform.clear_sub_buffers()
 
-    def update_arrays(self, input_array, output_array):
-        pass
+    @staticmethod
+    def _inplace(data, result):
+        return result is None or _component(data).base_data is _component(result).base_data
+
+    def update_arrays(self, input_array, output_array=None):
+        """bind new arrays to the transform, without planning again
+
+        The arrays need the same shape, strides and dtype as the
+        arrays bound before (the offsets can differ), and the
+        transform has to stay in-place or out-of-place. For in-place
+        transforms `output_array` can be omitted. Arrays used by
+        callbacks are not changed.
+        """
+        inplace = self._inplace(self.data, self.result)
+        if output_array is None and self.result is not None and inplace:
+            # in-place real transform: same view of new input array
+            assert not isinstance(input_array, tuple)
+            view = self.result
+            output_array = cla.Array(input_array.queue, view.shape, view.dtype, strides=view.strides,
+                                     data=input_array.base_data,
+                                     offset=input_array.offset + view.offset - self.data.offset)
+        self._check_like(input_array, self.data)
+        if self.result is None:
+            assert output_array is None, 'transform is in-place'
+        else:
+            self._check_like(output_array, self.result)
+        if self._inplace(input_array, output_array) != inplace:
+            raise ValueError('transform is %s' % ('in-place' if inplace else 'out-of-place'))
+        self.data = input_array
+        self.result = output_array
+        self._bound = None
@@ -1,4 +1,4 @@
-cdef extern from "clFFT.h":
+cdef extern from "clFFT.h" nogil:
     ctypedef int cl_int
     ctypedef unsigned int cl_uint
     ctypedef unsigned long int cl_ulong
@@ -11,6 +11,8 @@ cimport cython
 import pyopencl as cl
 from libc.stdlib cimport malloc, free
 import atexit
+import os
+import threading
 
 try:
     from weakref import finalize
@@ -57,37 +59,91 @@ cdef inline bint errcheck(clfftStatus result) except True:
 
 
 _initialized=False    
+_kernel_cache_dir=None
+_init_lock = threading.RLock() #guards clFFT setup and teardown
+
+cdef _kernel_cache_path(cache_dir):
+    # Cache entries are validated against device name and driver
+    # version by clFFT, use separate directories for each clFFT version.
+    cdef cl_uint major, minor, patch
+    errcheck(clfftGetVersion(&major, &minor, &patch))
+    return os.path.join(os.path.abspath(os.path.expanduser(cache_dir)),
+                        'clfft-%d.%d.%d' % (major, minor, patch))
+
+cdef _setup_kernel_cache(cache_dir):
+    # clFFT stores compiled kernel binaries in the directory given by
+    # CLFFT_CACHE_PATH (read in clfftSetup).
+    path = _kernel_cache_path(cache_dir)
+    try:
+        os.makedirs(path)
+    except OSError:
+        if not os.path.isdir(path):
+            raise
+    os.environ['CLFFT_CACHE_PATH'] = path + os.sep
+    return path
 
 #main class
 cdef class GpyFFT(object):
-    """The GpyFFT object is the primary interface to the clFFT library"""
+    """The GpyFFT object is the primary interface to the clFFT library
+
+    Parameters
+    ----------
+    debug : bool, optional
+        dump generated OpenCL kernel sources to the current directory
+
+    cache_dir : str, optional
+        directory for a persistent cache of compiled kernel
+        binaries. Defaults to the environment variable
+        GPYFFT_CACHE_DIR, if not set no cache is used. Takes effect
+        only for the first `GpyFFT` instance, which initializes the
+        clFFT library. This happens on import of `gpyfft`, so usually
+        GPYFFT_CACHE_DIR is the way to set it; a different
+        `cache_dir` given later raises RuntimeError.
+
+    Thread safety: the clFFT library is initialized once, even if
+    `GpyFFT` objects are created concurrently. clFFT guards plans by
+    internal locks, so plans can be created, baked and enqueued from
+    several threads. `Plan.bake` and `Plan.enqueue_transform` release
+    the GIL during the clFFT call, so these run concurrently with
+    other Python threads.
+    """
 
-    def __cinit__(self, debug = False):
-        if not _initialized:
-            GpyFFT._initialize(debug)
+    def __cinit__(self, debug = False, cache_dir = None):
+        with _init_lock:
+            if not _initialized:
+                GpyFFT._initialize(debug, cache_dir)
+            elif cache_dir is not None and _kernel_cache_path(cache_dir) != _kernel_cache_dir:
+                raise RuntimeError('clFFT is already initialized with kernel cache directory %s, '
+                                   'set GPYFFT_CACHE_DIR before importing gpyfft' % _kernel_cache_dir)
 
     @classmethod
     @cython.binding(True)
-    def _initialize(cls, debug = False):
+    def _initialize(cls, debug = False, cache_dir = None):
         # print 'initialize clfft'
-        global _initialized
-        if _initialized:
-            raise RuntimeError('GpyFFT is already initialized')
+        global _initialized, _kernel_cache_dir
         cdef clfftSetupData setup_data
-        errcheck(clfftInitSetupData(&setup_data))
-        if debug:
-            setup_data.debugFlags |= CLFFT_DUMP_PROGRAMS
-        errcheck(clfftSetup(&setup_data))
-        _initialized=True
-        atexit.register(GpyFFT._teardown)
+        with _init_lock:
+            if _initialized:
+                raise RuntimeError('GpyFFT is already initialized')
+            if cache_dir is None:
+                cache_dir = os.environ.get('GPYFFT_CACHE_DIR')
+            if cache_dir:
+                _kernel_cache_dir = _setup_kernel_cache(cache_dir)
+            errcheck(clfftInitSetupData(&setup_data))
+            if debug:
+                setup_data.debugFlags |= CLFFT_DUMP_PROGRAMS
+            errcheck(clfftSetup(&setup_data))
+            _initialized=True
+            atexit.register(GpyFFT._teardown)
 
     @classmethod
     @cython.binding(True)
     def _teardown(cls):
         # print 'teardown clfft'
-        errcheck(clfftTeardown())
         global _initialized
-        _initialized=False
+        with _init_lock:
+            errcheck(clfftTeardown())
+            _initialized=False
 
     def get_version(self):
         """returns the version of the underlying clFFT library
@@ -114,6 +170,11 @@ cdef class GpyFFT(object):
         cdef cl_uint major, minor, patch
         errcheck(clfftGetVersion(&major, &minor, &patch))
         return (major, minor, patch)
+
+    property kernel_cache_dir:
+        """directory of the persistent cache of compiled kernel binaries, None if disabled"""
+        def __get__(self):
+            return _kernel_cache_dir
     
     def create_plan(self, context, tuple shape):
         """creates an FFT Plan object based on the requested dimensionality
@@ -170,6 +231,10 @@ cdef class Plan(object):
     * Whether to execute a forward or reverse transform.
 
     These are specified later, when the plan is executed.
+
+    Plans can be baked and enqueued from several threads, clFFT
+    serializes access to a plan internally. Do not change plan
+    parameters while other threads use the plan.
     """
     cdef object __weakref__
     cdef clfftPlanHandle plan
@@ -422,6 +487,9 @@ cdef class Plan(object):
         context. This can take a long time to execute. If not called,
         this is performed when the plan is execute for the first time.
 
+        The GIL is released while baking, so several plans can be
+        baked in parallel by different threads (see `gpyfft.bake_async`).
+
         Parameters
         ----------
             queues : `pyopencl.CommandQueue` or list of `pyopencl.CommandQueue`
@@ -449,9 +517,13 @@ cdef class Plan(object):
         for i in range(n_queues):
             assert isinstance(queues[i], cl.CommandQueue)
             queues_[i] = <cl_command_queue><voidptr_t>queues[i].int_ptr
-        errcheck(clfftBakePlan(self.plan,
-                                  n_queues, queues_,
-                                  NULL, NULL))
+        cdef clfftPlanHandle plan = self.plan
+        cdef clfftStatus result
+        with nogil:
+            result = clfftBakePlan(plan,
+                                   n_queues, queues_,
+                                   NULL, NULL)
+        errcheck(result)
 
     def set_callback(self,
                      func_name,
@@ -559,7 +631,8 @@ cdef class Plan(object):
 
         Notes
         -----
-            The underlying clFFT call is 'clfftEnqueueTransform'
+            The underlying clFFT call is 'clfftEnqueueTransform'. The
+            GIL is released during this call.
         """
 
         cdef int i
@@ -617,19 +690,160 @@ cdef class Plan(object):
             tmp_buffer_ = <cl_mem><voidptr_t>temp_buffer.int_ptr
 
         cdef cl_event out_cl_events[MAX_QUEUES]
-
-        errcheck(clfftEnqueueTransform(self.plan,
-                                          direction,
-                                          n_queues,
-                                          &queues_[0],
-                                          n_waitfor_events,
-                                          &wait_for_events_[0],
-                                          out_cl_events,
-                                          &in_buffers_[0],
-                                          out_buffers_,
-                                          tmp_buffer_))
+        cdef clfftPlanHandle plan = self.plan
+        cdef cl_uint n_queues_ = n_queues
+        cdef cl_uint n_waitfor_events_ = n_waitfor_events
+        cdef clfftStatus result
+
+        # buffers, queues and events are kept alive by the Python objects referenced above
+        with nogil:
+            result = clfftEnqueueTransform(plan,
+                                           direction,
+                                           n_queues_,
+                                           &queues_[0],
+                                           n_waitfor_events_,
+                                           &wait_for_events_[0],
+                                           out_cl_events,
+                                           &in_buffers_[0],
+                                           out_buffers_,
+                                           tmp_buffer_)
+        errcheck(result)
         
         return tuple((cl.Event.from_int_ptr(<voidptr_t>out_cl_events[i], retain=False) for i in range(n_queues)))
+
+    def enqueue_many(self,
+                     queue,
+                     in_buffers_list,
+                     out_buffers_list = None,
+                     direction_forward = True,
+                     wait_for_events = None,
+                     temp_buffer = None,
+                     ):
+        """Enqueue several FFT transforms with this plan in a single call.
+
+        Saves the Python overhead of calling `enqueue_transform`
+        repeatedly, e.g. for many small transforms. The transforms
+        are enqueued in order, each waits for the previous one.
+
+        Parameters
+        ----------
+        queue : pyopencl.CommandQueue
+
+        in_buffers_list : list of pyopencl.Buffer or of tuples (1 or 2 items) of pyopencl.Buffer
+            input buffers of each transform
+
+        out_buffers_list : list of pyopencl.Buffer or of tuples of pyopencl.Buffer, optional
+            output buffers of each transform, None for inplace transforms
+
+        Other Parameters
+        ----------------
+
+        direction_forward : bool, optional
+
+        wait_for_events : iterable of pyopencl.Event, optional
+            events the first transform waits for
+
+        temp_buffer : pyopencl.Buffer, optional
+
+        Returns
+        -------
+            tuple with `pyopencl.Event` of the last transform (empty if no transforms)
+
+        Raises
+        ------
+            `GpyFFT_Error`
+                An error occurred accessing the clfftEnqueueTransform function
+
+        Notes
+        -----
+            The underlying clFFT call is 'clfftEnqueueTransform', called
+            for each transform with the GIL released.
+        """
+
+        cdef int i, j
+        cdef int n = len(in_buffers_list)
+        if n == 0:
+            return ()
+        if out_buffers_list is not None:
+            assert len(out_buffers_list) == n
+
+        cdef clfftDirection direction
+        if direction_forward:
+            direction = CLFFT_FORWARD
+        else:
+            direction = CLFFT_BACKWARD
+
+        assert isinstance(queue, cl.CommandQueue)
+        cdef cl_command_queue queue_ = <cl_command_queue><voidptr_t>queue.int_ptr
+
+        cdef cl_event wait_for_events_array[MAX_WAITFOR_EVENTS]
+        cdef cl_event* wait_for_events_ = NULL
+        cdef cl_uint n_waitfor_events = 0
+        if wait_for_events is not None and len(wait_for_events) > 0:
+            n_waitfor_events = len(wait_for_events)
+            assert n_waitfor_events <= MAX_WAITFOR_EVENTS
+            for i, event in enumerate(wait_for_events):
+                assert isinstance(event, cl.Event)
+                wait_for_events_array[i] = <cl_event><voidptr_t>event.int_ptr
+            wait_for_events_ = &wait_for_events_array[0]
+
+        cdef cl_mem tmp_buffer_ = NULL
+        if temp_buffer is not None:
+            assert isinstance(temp_buffer, cl.MemoryObjectHolder)
+            tmp_buffer_ = <cl_mem><voidptr_t>temp_buffer.int_ptr
+
+        cdef clfftPlanHandle plan = self.plan
+        cdef clfftStatus result = CLFFT_SUCCESS
+        cdef cl_event event_ = NULL
+        cdef cl_event next_event = NULL
+        cdef cl_mem* in_ = <cl_mem*>malloc(2*n*sizeof(cl_mem))
+        cdef cl_mem* out_ = NULL
+        cdef cl_mem* out_i
+        if in_ == NULL:
+            raise MemoryError()
+        try:
+            for i, buffers in enumerate(in_buffers_list):
+                if isinstance(buffers, cl.MemoryObjectHolder):
+                    buffers = (buffers,)
+                assert len(buffers) <= 2
+                for j, buffer in enumerate(buffers):
+                    assert isinstance(buffer, cl.MemoryObjectHolder)
+                    in_[2*i + j] = <cl_mem><voidptr_t>buffer.int_ptr
+            if out_buffers_list is not None:
+                out_ = <cl_mem*>malloc(2*n*sizeof(cl_mem))
+                if out_ == NULL:
+                    raise MemoryError()
+                for i, buffers in enumerate(out_buffers_list):
+                    if isinstance(buffers, cl.MemoryObjectHolder):
+                        buffers = (buffers,)
+                    assert len(buffers) in (1, 2)
+                    for j, buffer in enumerate(buffers):
+                        assert isinstance(buffer, cl.MemoryObjectHolder)
+                        out_[2*i + j] = <cl_mem><voidptr_t>buffer.int_ptr
+
+            # buffers, queue and events are kept alive by the Python objects referenced above
+            for i in range(n):
+                out_i = &out_[2*i] if out_ != NULL else NULL
+                with nogil:
+                    if i == 0:
+                        result = clfftEnqueueTransform(plan, direction, 1, &queue_,
+                                                       n_waitfor_events, wait_for_events_,
+                                                       &next_event, &in_[2*i], out_i, tmp_buffer_)
+                    else:
+                        result = clfftEnqueueTransform(plan, direction, 1, &queue_,
+                                                       1, &event_,
+                                                       &next_event, &in_[2*i], out_i, tmp_buffer_)
+                if result != CLFFT_SUCCESS:
+                    break
+                # pyopencl owns (and releases) the event of each transform
+                event_ = next_event
+                event = cl.Event.from_int_ptr(<voidptr_t>event_, retain=False)
+        finally:
+            free(in_)
+            free(out_)
+        errcheck(result)
+
+        return (event,)
             
 
             
@@ -0,0 +1,142 @@
+"""
+Record and replay fixed sequences of commands.
+
+Processing chains like upload, transform, elementwise kernel, inverse
+transform, download are often executed many times with the same
+arrays. A `Graph` records such a sequence once: for transforms the
+plan, (sub-)buffers and scratch buffer are resolved, kernels get their
+own kernel object with arguments set once. `Graph.replay` then
+enqueues the whole sequence with a single call, with little host
+overhead per command::
+
+    graph = Graph(queue)
+    graph.add_copy(data, host_data)
+    graph.add_fft(forward)
+    graph.add_kernel(filter_kernel, (n,), None, spectrum.data, h.data)
+    graph.add_fft(inverse, forward=False)
+    graph.add_copy(host_result, result)
+    graph.replay().wait()
+
+Commands are executed in recorded order on an in-order command queue.
+Arrays are bound at recording, their content (and the content of host
+arrays) is read at execution, so new data can be filled in before each
+replay. Host arrays must not be changed before the replay has finished.
+"""
+
+from __future__ import absolute_import, division, print_function
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from .scratch import scratch_buffer
+
+__all__ = ['Graph']
+
+
+def _memory(array):
+    """(buffer, byte offset) of pyopencl array or buffer, None for host arrays"""
+    if isinstance(array, cla.Array):
+        assert array.flags.forc, 'array must be contiguous'
+        return array.base_data, array.offset
+    if isinstance(array, cl.MemoryObjectHolder):
+        return array, 0
+    return None
+
+
+class Graph(object):
+    """sequence of commands on `queue`, recorded once and replayed"""
+
+    def __init__(self, queue):
+        assert not queue.properties & cl.command_queue_properties.OUT_OF_ORDER_EXEC_MODE_ENABLE, \
+            'graph needs an in-order command queue'
+        self.queue = queue
+        self._scratch = scratch_buffer(queue)
+        self._commands = [] #functions of wait_for list, returning event
+
+    def __len__(self):
+        return len(self._commands)
+
+    def add_fft(self, transform, data=None, result=None, forward=True):
+        """record transform of `data` to `result` (default: arrays bound to transform)"""
+        data, result = transform._arrays(data, result)
+        if transform.stages is not None:
+            arrays = {'data': data, 'result': result}
+            for stage, source, target in transform.stages:
+                self.add_fft(stage, arrays[source], arrays[target] if target else None, forward)
+            return self
+
+        queue = self.queue
+        plan = transform.plan
+        temp_buffer = self._scratch.get(transform.temp_size)
+        buffers = transform._enqueue_buffers(data, result)
+        if len(buffers) == 1:
+            (data_buffers, result_buffers), = buffers
+            queues = (queue,)
+            def command(wait_for):
+                return plan.enqueue_transform(queues, data_buffers, result_buffers, forward,
+                                              wait_for, temp_buffer)[0]
+        else:
+            data_list = [data_buffers for data_buffers, result_buffers in buffers]
+            result_list = [result_buffers for data_buffers, result_buffers in buffers]
+            if result is None:
+                result_list = None
+            def command(wait_for):
+                return plan.enqueue_many(queue, data_list, result_list, forward,
+                                         wait_for, temp_buffer)[0]
+        self._commands.append(command)
+        return self
+
+    def add_kernel(self, kernel, global_size, local_size, *args):
+        """record kernel execution, arguments are set once
+
+        `args` are buffers, contiguous pyopencl arrays without offset
+        or numpy scalars.
+        """
+        kernel = cl.Kernel(kernel.program, kernel.function_name) #own arguments
+        kernel.set_args(*[arg.data if isinstance(arg, cla.Array) else arg for arg in args])
+        queue = self.queue
+        global_size = tuple(global_size)
+        local_size = tuple(local_size) if local_size is not None else None
+        def command(wait_for):
+            return cl.enqueue_nd_range_kernel(queue, kernel, global_size, local_size, wait_for=wait_for)
+        self._commands.append(command)
+        return self
+
+    def add_copy(self, dest, src):
+        """record copy between (contiguous) pyopencl arrays, buffers and host arrays"""
+        dest_memory, src_memory = _memory(dest), _memory(src)
+        kwargs = {}
+        if dest_memory is not None and src_memory is not None:
+            kwargs['byte_count'] = min(a.nbytes if isinstance(a, cla.Array) else a.size for a in (dest, src))
+        else:
+            kwargs['is_blocking'] = False
+        if dest_memory is not None:
+            dest, kwargs['dst_offset'] = dest_memory
+        if src_memory is not None:
+            src, kwargs['src_offset'] = src_memory
+        queue = self.queue
+        def command(wait_for):
+            return cl.enqueue_copy(queue, dest, src, wait_for=wait_for, **kwargs)
+        self._commands.append(command)
+        return self
+
+    def add_call(self, function):
+        """record call of `function(queue, wait_for)` at replay, for
+        commands that cannot be resolved at recording (e.g. pyopencl
+        elementwise kernels or reductions). Returns an event or None."""
+        queue = self.queue
+        def command(wait_for):
+            event = function(queue, wait_for)
+            return event if event is not None else cl.enqueue_marker(queue, wait_for=wait_for)
+        self._commands.append(command)
+        return self
+
+    def replay(self, wait_for=None):
+        """enqueue all recorded commands, the first one waits for events
+        in `wait_for`. Returns event of the last command."""
+        event = None
+        for command in self._commands:
+            event = command(wait_for)
+            wait_for = None
+        if event is None:
+            event = cl.enqueue_marker(self.queue, wait_for=wait_for)
+        return event
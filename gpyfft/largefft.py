@@ -0,0 +1,218 @@
+"""
+Four-step algorithm for 1D transforms larger than device memory.
+
+A transform of length N = N1*N2 is decomposed into
+
+1. N2 transforms of length N1 (columns of the input, viewed as
+   N1 x N2 matrix),
+2. multiplication with twiddle factors exp(-+2 pi i n2 k1 / N),
+3. N1 transforms of length N2 (rows), with transposed output.
+
+Columns and rows are streamed in tiles between host memory and
+device, using rectangular copies, so only a tile (plus clFFT's
+temporary buffer) has to fit into device memory. Two slots with own
+command queues alternate, so transfers of one tile overlap with the
+computation of the other.
+"""
+
+from __future__ import absolute_import, division, print_function
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from .fft import FFT
+from .sizes import RADICES, is_supported
+
+
+def factor_four_step(n):
+    """split n = n1*n2, n1 <= n2, n1 as close to sqrt(n) as possible,
+    with both factors supported by clFFT"""
+    if not is_supported(n):
+        raise ValueError('length %d not supported, factors must be %s' % (n, RADICES))
+    n1 = int(np.sqrt(n))
+    while n1 > 1:
+        if n % n1 == 0 and is_supported(n1) and is_supported(n // n1):
+            break
+        n1 -= 1
+    return n1, n // n1
+
+
+_twiddle_source = """
+#if defined(cl_khr_fp64)
+#pragma OPENCL EXTENSION cl_khr_fp64: enable
+#endif
+
+__kernel void twiddle(__global %(T)s *a, long c0, long w, long n, %(R)s sign)
+{
+    long i = get_global_id(0);
+    long k1 = i / w;
+    long n2 = c0 + i %% w;
+    long m = (n2 * k1) %% n;
+    if (2*m > n)
+        m -= n;
+    %(R)s phi = sign * %(PI2)s * ((%(R)s)m / (%(R)s)n);
+    %(R)s c;
+    %(R)s s = sincos(phi, &c);
+    %(T)s v = a[i];
+    a[i] = (%(T)s)(v.x*c - v.y*s, v.x*s + v.y*c);
+}
+"""
+
+
+class _Slot(object):
+
+    def __init__(self, context, device, col_shape, row_shape, dtype):
+        self.queue = cl.CommandQueue(context, device)
+        self.col = cla.empty(self.queue, col_shape, dtype)
+        self.row_in = cla.empty(self.queue, row_shape, dtype)
+        self.row_out = cla.empty(self.queue, row_shape[::-1], dtype)
+        self.event = None
+
+    def wait(self):
+        if self.event is not None:
+            self.event.wait()
+            self.event = None
+
+
+class FourStepFFT(object):
+    """1D complex transform of host arrays using the four-step algorithm
+
+    Parameters
+    ----------
+    context : pyopencl.Context
+
+    queue : pyopencl.CommandQueue
+        determines the device, additional queues are created for it
+
+    n : int
+        transform length
+
+    dtype : numpy.complex64 or numpy.complex128
+
+    n1 : int, optional
+        length of column transforms, must divide n. Default: close to
+        sqrt(n).
+
+    max_tile_bytes : int, optional
+        size limit of a tile on the device, default: 1/8 of device
+        memory
+    """
+
+    def __init__(self, context, queue, n, dtype=np.complex64, n1=None, max_tile_bytes=None):
+        self.context = context
+        self.dtype = dtype = np.dtype(dtype)
+        if dtype not in (np.complex64, np.complex128):
+            raise TypeError('expected complex dtype')
+        if n1 is None:
+            n1, n2 = factor_four_step(n)
+        else:
+            n2 = n // n1
+            assert n1 * n2 == n, 'n1 must divide n'
+        self.n, self.n1, self.n2 = n, n1, n2
+
+        device = queue.device
+        if max_tile_bytes is None:
+            max_tile_bytes = device.global_mem_size // 8
+        itemsize = dtype.itemsize
+        self.col_width = int(min(n2, max(1, max_tile_bytes // (n1 * itemsize))))
+        self.row_height = int(min(n1, max(1, max_tile_bytes // (n2 * itemsize))))
+
+        self._slots = [_Slot(context, device,
+                             (n1, self.col_width),
+                             (self.row_height, n2),
+                             dtype)
+                       for i in range(2)]
+
+        real_t = 'float' if dtype == np.complex64 else 'double'
+        pi2 = '(2*M_PI_F)' if dtype == np.complex64 else '(2*M_PI)'
+        program = cl.Program(context, _twiddle_source % dict(T=real_t + '2', R=real_t, PI2=pi2)).build()
+        self._twiddle = cl.Kernel(program, 'twiddle')
+        self._real_type = np.float32 if dtype == np.complex64 else np.float64
+
+        self._col_transforms = {}
+        self._row_transforms = {}
+
+    def _col_transform(self, slot, w):
+        transform = self._col_transforms.get(w)
+        if transform is None:
+            transform = FFT(self.context, slot.queue, self._col(slot, w), axes=(0,))
+            self._col_transforms[w] = transform
+        return transform
+
+    def _col(self, slot, w):
+        # tiles narrower than col_width are stored contiguously with row pitch w
+        col = slot.col
+        if w < self.col_width:
+            col = cla.Array(slot.queue, (self.n1, w), self.dtype, data=col.base_data)
+        return col
+
+    def _row_transform(self, slot, h):
+        transform = self._row_transforms.get(h)
+        if transform is None:
+            transform = FFT(self.context, slot.queue, slot.row_in[:h], self._row_result(slot, h),
+                            axes=(1,))
+            self._row_transforms[h] = transform
+        return transform
+
+    def _row_result(self, slot, h):
+        # transposed (n2, h) array, viewed as (h, n2)
+        out = slot.row_out
+        if h < self.row_height:
+            out = cla.Array(slot.queue, (self.n2, h), self.dtype, data=out.base_data)
+        return out.T
+
+    def run(self, host_in, host_out=None, forward=True):
+        """transform host array `host_in` (contiguous, length n), return result"""
+        n, n1, n2 = self.n, self.n1, self.n2
+        itemsize = self.dtype.itemsize
+        host_in = np.ascontiguousarray(host_in, dtype=self.dtype)
+        assert host_in.shape == (n,)
+        if host_out is None:
+            host_out = np.empty(n, self.dtype)
+        work = np.empty((n1, n2), self.dtype)
+        sign = self._real_type(-1 if forward else 1)
+
+        # step 1 and 2: column transforms and twiddle factors
+        w_max = self.col_width
+        for i, c0 in enumerate(range(0, n2, w_max)):
+            w = min(w_max, n2 - c0)
+            slot = self._slots[i % 2]
+            slot.wait()
+            queue = slot.queue
+            cl.enqueue_copy(queue, slot.col.base_data, host_in,
+                            buffer_origin=(0, 0), host_origin=(c0*itemsize, 0),
+                            region=(w*itemsize, n1),
+                            buffer_pitches=(w*itemsize,), host_pitches=(n2*itemsize,),
+                            is_blocking=False)
+            col = self._col(slot, w)
+            transform = self._col_transform(slot, w)
+            transform.enqueue_arrays(data=col, forward=forward, queue=queue)
+            self._twiddle(queue, (n1*w,), None, col.base_data,
+                          np.int64(c0), np.int64(w), np.int64(n), sign)
+            slot.event = cl.enqueue_copy(queue, work, col.base_data,
+                                         buffer_origin=(0, 0), host_origin=(c0*itemsize, 0),
+                                         region=(w*itemsize, n1),
+                                         buffer_pitches=(w*itemsize,), host_pitches=(n2*itemsize,),
+                                         is_blocking=False)
+        for slot in self._slots:
+            slot.wait()
+
+        # step 3: row transforms, transposed output
+        h_max = self.row_height
+        for i, r0 in enumerate(range(0, n1, h_max)):
+            h = min(h_max, n1 - r0)
+            slot = self._slots[i % 2]
+            slot.wait()
+            queue = slot.queue
+            cl.enqueue_copy(queue, slot.row_in.base_data, work[r0:r0+h], is_blocking=False)
+            transform = self._row_transform(slot, h)
+            transform.enqueue_arrays(data=slot.row_in[:h], result=self._row_result(slot, h),
+                                     forward=forward, queue=queue)
+            slot.event = cl.enqueue_copy(queue, host_out, slot.row_out.base_data,
+                                         buffer_origin=(0, 0), host_origin=(r0*itemsize, 0),
+                                         region=(h*itemsize, n2),
+                                         buffer_pitches=(h*itemsize,), host_pitches=(n1*itemsize,),
+                                         is_blocking=False)
+        for slot in self._slots:
+            slot.wait()
+
+        return host_out
@@ -0,0 +1,201 @@
+"""
+numpy.fft compatible functions for pyopencl arrays.
+
+The functions accept `pyopencl.array.Array` instances and return
+new arrays, allocated from a memory pool. Arguments `s`, `axes` and
+`norm` have the same meaning as for `numpy.fft`. Normalization is
+applied by the scaling of the clFFT plan, not by an additional
+kernel. Baked plans are taken from the plan cache
+(`gpyfft.cache.plan_cache`), so repeated calls with same array
+layouts do not pay for plan creation.
+
+Note: `gpyfft.fft` is the module containing the `FFT` class, the
+functional interface therefore lives in `gpyfft.numpy_fft` (as in
+pyFFTW).
+"""
+
+from __future__ import absolute_import, division, print_function
+import threading
+import weakref
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+import pyopencl.tools as cl_tools
+from .fft import FFT
+from .arrays import _copy_region
+
+__all__ = ['fft', 'ifft', 'fft2', 'ifft2', 'fftn', 'ifftn',
+           'rfft', 'irfft', 'rfft2', 'irfft2', 'rfftn', 'irfftn']
+
+_complex_dtypes = {np.dtype(np.float32): np.dtype(np.complex64),
+                   np.dtype(np.float64): np.dtype(np.complex128),
+                   np.dtype(np.complex64): np.dtype(np.complex64),
+                   np.dtype(np.complex128): np.dtype(np.complex128),
+                  }
+
+_real_dtypes = {np.dtype(np.complex64): np.dtype(np.float32),
+                np.dtype(np.complex128): np.dtype(np.float64),
+               }
+
+# context -> memory pool, entries vanish with the context object of the
+# queue that created them (the pool allocates on that queue)
+_pools = weakref.WeakKeyDictionary()
+_pools_lock = threading.Lock()
+
+
+def _allocator(queue):
+    with _pools_lock:
+        pool = _pools.get(queue.context)
+        if pool is None:
+            pool = _pools[queue.context] = cl_tools.MemoryPool(cl_tools.ImmediateAllocator(queue))
+        return pool
+
+
+def _cook_nd_args(a, s=None, axes=None):
+    if s is None:
+        if axes is None:
+            axes = range(a.ndim)
+        s = [a.shape[axis] for axis in axes]
+    else:
+        s = list(s)
+        if axes is None:
+            axes = range(-len(s), 0)
+    axes = [axis % a.ndim for axis in axes]
+    if len(s) != len(axes):
+        raise ValueError('shape and axes have different lengths')
+    return s, axes
+
+
+def _resized(a, s, axes, dtype):
+    """array with shape `s` along `axes` (cropped or zero padded) and given dtype
+
+    returns (array, True if array is a copy)
+    """
+    shape = list(a.shape)
+    for n, axis in zip(s, axes):
+        shape[axis] = n
+    if tuple(shape) == a.shape and dtype == a.dtype:
+        return a, False
+    return _copy_region(a, shape, dtype=dtype, allocator=_allocator(a.queue)), True
+
+
+def _enqueue(transform, a, result, forward):
+    # wait for pending operations on input, a single marker event (clFFT takes few events)
+    wait_for = a.events
+    if len(wait_for) > 1:
+        wait_for = [cl.enqueue_marker(a.queue, wait_for=wait_for)]
+    for event in transform.enqueue(forward=forward, wait_for_events=wait_for):
+        result.add_event(event)
+    return result
+
+
+def _c2c(a, s, axes, norm, forward):
+    try:
+        dtype = _complex_dtypes[a.dtype]
+    except KeyError:
+        raise TypeError('unsupported dtype %s' % a.dtype)
+    s, axes = _cook_nd_args(a, s, axes)
+    a, is_copy = _resized(a, s, axes, dtype)
+    if is_copy:
+        result = a #transform copy in place
+        out = None
+    else:
+        result = out = cla.empty(a.queue, a.shape, dtype, allocator=_allocator(a.queue))
+    transform = FFT(a.context, a.queue, a, out, axes=axes[::-1], norm=norm)
+    return _enqueue(transform, a, result, forward)
+
+
+def _r2c(a, s, axes, norm):
+    if a.dtype not in (np.float32, np.float64):
+        raise TypeError('unsupported dtype %s, expected real input' % a.dtype)
+    s, axes = _cook_nd_args(a, s, axes)
+    a, is_copy = _resized(a, s, axes, a.dtype)
+    out_shape = list(a.shape)
+    out_shape[axes[-1]] = s[-1]//2 + 1
+    result = cla.empty(a.queue, tuple(out_shape), _complex_dtypes[a.dtype], allocator=_allocator(a.queue))
+    # first transform axis is the one with hermitian symmetry
+    transform = FFT(a.context, a.queue, a, result, axes=axes[::-1], norm=norm)
+    return _enqueue(transform, a, result, True)
+
+
+def _c2r(a, s, axes, norm):
+    try:
+        dtype = _real_dtypes[a.dtype]
+    except KeyError:
+        raise TypeError('unsupported dtype %s, expected complex input' % a.dtype)
+    s_given = s is not None
+    s, axes = _cook_nd_args(a, s, axes)
+    if not s_given:
+        s[-1] = 2*(a.shape[axes[-1]] - 1)
+    s_in = list(s)
+    s_in[-1] = s[-1]//2 + 1
+    shape = list(a.shape)
+    for n, axis in zip(s_in, axes):
+        shape[axis] = n
+    # always copy, complex-to-real transforms might overwrite their input
+    a = _copy_region(a, shape, allocator=_allocator(a.queue))
+    out_shape = list(a.shape)
+    out_shape[axes[-1]] = s[-1]
+    result = cla.empty(a.queue, tuple(out_shape), dtype, allocator=_allocator(a.queue))
+    transform = FFT(a.context, a.queue, a, result, axes=axes[::-1], real=True, norm=norm)
+    return _enqueue(transform, a, result, False)
+
+
+def fft(a, n=None, axis=-1, norm=None):
+    """1D discrete Fourier transform, see `numpy.fft.fft`"""
+    return _c2c(a, None if n is None else [n], [axis], norm, True)
+
+
+def ifft(a, n=None, axis=-1, norm=None):
+    """1D inverse discrete Fourier transform, see `numpy.fft.ifft`"""
+    return _c2c(a, None if n is None else [n], [axis], norm, False)
+
+
+def fft2(a, s=None, axes=(-2, -1), norm=None):
+    """2D discrete Fourier transform, see `numpy.fft.fft2`"""
+    return _c2c(a, s, axes, norm, True)
+
+
+def ifft2(a, s=None, axes=(-2, -1), norm=None):
+    """2D inverse discrete Fourier transform, see `numpy.fft.ifft2`"""
+    return _c2c(a, s, axes, norm, False)
+
+
+def fftn(a, s=None, axes=None, norm=None):
+    """N-D discrete Fourier transform, see `numpy.fft.fftn`"""
+    return _c2c(a, s, axes, norm, True)
+
+
+def ifftn(a, s=None, axes=None, norm=None):
+    """N-D inverse discrete Fourier transform, see `numpy.fft.ifftn`"""
+    return _c2c(a, s, axes, norm, False)
+
+
+def rfft(a, n=None, axis=-1, norm=None):
+    """1D discrete Fourier transform of real input, see `numpy.fft.rfft`"""
+    return _r2c(a, None if n is None else [n], [axis], norm)
+
+
+def irfft(a, n=None, axis=-1, norm=None):
+    """inverse of `rfft`, see `numpy.fft.irfft`"""
+    return _c2r(a, None if n is None else [n], [axis], norm)
+
+
+def rfft2(a, s=None, axes=(-2, -1), norm=None):
+    """2D discrete Fourier transform of real input, see `numpy.fft.rfft2`"""
+    return _r2c(a, s, axes, norm)
+
+
+def irfft2(a, s=None, axes=(-2, -1), norm=None):
+    """inverse of `rfft2`, see `numpy.fft.irfft2`"""
+    return _c2r(a, s, axes, norm)
+
+
+def rfftn(a, s=None, axes=None, norm=None):
+    """N-D discrete Fourier transform of real input, see `numpy.fft.rfftn`"""
+    return _r2c(a, s, axes, norm)
+
+
+def irfftn(a, s=None, axes=None, norm=None):
+    """inverse of `rfftn`, see `numpy.fft.irfftn`"""
+    return _c2r(a, s, axes, norm)
@@ -0,0 +1,241 @@
+"""
+Opt-in profiling and tracing of transforms.
+
+While a `Profiler` is active, every transform enqueued by an `FFT`
+object is recorded, with the Python dispatch time (host) and the
+OpenCL event timestamps queued, submit, start and end (device, needs
+a command queue created with `PROFILING_ENABLE`). clFFT returns the
+event of the last kernel only, so by default a marker is enqueued
+before each transform, its completion marks the start of the
+transform (on in-order queues). Baking of plans is recorded as well::
+
+    profiler = Profiler()
+    with profiler:
+        for i in range(100):
+            transform.enqueue()
+    profiler.print_summary()
+    profiler.export_chrome_trace('trace.json')
+
+`Profiler.summary` aggregates records per plan signature (count,
+median and 99th percentile of device time, dispatch time, Gflops,
+bandwidth, temporary buffer size, bake time). The trace can be viewed
+in chrome://tracing or https://ui.perfetto.dev. Device timestamps are
+aligned to the host clock by the first transform recorded per queue.
+"""
+
+from __future__ import absolute_import, division, print_function
+import json
+import sys
+import threading
+import timeit
+import numpy as np
+import pyopencl as cl
+import gpyfft.gpyfftlib as gfft
+from .cost import flops as _flops, io_bytes as _bytes
+
+__all__ = ['Profiler']
+
+active = None #profiler currently recording, None if profiling is off
+_active_lock = threading.Lock()
+
+
+def _label(signature):
+    """short description of transform for reports"""
+    layouts = '/'.join(str(layout).split('.')[-1].replace('CLFFT_', '').lower()
+                       for layout in signature.layouts)
+    precision = 'double' if signature.precision == gfft.clfftPrecision_.CLFFT_DOUBLE else 'single'
+    return '%s x%d %s %s%s%s' % ('x'.join(str(n) for n in signature.t_shape), signature.batch_size,
+                                 precision, layouts, ' inplace' if signature.inplace else '',
+                                 ' callbacks' if signature.callbacks else '')
+
+
+def _profile(event):
+    """(queued, submit, start, end) in ns, None if profiling info is not available"""
+    try:
+        info = event.profile
+        return info.queued, info.submit, info.start, info.end
+    except cl.Error:
+        return None
+
+
+class Profiler(object):
+    """records transforms enqueued while active
+
+    Parameters
+    ----------
+    markers : bool
+        enqueue a marker before each transform to get the start time of
+        transforms with several kernels, otherwise the start of the
+        last kernel is used
+    """
+
+    def __init__(self, markers=True):
+        self.markers = markers
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """discard all records"""
+        with self._lock:
+            self._transforms = [] #(signature, queue, thread, host start, host end, marker, event, count, temp_size)
+            self._bakes = [] #(signature, thread, host start, host end)
+
+    def start(self):
+        global active
+        with _active_lock:
+            assert active is None or active is self, 'another profiler is active'
+            active = self
+        return self
+
+    def stop(self):
+        global active
+        with _active_lock:
+            if active is self:
+                active = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _enqueue(self, transform, queue, enqueue, count=1, wait_for=None):
+        """record `enqueue()` of `count` plan enqueues on `queue` (waiting
+        for `wait_for`), returns its events"""
+        tic = timeit.default_timer()
+        marker = cl.enqueue_marker(queue, wait_for=wait_for) if self.markers else None
+        events = enqueue()
+        toc = timeit.default_timer()
+        with self._lock:
+            self._transforms.append((transform.signature, queue, threading.current_thread().name,
+                                     tic, toc, marker, events[-1] if events else None,
+                                     count, transform.temp_size))
+        return events
+
+    def _bake(self, signature, tic, toc):
+        with self._lock:
+            self._bakes.append((signature, threading.current_thread().name, tic, toc))
+
+    def records(self):
+        """list of dicts, one for each recorded enqueue (waits for completion)
+
+        times in seconds (host clock), device times in ns (device clock),
+        None if not available
+        """
+        with self._lock:
+            transforms = list(self._transforms)
+        records = []
+        for signature, queue, thread, tic, toc, marker, event, count, temp_size in transforms:
+            record = dict(signature=signature, label=_label(signature), queue=queue,
+                          device=queue.device.name.strip(), thread=thread,
+                          host_start=tic, dispatch=toc - tic, count=count, temp_size=temp_size,
+                          queued=None, submit=None, start=None, end=None)
+            if event is not None:
+                event.wait()
+                times = _profile(event)
+                if times is not None:
+                    record['queued'], record['submit'], record['start'], record['end'] = times
+                    if marker is not None:
+                        marker_times = _profile(marker)
+                        record['queued'], record['submit'] = marker_times[:2]
+                        record['start'] = min(marker_times[3], times[2])
+            records.append(record)
+        return records
+
+    def bakes(self):
+        """list of dicts for recorded plan bakes"""
+        with self._lock:
+            bakes = list(self._bakes)
+        return [dict(signature=signature, label=_label(signature), thread=thread,
+                     host_start=tic, duration=toc - tic)
+                for signature, thread, tic, toc in bakes]
+
+    def summary(self):
+        """list of dicts with statistics per plan signature, most total device time first
+
+        times in ms, dispatch time in us, Gflops and GB/s from median device time
+        """
+        groups = {}
+        for record in self.records():
+            groups.setdefault(record['signature'], []).append(record)
+        bake_times = {}
+        for bake in self.bakes():
+            bake_times[bake['signature']] = bake_times.get(bake['signature'], 0) + bake['duration']
+
+        result = []
+        for signature, records in groups.items():
+            count = sum(record['count'] for record in records)
+            durations = [1e-6*(record['end'] - record['start'])/record['count']
+                         for record in records if record['end'] is not None]
+            dispatch = [1e6*record['dispatch']/record['count'] for record in records]
+            entry = dict(label=_label(signature), signature=signature, count=count,
+                         dispatch_us=float(np.mean(dispatch)),
+                         temp_size=max(record['temp_size'] for record in records),
+                         bake_ms=1e3*bake_times[signature] if signature in bake_times else None,
+                         total_ms=None, p50_ms=None, p99_ms=None, gflops=None, gbps=None)
+            if durations:
+                p50 = float(np.percentile(durations, 50))
+                entry.update(total_ms=float(np.sum(durations))*count/len(durations),
+                             p50_ms=p50, p99_ms=float(np.percentile(durations, 99)))
+                if p50 > 0:
+                    entry.update(gflops=1e-6*_flops(signature)/p50, gbps=1e-6*_bytes(signature)/p50)
+            result.append(entry)
+        result.sort(key=lambda entry: -(entry['total_ms'] or 0))
+        return result
+
+    def print_summary(self, file=sys.stdout):
+        print('%-50s %7s %9s %9s %11s %8s %8s %9s' % ('transform', 'count', 'p50 ms', 'p99 ms',
+                                                     'dispatch us', 'Gflops', 'GB/s', 'bake ms'), file=file)
+        for entry in self.summary():
+            print('%-50s %7d %9s %9s %11.1f %8s %8s %9s' % (
+                entry['label'], entry['count'],
+                '%.3f' % entry['p50_ms'] if entry['p50_ms'] is not None else '-',
+                '%.3f' % entry['p99_ms'] if entry['p99_ms'] is not None else '-',
+                entry['dispatch_us'],
+                '%.1f' % entry['gflops'] if entry['gflops'] is not None else '-',
+                '%.1f' % entry['gbps'] if entry['gbps'] is not None else '-',
+                '%.1f' % entry['bake_ms'] if entry['bake_ms'] is not None else '-'), file=file)
+
+    def chrome_trace(self):
+        """dict in Chrome trace event format (timestamps in us)
+
+        host process: dispatch and bake of transforms per thread,
+        one process per command queue: transforms on the device
+        """
+        events = []
+        records = self.records()
+        bakes = self.bakes()
+        starts = [record['host_start'] for record in records] + [bake['host_start'] for bake in bakes]
+        t0 = min(starts) if starts else 0
+
+        def us(seconds):
+            return 1e6*(seconds - t0)
+
+        events.append(dict(name='process_name', ph='M', pid=0, args=dict(name='host')))
+        queues = {} #queue -> (pid, offset of device clock in us)
+        for record in records:
+            args = dict(count=record['count'], temp_size=record['temp_size'])
+            events.append(dict(name=record['label'], cat='dispatch', ph='X', pid=0, tid=record['thread'],
+                               ts=us(record['host_start']), dur=1e6*record['dispatch'], args=args))
+            if record['end'] is None:
+                continue
+            queue = record['queue']
+            if queue not in queues:
+                # align device clock: queued timestamp taken at dispatch
+                queues[queue] = (len(queues) + 1, us(record['host_start']) - 1e-3*record['queued'])
+                events.append(dict(name='process_name', ph='M', pid=queues[queue][0],
+                                   args=dict(name='%s queue %d' % (record['device'], queues[queue][0]))))
+            pid, offset = queues[queue]
+            args = dict(args, queued_us=1e-3*(record['start'] - record['queued']))
+            events.append(dict(name=record['label'], cat='transform', ph='X', pid=pid, tid=0,
+                               ts=offset + 1e-3*record['start'], dur=1e-3*(record['end'] - record['start']),
+                               args=args))
+        for bake in bakes:
+            events.append(dict(name='bake ' + bake['label'], cat='bake', ph='X', pid=0, tid=bake['thread'],
+                               ts=us(bake['host_start']), dur=1e6*bake['duration']))
+        return dict(traceEvents=events, displayTimeUnit='ns')
+
+    def export_chrome_trace(self, filename):
+        """write Chrome trace (JSON), viewable in chrome://tracing or Perfetto"""
+        with open(filename, 'w') as f:
+            json.dump(self.chrome_trace(), f)
@@ -0,0 +1,84 @@
+"""
+Temporary (scratch) buffers shared between transforms.
+
+clFFT needs a temporary buffer for some transforms. Transforms
+enqueued on the same in-order command queue never run concurrently,
+so they can share a single scratch buffer, sized to the largest
+requirement. The buffer grows on demand; a replaced buffer is
+released by OpenCL only after all commands using it have finished.
+Scratch buffers are thread-safe.
+
+The shared buffer of a queue lives as long as transforms (or graphs)
+using it exist, it does not keep the queue alive beyond that.
+"""
+
+from __future__ import absolute_import, division, print_function
+import threading
+import weakref
+import pyopencl as cl
+
+
+class ScratchBuffer(object):
+    """Growing temporary buffer"""
+
+    def __init__(self, context, queue=None):
+        self.context = context
+        self.queue = queue #keeps queue alive while shared buffer is in use
+        self.buffer = None
+        self.size = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, size):
+        """make sure buffer has at least `size` bytes, returns buffer"""
+        with self._lock:
+            if size > self.size:
+                self.buffer = cl.Buffer(self.context, cl.mem_flags.READ_WRITE, size=size)
+                self.size = size
+            return self.buffer
+
+    def get(self, size):
+        """return buffer with at least `size` bytes, None if size is 0"""
+        if not size:
+            return None
+        return self.reserve(size)
+
+
+# queue (int_ptr) -> shared buffer, entries vanish with their last user
+# (command queues cannot be weakly referenced)
+_scratch_buffers = weakref.WeakValueDictionary()
+_lock = threading.Lock()
+
+
+def scratch_buffer(queue):
+    """scratch buffer for transforms enqueued on `queue`
+
+    Command queues with out-of-order execution get a new, unshared
+    buffer. Keep a reference to the returned buffer as long as it is
+    used, e.g. once per transform.
+    """
+    if queue.properties & cl.command_queue_properties.OUT_OF_ORDER_EXEC_MODE_ENABLE:
+        return ScratchBuffer(queue.context)
+    with _lock:
+        scratch = _scratch_buffers.get(queue.int_ptr)
+        if scratch is None:
+            scratch = _scratch_buffers[queue.int_ptr] = ScratchBuffer(queue.context, queue)
+        return scratch
+
+
+def scratch_footprint():
+    """total size (bytes) of shared scratch buffers"""
+    with _lock:
+        return sum(scratch.size for scratch in _scratch_buffers.values())
+
+
+def release_scratch(queue=None):
+    """release shared scratch buffer of `queue` (all queues if None)
+
+    Transforms created before keep their buffer alive as long as they
+    exist.
+    """
+    with _lock:
+        if queue is None:
+            _scratch_buffers.clear()
+        else:
+            _scratch_buffers.pop(queue.int_ptr, None)
@@ -0,0 +1,161 @@
+"""
+Batched transforms sharded across several devices.
+
+`ShardedFFT` splits a batch of transforms along the first axis into
+shards, one for each command queue. Queues can belong to different
+contexts and devices (or OpenCL sub-devices). Shard sizes are
+proportional to weights, which can be measured with `calibrate`.
+"""
+
+from __future__ import absolute_import, division, print_function
+import timeit
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from .fft import FFT
+from .arrays import _transform_output
+
+
+def _split(n, weights):
+    """split n items proportional to weights (largest remainder method)"""
+    weights = np.asarray(weights, dtype=float)
+    exact = n * weights / weights.sum()
+    counts = np.floor(exact).astype(int)
+    remainder = n - counts.sum()
+    counts[np.argsort(counts - exact)[:remainder]] += 1
+    return [int(c) for c in counts]
+
+
+class _Shard(object):
+
+    def __init__(self, queue, start, count, shape, dtype, out_shape, out_dtype, axes, real):
+        self.queue = queue
+        self.start = start
+        self.count = count
+        self.data = cla.empty(queue, (count,) + shape[1:], dtype)
+        if out_shape == shape and out_dtype == dtype:
+            self.result = None #inplace
+        else:
+            self.result = cla.empty(queue, (count,) + out_shape[1:], out_dtype)
+        self.transform = FFT(queue.context, queue, self.data, self.result, axes=axes, real=real)
+
+    @property
+    def output(self):
+        return self.data if self.result is None else self.result
+
+
+class ShardedFFT(object):
+    """Batched transform distributed over several command queues
+
+    Parameters
+    ----------
+    queues : list of pyopencl.CommandQueue
+        one queue per device (or sub-device)
+
+    shape : tuple
+        shape of the complete batch of input data, the first axis is
+        split across devices
+
+    dtype : numpy dtype
+        dtype of input data, real dtypes select real-to-complex
+        transforms
+
+    axes : tuple, optional
+        transform axes, must not contain the first axis. Default:
+        all but the first axis.
+
+    weights : list of float, optional
+        relative throughput of devices. Default: equal weights
+
+    real : bool
+        complex-to-real transform, requires `out_shape`
+
+    out_shape : tuple, optional
+        shape of result, only needed for complex-to-real transforms
+    """
+
+    def __init__(self, queues, shape, dtype, axes=None, weights=None, real=False, out_shape=None):
+        self.queues = list(queues)
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        ndim = len(shape)
+        if axes is None:
+            axes = range(1, ndim)[::-1]
+        self.axes = [a % ndim for a in axes]
+        if 0 in self.axes:
+            raise ValueError('first axis is the batch axis and must not be transformed')
+        self.real = real
+        self.out_shape, self.out_dtype = _transform_output(shape, dtype, self.axes, real, out_shape)
+
+        if weights is None:
+            weights = [1.] * len(self.queues)
+        self._make_shards(weights)
+
+    def _make_shards(self, weights):
+        self.weights = list(weights)
+        counts = _split(self.shape[0], weights)
+        self.shards = []
+        start = 0
+        for queue, count in zip(self.queues, counts):
+            if count:
+                self.shards.append(_Shard(queue, start, count,
+                                          self.shape, self.dtype,
+                                          self.out_shape, self.out_dtype,
+                                          self.axes, self.real))
+            start += count
+
+    def calibrate(self, n_run=5, batch=None):
+        """measure throughput of each device and redistribute shards accordingly
+
+        Returns the new weights (transforms per second).
+        """
+        if batch is None:
+            batch = max(1, self.shape[0] // len(self.queues))
+        weights = []
+        for queue in self.queues:
+            data = cla.zeros(queue, (batch,) + self.shape[1:], self.dtype)
+            if self.out_shape == self.shape and self.out_dtype == self.dtype:
+                result = None
+            else:
+                result = cla.empty(queue, (batch,) + self.out_shape[1:], self.out_dtype)
+            transform = FFT(queue.context, queue, data, result, axes=self.axes, real=self.real)
+            transform.enqueue()
+            queue.finish()
+            tic = timeit.default_timer()
+            for i in range(n_run):
+                transform.enqueue()
+            queue.finish()
+            toc = timeit.default_timer()
+            weights.append(batch * n_run / (toc - tic))
+        self._make_shards(weights)
+        return weights
+
+    def set(self, host_array):
+        """upload input data from host, returns list of events"""
+        assert host_array.shape == self.shape
+        host_array = np.ascontiguousarray(host_array, dtype=self.dtype)
+        return [cl.enqueue_copy(shard.queue, shard.data.base_data,
+                                host_array[shard.start:shard.start+shard.count],
+                                is_blocking=False)
+                for shard in self.shards]
+
+    def enqueue(self, forward=True):
+        """enqueue transforms on all devices, returns combined list of events"""
+        events = []
+        for shard in self.shards:
+            events.extend(shard.transform.enqueue(forward=forward))
+        return events
+
+    def get(self, host_out=None):
+        """download result, returns host array"""
+        if host_out is None:
+            host_out = np.empty(self.out_shape, self.out_dtype)
+        assert host_out.shape == self.out_shape and host_out.dtype == self.out_dtype
+        events = [cl.enqueue_copy(shard.queue,
+                                  host_out[shard.start:shard.start+shard.count],
+                                  shard.output.base_data,
+                                  is_blocking=False)
+                  for shard in self.shards]
+        for event in events: #events of different contexts
+            event.wait()
+        return host_out
@@ -0,0 +1,257 @@
+"""
+Transform sizes for clFFT.
+
+clFFT supports transform lengths with prime factors 2, 3, 5, 7, 11 and
+13 only. Lengths with factors 2, 3, 5 and 7 are generally fast, but
+performance varies between lengths and devices. `next_fast_len`
+returns the smallest fast length at least as large as a target, e.g.
+for zero padding in convolutions. Given a command queue, candidate
+lengths are measured on its device instead (once per device, target
+and precision) and the fastest is returned.
+
+The memory layout matters as well: if the stride of a transform axis
+is a multiple of a large power of two, the accesses of a multi-pass
+transform hit the same memory channels (e.g. 256^3 volumes). `empty`,
+`zeros` and `to_device` allocate C contiguous storage with inner axes
+padded to avoid such strides, and return views of the requested shape
+into it, which `FFT` transforms directly. The padding follows a model
+(`storage_shape`) or is chosen among candidates by measurement.
+"""
+
+from __future__ import absolute_import, division, print_function
+import threading
+import numpy as np
+import pyopencl.array as cla
+from .fft import FFT
+from .cost import _measure, _profiling_queue, _conflict_bytes
+
+__all__ = ['RADICES', 'FAST_RADICES', 'is_supported', 'next_fast_len',
+           'storage_shape', 'empty', 'zeros', 'to_device']
+
+RADICES = (2, 3, 5, 7, 11, 13) #supported by clFFT
+FAST_RADICES = (2, 3, 5, 7)
+
+_calibrated = {} #(device, target, real, double) -> length
+_calibrated_lock = threading.Lock()
+
+_storage_shapes = {} #(device, shape, dtype, axes, inplace) -> measured storage shape
+
+
+def is_supported(n, radices=RADICES):
+    """True if `n` has no prime factors besides `radices`"""
+    if n < 1:
+        return False
+    for p in radices:
+        while n % p == 0:
+            n //= p
+    return n == 1
+
+
+def _next_smooth(target, radices):
+    """smallest product of powers of `radices` >= target"""
+    best = [2**int(np.ceil(np.log2(target))) if 2 in radices else float('inf')]
+    def visit(i, m):
+        if m >= target:
+            best[0] = min(best[0], m)
+            return
+        if i == len(radices):
+            return
+        while m < best[0]:
+            visit(i + 1, m)
+            m *= radices[i]
+    visit(0, 1)
+    return int(best[0])
+
+
+def _candidates(target, n_candidates):
+    """smallest lengths >= target supported by clFFT, and next power of two"""
+    candidates = []
+    n = target
+    while len(candidates) < n_candidates:
+        n = _next_smooth(n, RADICES)
+        candidates.append(n)
+        n += 1
+    candidates.append(2**int(np.ceil(np.log2(target))))
+    return sorted(set(candidates))
+
+
+def _calibrate(queue, target, real, double, n_candidates, batch_elements=2**20):
+    """fastest of candidate lengths, from batched 1D transforms on device of `queue`"""
+    context = queue.context
+    profiling_queue = _profiling_queue(context, queue.device)
+    batch = max(1, batch_elements // target) #same for all candidates
+    times = []
+    for n in _candidates(target, n_candidates):
+        if real:
+            dtype, cdtype = (np.float64, np.complex128) if double else (np.float32, np.complex64)
+            data = cla.empty(queue, (batch, n), dtype)
+            result = cla.empty(queue, (batch, n//2 + 1), cdtype)
+        else:
+            data = cla.empty(queue, (batch, n), np.complex128 if double else np.complex64)
+            result = None
+        data.fill(0)
+        transform = FFT(context, queue, data, result, axes=(-1,), wisdom=False)
+        queue.finish()
+        times.append((_measure(transform, profiling_queue, 5), n))
+    return min(times)[1]
+
+
+def next_fast_len(target, real=False, radices=FAST_RADICES, queue=None, double=False, n_candidates=8):
+    """smallest length >= `target` with prime factors `radices` only
+
+    Parameters
+    ----------
+    target : int
+
+    real : bool
+        length for real transforms (only used with `queue`)
+
+    radices : tuple of int
+        allowed prime factors, subset of `RADICES`
+
+    queue : pyopencl.CommandQueue, optional
+        measure instead: the `n_candidates` smallest lengths >=
+        `target` supported by clFFT and the next power of two are
+        timed on the device of `queue` (batched 1D transforms), the
+        fastest is returned. Results are cached per device.
+
+    double : bool
+        double precision (only used with `queue`)
+    """
+    target = int(target)
+    if target <= 1:
+        return 1
+    if queue is None:
+        if not set(radices) <= set(RADICES):
+            raise ValueError('clFFT supports radices %s only' % (RADICES,))
+        return _next_smooth(target, tuple(sorted(radices)))
+
+    key = (queue.device.int_ptr, target, bool(real), bool(double))
+    with _calibrated_lock:
+        n = _calibrated.get(key)
+    if n is None:
+        n = _calibrate(queue, target, real, double, n_candidates)
+        with _calibrated_lock:
+            _calibrated[key] = n
+    return n
+
+
+def _axes(shape, axes):
+    if axes is None:
+        return tuple(range(len(shape)))
+    return tuple(sorted(a % len(shape) for a in axes))
+
+
+def _real_inplace(dtype, inplace):
+    return inplace and np.dtype(dtype).kind == 'f'
+
+
+def _unpadded(shape, dtype, axes, inplace):
+    """storage extents without padding, last axis padded for in-place real transforms"""
+    extents = list(shape)
+    if _real_inplace(dtype, inplace):
+        if len(shape) - 1 not in axes:
+            raise ValueError('in-place real transforms need the last axis transformed')
+        extents[-1] = 2*(shape[-1]//2 + 1)
+    return extents
+
+
+def _pad_step(a, shape, dtype, inplace):
+    # in-place real: complex view needs an even number of real elements
+    return 2 if a == len(shape) - 1 and _real_inplace(dtype, inplace) else 1
+
+
+def _model_storage_shape(shape, dtype, axes, inplace):
+    itemsize = np.dtype(dtype).itemsize
+    extents = _unpadded(shape, dtype, axes, inplace)
+    for a in range(len(shape) - 1, 0, -1):
+        # pad extent of axis a until stride of transform axis a-1 is harmless
+        if a - 1 not in axes or shape[a - 1] == 1:
+            continue
+        while (itemsize*int(np.prod(extents[a:]))) % _conflict_bytes == 0:
+            extents[a] += _pad_step(a, shape, dtype, inplace)
+    return tuple(extents)
+
+
+def _view(storage, shape):
+    return storage[tuple(slice(0, n) for n in shape)]
+
+
+def _measure_storage_shape(queue, shape, dtype, axes, inplace):
+    """fastest of unpadded, model and model with further padded storage"""
+    model = _model_storage_shape(shape, dtype, axes, inplace)
+    candidates = [tuple(_unpadded(shape, dtype, axes, inplace)), model]
+    for a in range(1, len(shape)):
+        if a - 1 in axes and shape[a - 1] > 1:
+            extents = list(model)
+            extents[a] += _pad_step(a, shape, dtype, inplace)
+            candidates.append(tuple(extents))
+
+    context = queue.context
+    profiling_queue = _profiling_queue(context, queue.device)
+    dtype = np.dtype(dtype)
+    times = []
+    for extents in sorted(set(candidates)):
+        data = _view(cla.zeros(queue, extents, dtype), shape)
+        if inplace:
+            result = None
+        elif dtype.kind == 'f': #real-to-complex, output not padded
+            result = cla.zeros(queue, shape[:-1] + (shape[-1]//2 + 1,),
+                               np.complex64 if dtype == np.float32 else np.complex128)
+        else:
+            result = _view(cla.zeros(queue, extents, dtype), shape)
+        transform = FFT(context, queue, data, result, axes=axes[::-1], wisdom=False)
+        queue.finish()
+        times.append((_measure(transform, profiling_queue, 5), extents))
+    return min(times)[1]
+
+
+def storage_shape(shape, dtype, axes=None, inplace=False, queue=None):
+    """C contiguous storage shape for arrays of `shape` transformed along `axes`
+
+    Inner axes are padded such that the strides of the transform
+    axes are no multiple of 2048 bytes. For in-place real transforms
+    the last axis is padded for the complex result in addition. With
+    `queue`, the fastest of unpadded, model and some more padded
+    layouts is measured on its device instead (cached per device).
+    """
+    shape = tuple(int(n) for n in shape)
+    axes = _axes(shape, axes)
+    if queue is None:
+        return _model_storage_shape(shape, dtype, axes, inplace)
+    key = (queue.device.int_ptr, shape, np.dtype(dtype), axes, bool(inplace))
+    with _calibrated_lock:
+        extents = _storage_shapes.get(key)
+    if extents is None:
+        extents = _measure_storage_shape(queue, shape, dtype, axes, inplace)
+        with _calibrated_lock:
+            _storage_shapes[key] = extents
+    return extents
+
+
+def _allocate(alloc, queue, shape, dtype, axes, inplace, measure, allocator):
+    extents = storage_shape(shape, dtype, axes, inplace, queue if measure else None)
+    return _view(alloc(queue, extents, dtype, allocator=allocator), shape)
+
+
+def empty(queue, shape, dtype=np.complex64, axes=None, inplace=False, measure=False, allocator=None):
+    """array of `shape` in padded storage, see `storage_shape`
+
+    `axes` are the axes to be transformed (default: all),
+    `inplace` allocates storage for in-place real transforms,
+    `measure` selects the padding by measurement.
+    """
+    return _allocate(cla.empty, queue, shape, dtype, axes, inplace, measure, allocator)
+
+
+def zeros(queue, shape, dtype=np.complex64, axes=None, inplace=False, measure=False, allocator=None):
+    """zero-filled array in padded storage, see `empty`"""
+    return _allocate(cla.zeros, queue, shape, dtype, axes, inplace, measure, allocator)
+
+
+def to_device(queue, ary, axes=None, inplace=False, measure=False, allocator=None):
+    """copy of numpy array `ary` in padded storage, see `empty`"""
+    extents = storage_shape(ary.shape, ary.dtype, axes, inplace, queue if measure else None)
+    host = np.zeros(extents, ary.dtype)
+    _view(host, ary.shape)[...] = ary
+    return _view(cla.to_device(queue, host, allocator=allocator), ary.shape)
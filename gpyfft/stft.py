@@ -0,0 +1,263 @@
+"""
+Short-time Fourier transform (STFT) of pyopencl arrays.
+
+`STFT` transforms overlapping frames of a signal without copying them
+to a frames array. Without window, the frames are read directly from
+the signal by a batched plan with distance equal to the hop size. With
+a window, the element offset into the signal does not tell the
+position within (overlapping) frames, so the plan reads frames of a
+virtual contiguous layout instead: its pre callback loads each element
+from the signal and multiplies it with the window coefficient. Post
+callback stages (e.g. `gpyfft.callbacks.Power` for a spectrogram) are
+fused as well.
+
+`ISTFT` inverts the STFT: the inverse transforms of all frames,
+multiplied with the window in the post callback, are combined by
+overlap-add and normalized by the overlapping squared window. For
+real signals the spectrum is copied to a work array first, as
+complex-to-real transforms may overwrite their input.
+"""
+
+from __future__ import absolute_import, division, print_function
+import numpy as np
+import pyopencl.array as cla
+from .fft import FFT
+from .arrays import _overlap_add, _batch_stride, _copy_region
+from .callbacks import Callback, Window, _load
+from .numpy_fft import _real_dtypes
+
+__all__ = ['STFT', 'ISTFT', 'stft', 'istft']
+
+
+def _n_frames(n, frame_length, hop):
+    if hop < 1:
+        raise ValueError('hop must be positive')
+    if n < frame_length:
+        raise ValueError('signal of length %d shorter than frame length %d' % (n, frame_length))
+    return 1 + (n - frame_length)//hop
+
+
+def _window(window, frame_length):
+    if window is None:
+        return None
+    window = np.asarray(window, dtype=np.float64)
+    if window.shape != (frame_length,):
+        raise ValueError('window length %d does not match frame length %d' % (len(window), frame_length))
+    return window
+
+
+class _Frames(Callback):
+    """load element of overlapping frame from signal
+
+    The callback data is a virtual C contiguous array (..., n_frames,
+    frame_length) in the signal buffer.
+    """
+    loads = True
+
+    def __init__(self, signal, frame_length, n_frames, hop):
+        itemsize = signal.dtype.itemsize
+        self.batch_stride = _batch_stride(signal, signal.ndim - 1)
+        self.stride = signal.strides[-1] // itemsize
+        self.frame_length = frame_length
+        self.n_frames = n_frames
+        self.hop = hop
+
+    def code(self, info):
+        if info.loop_axes:
+            raise ValueError('frames must be transformed by a single enqueue')
+        L, F = self.frame_length, self.n_frames
+        # ulong constants: signal index may exceed 32 bits (frames overlap, batches are strided)
+        index = ('(inoffset / %dul)*%dul + ((inoffset / %dul) %% %dul * %dul + inoffset %% %dul) * %dul'
+                 % (F*L, self.batch_stride, L, F, self.hop, L, self.stride))
+        return _load(info, info.array.dtype, index)
+
+
+class STFT(object):
+    """short-time Fourier transform of (batched) signals along last axis
+
+    Parameters
+    ----------
+    context : pyopencl.Context
+
+    queue : pyopencl.CommandQueue
+
+    signal : pyopencl.array.Array
+        signal (..., n), real (also integer or half precision) or
+        complex. Leading axes are batch axes, which must be
+        collapsible if a window is used.
+
+    frame_length : int
+
+    hop : int
+        offset between frames
+
+    window : array_like, optional
+        analysis window of length `frame_length`
+
+    spectrum : pyopencl.array.Array, optional
+        result (..., n_frames, frame_length//2+1) for real signals,
+        (..., n_frames, frame_length) for complex signals, allocated
+        if not given
+
+    post : list of `gpyfft.callbacks.Callback`, optional
+        stages fused into the post callback, acting on the spectrum
+    """
+
+    def __init__(self, context, queue, signal, frame_length, hop, window=None, spectrum=None, post=None):
+        self.context = context
+        self.queue = queue
+        self.frame_length = L = frame_length
+        self.hop = hop
+        self.window = _window(window, frame_length)
+        batch_shape, n = signal.shape[:-1], signal.shape[-1]
+        self.n_frames = F = _n_frames(n, frame_length, hop)
+
+        self.signal = signal
+        frames = self._frames(signal)
+        real = frames.dtype.kind != 'c'
+        cdtype = np.dtype(np.complex128 if frames.dtype in (np.float64, np.complex128) else np.complex64)
+        if spectrum is None:
+            spectrum = cla.empty(queue, batch_shape + (F, L//2 + 1 if real else L), cdtype)
+        self.spectrum = spectrum
+
+        callbacks = {}
+        if self.window is not None:
+            callbacks['pre'] = [_Frames(signal, L, F, hop), Window(self.window)]
+        if post:
+            callbacks['post'] = list(post)
+        self.transform = FFT(context, queue, frames, spectrum, axes=(-1,), callbacks=callbacks or None)
+
+    def _frames(self, signal):
+        """frames (..., n_frames, frame_length) in signal buffer
+
+        overlapping view (distance hop) without window, virtual C
+        contiguous layout read by pre callback with window
+        """
+        batch_shape = signal.shape[:-1]
+        shape = batch_shape + (self.n_frames, self.frame_length)
+        if self.window is None:
+            strides = signal.strides[:-1] + (self.hop*signal.strides[-1], signal.strides[-1])
+        else:
+            strides = tuple(int(np.prod(shape[d+1:]))*signal.dtype.itemsize for d in range(len(shape)))
+        return cla.Array(signal.queue, shape, signal.dtype, strides=strides,
+                         data=signal.base_data, offset=signal.offset)
+
+    def enqueue(self, wait_for_events=None):
+        return self.enqueue_arrays(wait_for_events=wait_for_events)
+
+    def enqueue_arrays(self, signal=None, spectrum=None, wait_for_events=None, queue=None):
+        """enqueue STFT of `signal` (same layout as signal given at creation)"""
+        if signal is None:
+            signal = self.signal
+        assert signal.shape == self.signal.shape and signal.strides == self.signal.strides
+        assert signal.dtype == self.signal.dtype
+        return self.transform.enqueue_arrays(data=self._frames(signal), result=spectrum,
+                                             wait_for_events=wait_for_events, queue=queue)
+
+
+class ISTFT(object):
+    """inverse short-time Fourier transform, by overlap-add
+
+    Parameters
+    ----------
+    context : pyopencl.Context
+
+    queue : pyopencl.CommandQueue
+
+    spectrum : pyopencl.array.Array
+        STFT (..., n_frames, m) of signal
+
+    hop : int
+
+    frame_length : int, optional
+        default: 2*(m-1) for real signals, m for complex signals
+
+    window : array_like, optional
+        window used for the STFT
+
+    signal : pyopencl.array.Array, optional
+        result (..., (n_frames-1)*hop + frame_length), allocated if
+        not given
+
+    real : bool
+        spectrum of real signal (complex-to-real transforms)
+    """
+
+    def __init__(self, context, queue, spectrum, hop, frame_length=None, window=None, signal=None, real=True):
+        self.context = context
+        self.queue = queue
+        batch_shape = spectrum.shape[:-2]
+        F, m = spectrum.shape[-2:]
+        if frame_length is None:
+            frame_length = 2*(m - 1) if real else m
+        if (frame_length//2 + 1 if real else frame_length) != m:
+            raise ValueError('frame length %d does not match spectrum length %d' % (frame_length, m))
+        self.frame_length = L = frame_length
+        self.hop = hop
+        self.window = _window(window, frame_length)
+        self.n_frames = F
+        length = (F - 1)*hop + L
+
+        dtype = _real_dtypes[spectrum.dtype] if real else spectrum.dtype
+        if signal is None:
+            signal = cla.empty(queue, batch_shape + (length,), dtype)
+        assert signal.shape == batch_shape + (length,) and signal.dtype == dtype
+        self.spectrum = spectrum
+        self.signal = signal
+
+        # sum of overlapping squared windows
+        w = self.window if self.window is not None else np.ones(L)
+        weight = np.zeros(length)
+        for b in range(F):
+            weight[b*hop:b*hop + L] += w*w
+        scale = np.where(weight > 1e-10, 1/np.maximum(weight, 1e-10), 0)
+        self.scale = cla.to_device(queue, scale.astype(_real_dtypes.get(dtype, dtype)))
+
+        # complex-to-real transforms may overwrite their input, transform a copy
+        self.work = cla.empty(queue, spectrum.shape, spectrum.dtype) if real else None
+        self.frames = cla.empty(queue, batch_shape + (F, L), dtype)
+        callbacks = {'post': [Window(self.window)]} if self.window is not None else None
+        self.transform = FFT(context, queue, self.work if real else spectrum, self.frames, axes=(-1,),
+                             real=real, callbacks=callbacks)
+
+    def enqueue(self, wait_for_events=None):
+        return self.enqueue_arrays(wait_for_events=wait_for_events)
+
+    def enqueue_arrays(self, spectrum=None, signal=None, wait_for_events=None, queue=None):
+        """enqueue inverse transform of `spectrum` and overlap-add into `signal`
+
+        `spectrum` is not modified."""
+        if spectrum is None:
+            spectrum = self.spectrum
+        if signal is None:
+            signal = self.signal
+        queue = queue or self.queue
+        if self.work is not None:
+            assert spectrum.shape == self.work.shape and spectrum.dtype == self.work.dtype
+            _copy_region(spectrum, self.work.shape, out=self.work, queue=queue, wait_for=wait_for_events)
+            wait_for_events = self.work.events[-1:]
+            data = self.work
+        else:
+            data = spectrum
+        events = self.transform.enqueue_arrays(data=data, forward=False,
+                                               wait_for_events=wait_for_events, queue=queue)
+        for event in events:
+            self.frames.add_event(event)
+        _overlap_add(self.frames, self.hop, signal, scale=self.scale, queue=queue)
+        return tuple(signal.events[-1:])
+
+
+def stft(signal, frame_length, hop, window=None):
+    """STFT (..., n_frames, m) of pyopencl array `signal` (..., n), see `STFT`"""
+    transform = STFT(signal.context, signal.queue, signal, frame_length, hop, window=window)
+    for event in transform.enqueue(wait_for_events=signal.events):
+        transform.spectrum.add_event(event)
+    return transform.spectrum
+
+
+def istft(spectrum, hop, frame_length=None, window=None, real=True):
+    """inverse of `stft`, returns signal (..., (n_frames-1)*hop + frame_length)"""
+    queue = spectrum.queue
+    transform = ISTFT(spectrum.context, queue, spectrum, hop, frame_length=frame_length, window=window, real=real)
+    transform.enqueue(wait_for_events=spectrum.events)
+    return transform.signal
@@ -0,0 +1,177 @@
+"""
+Streaming transforms of host arrays.
+
+`StreamingFFT` transforms NumPy arrays residing in host memory, which
+may be much larger than device memory. The array is split into
+chunks along the first (batch) axis, which must not be transformed.
+Each chunk passes through one of several slots, each consisting of
+page-locked (pinned) host staging buffers, device buffers and an own
+command queue. While one chunk is transformed, the next chunk is
+uploaded and the previous one downloaded on the other queues.
+"""
+
+from __future__ import absolute_import, division, print_function
+import timeit
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from .fft import FFT
+from .arrays import _transform_output
+
+
+def _pinned_array(context, queue, shape, dtype):
+    """host array in page-locked memory, returns (array, buffer)"""
+    nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    buf = cl.Buffer(context, cl.mem_flags.READ_WRITE | cl.mem_flags.ALLOC_HOST_PTR, nbytes)
+    array, event = cl.enqueue_map_buffer(queue, buf,
+                                         cl.map_flags.READ | cl.map_flags.WRITE,
+                                         0, shape, dtype)
+    event.wait()
+    return array, buf
+
+
+class _Slot(object):
+
+    def __init__(self, context, queue, chunk_shape, in_dtype, out_chunk_shape, out_dtype, inplace):
+        self.queue = queue
+        self.pinned_in, self._pinned_in_buf = _pinned_array(context, queue, chunk_shape, in_dtype)
+        self.pinned_out, self._pinned_out_buf = _pinned_array(context, queue, out_chunk_shape, out_dtype)
+        self.dev_in = cla.empty(queue, chunk_shape, in_dtype)
+        if inplace:
+            self.dev_out = self.dev_in
+        else:
+            self.dev_out = cla.empty(queue, out_chunk_shape, out_dtype)
+        self.pending = None #(download event, start, count)
+
+    def finish(self, host_out):
+        """wait for pending download, copy it to host output array"""
+        if self.pending is not None:
+            event, start, count = self.pending
+            event.wait()
+            host_out[start:start+count] = self.pinned_out[:count]
+            self.pending = None
+
+
+class StreamingFFT(object):
+    """Batched transform of host arrays with overlapping transfers and computation
+
+    Parameters
+    ----------
+    context : pyopencl.Context
+
+    queue : pyopencl.CommandQueue
+        determines the device, additional queues are created for it
+
+    shape : tuple
+        shape of the host input arrays
+
+    dtype : numpy dtype
+        dtype of host input arrays. Real dtypes select real-to-complex
+        transforms.
+
+    axes : tuple, optional
+        transform axes, must not contain the first axis. Default:
+        all but first axis.
+
+    chunk_size : int, optional
+        number of items along the first axis transformed at once.
+        Default: chunks of about 64 MB.
+
+    n_slots : int
+        number of chunks in flight (3: triple buffering)
+
+    real : bool
+        complex-to-real transform, requires `out_shape`
+
+    out_shape : tuple, optional
+        shape of output arrays, only needed for complex-to-real
+        transforms
+    """
+
+    def __init__(self, context, queue, shape, dtype, axes=None,
+                 chunk_size=None, n_slots=3,
+                 real=False, out_shape=None):
+        self.context = context
+        dtype = np.dtype(dtype)
+        ndim = len(shape)
+        if axes is None:
+            axes = range(1, ndim)[::-1]
+        axes = [a % ndim for a in axes]
+        if 0 in axes:
+            raise ValueError('first axis is the batch axis and must not be transformed')
+
+        out_shape, out_dtype = _transform_output(shape, dtype, axes, real, out_shape)
+        inplace = out_dtype == dtype and out_shape == tuple(shape)
+
+        if chunk_size is None:
+            item_nbytes = max(int(np.prod(shape[1:])) * dtype.itemsize,
+                              int(np.prod(out_shape[1:])) * out_dtype.itemsize)
+            chunk_size = max(1, (64 << 20) // item_nbytes)
+        chunk_size = min(chunk_size, shape[0])
+
+        self.shape = tuple(shape)
+        self.dtype = dtype
+        self.out_shape = out_shape
+        self.out_dtype = out_dtype
+        self.axes = axes
+        self.real = real
+        self.chunk_size = chunk_size
+
+        chunk_shape = (chunk_size,) + self.shape[1:]
+        out_chunk_shape = (chunk_size,) + out_shape[1:]
+        self._slots = [_Slot(context, cl.CommandQueue(context, queue.device),
+                             chunk_shape, dtype, out_chunk_shape, out_dtype, inplace)
+                       for i in range(n_slots)]
+        self._transforms = {} #chunk length -> FFT
+
+        self.last_time = None
+        self.last_gbps = None
+
+    def _transform(self, count):
+        # transforms for full and (last) partial chunks
+        transform = self._transforms.get(count)
+        if transform is None:
+            slot = self._slots[0]
+            data = slot.dev_in[:count]
+            result = None if slot.dev_out is slot.dev_in else slot.dev_out[:count]
+            transform = FFT(self.context, slot.queue, data, result,
+                            axes=self.axes, real=self.real)
+            self._transforms[count] = transform
+        return transform
+
+    def run(self, host_in, host_out=None, forward=True):
+        """transform host array `host_in`, return host array with result
+
+        Sets `last_time` (seconds) and `last_gbps`, the achieved
+        throughput of host data (input plus output) in GB/s.
+        """
+        assert host_in.shape == self.shape and host_in.dtype == self.dtype
+        if host_out is None:
+            host_out = np.empty(self.out_shape, self.out_dtype)
+        assert host_out.shape == self.out_shape and host_out.dtype == self.out_dtype
+
+        tic = timeit.default_timer()
+        n = self.shape[0]
+        for i, start in enumerate(range(0, n, self.chunk_size)):
+            count = min(self.chunk_size, n - start)
+            slot = self._slots[i % len(self._slots)]
+            slot.finish(host_out)
+
+            queue = slot.queue
+            slot.pinned_in[:count] = host_in[start:start+count]
+            cl.enqueue_copy(queue, slot.dev_in.base_data, slot.pinned_in[:count], is_blocking=False)
+
+            result = None if slot.dev_out is slot.dev_in else slot.dev_out[:count]
+            self._transform(count).enqueue_arrays(data=slot.dev_in[:count], result=result,
+                                                  forward=forward, queue=queue)
+
+            event = cl.enqueue_copy(queue, slot.pinned_out[:count], slot.dev_out.base_data, is_blocking=False)
+            slot.pending = (event, start, count)
+
+        for slot in self._slots:
+            slot.finish(host_out)
+        toc = timeit.default_timer()
+
+        self.last_time = toc - tic
+        self.last_gbps = 1e-9 * (host_in.nbytes + host_out.nbytes) / self.last_time
+        return host_out
@@ -0,0 +1,46 @@
+from __future__ import print_function
+import unittest
+from parameterized import parameterized
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from gpyfft.arrays import empty_padded, padded_shape, complex_view, real_view
+from gpyfft.test.util import get_contexts
+
+contexts = [(ctx,) for ctx in get_contexts()]
+
+class test_padded(unittest.TestCase):
+
+    def test_padded_shape(self):
+        self.assertEqual(padded_shape((4, 30)), (4, 32))
+        self.assertEqual(padded_shape((4, 31)), (4, 32))
+        self.assertEqual(padded_shape((7, 4), axis=0), (8, 4))
+
+    @parameterized.expand(contexts)
+    def test_views(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        a = empty_padded(queue, (3, 11))
+        self.assertEqual(a.shape, (3, 11))
+        self.assertEqual(a.strides, (48, 4))
+
+        c = complex_view(a)
+        self.assertEqual(c.shape, (3, 6))
+        self.assertEqual(c.dtype, np.complex64)
+        self.assertIs(c.base_data, a.base_data)
+
+        nd_storage = np.arange(36, dtype=np.float32).reshape(3, 12)
+        cl.enqueue_copy(queue, a.base_data, nd_storage)
+        r = real_view(c, 11)
+        self.assertEqual(r.shape, a.shape)
+        self.assertEqual(r.strides, a.strides)
+        self.assertRaises(ValueError, real_view, c, 13)
+
+    @parameterized.expand(contexts)
+    def test_not_padded(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        a = cla.empty(queue, (3, 10), np.float32)
+        self.assertRaises(AssertionError, complex_view, a)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -75,3 +75,40 @@ class test_fft_batched(unittest.TestCase):
         assert np.allclose(cl_data_transformed.get(),
                            np.fft.fft2(nd_data, axes=axes),
                            rtol=1e-3, atol=1e-3)
+
+
+    @parameterized.expand(contexts)
+    def test_2d_in_4d_sliced(self, ctx):
+        queue = cl.CommandQueue(ctx)
+
+        L1 = 4
+        L2 = 5
+        M = 64
+        N = 32
+        axes = (-1, -2)
+
+        nd_data = np.arange(L1*L2*M*N, dtype=np.complex64)
+        nd_data.shape = (L1, L2, M, N)
+        cl_data = cla.to_device(queue, nd_data)[:, 1:4] #non-collapsible batch axes
+        cl_data_transformed = cla.zeros(queue, (L1, 3, M, N), np.complex64)
+
+        transform = FFT(ctx, queue,
+                        cl_data,
+                        cl_data_transformed,
+                        axes = axes,
+                        )
+        self.assertEqual(transform.batchsize * len(transform._offsets), L1*3)
+
+        transform.enqueue()
+
+        assert np.allclose(cl_data_transformed.get(),
+                           np.fft.fft2(nd_data[:, 1:4], axes=axes),
+                           rtol=1e-3, atol=1e-3)
+
+    @parameterized.expand(contexts)
+    def test_sliced_misaligned(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        cl_data = cla.zeros(queue, (4, 3, 5), np.complex64)[:, 1:] #loop slices start at odd offsets
+        cl_data_transformed = cla.zeros(queue, (4, 2, 5), np.complex64)
+
+        self.assertRaises(ValueError, FFT, ctx, queue, cl_data, cl_data_transformed, axes=(2,))
@@ -0,0 +1,47 @@
+from __future__ import print_function
+import unittest
+from parameterized import parameterized
+import pyopencl as cl
+from gpyfft import bench
+from gpyfft.test.util import get_contexts
+
+contexts = [(ctx,) for ctx in get_contexts()]
+
+class test_bench(unittest.TestCase):
+
+    def test_cases(self):
+        for preset in bench.PRESETS:
+            cases = bench.generate_cases(preset, ('single', 'double'))
+            self.assertTrue(len(cases) > 0)
+            names = [bench.case_name(case) for case in cases]
+            self.assertEqual(len(names), len(set(names)))
+            for case in cases:
+                self.assertTrue(bench.valid(case))
+
+        # planar complex layout, for all kinds
+        kinds = set(case.kind for case in bench.generate_cases('quick') if case.layout == 'P')
+        self.assertEqual(kinds, set(['c2c', 'r2c', 'c2r']))
+
+        cases = bench.generate_cases('full', max_elements=4096)
+        self.assertTrue(all(case.batch*case.shape[0] <= 4096 for case in cases))
+
+    def test_compare(self):
+        results = {'results': [dict(name='a', error=None, wall_ms=1.2, device_ms=1.0),
+                               dict(name='b', error=None, wall_ms=1.0, device_ms=1.0),
+                               dict(name='c', error='failed')]}
+        baseline = {'results': [dict(name='a', error=None, wall_ms=1.0, device_ms=1.0),
+                                dict(name='b', error=None, wall_ms=0.95, device_ms=1.0),
+                                dict(name='c', error=None, wall_ms=1.0, device_ms=1.0)]}
+        self.assertEqual(bench.compare(results, baseline, threshold=0.1),
+                         [('a', 'wall_ms', 1.2, 1.0)])
+
+    @parameterized.expand(contexts)
+    def test_measure(self, ctx):
+        queue = cl.CommandQueue(ctx, properties=cl.command_queue_properties.PROFILING_ENABLE)
+        cases = [case for case in bench.generate_cases('quick')
+                 if case.shape in ((256,), (210,), (256, 256))]
+        results = bench.run_cases(cases, ctx, queue, min_time=0.01, verbose=False)
+        for record in results['results']:
+            self.assertIsNone(record['error'], record['name'])
+            self.assertTrue(record['ok'], record['name'])
+            self.assertTrue(record['device_ms'] > 0)
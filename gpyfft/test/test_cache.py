@@ -0,0 +1,120 @@
+from __future__ import print_function
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from parameterized import parameterized
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from gpyfft import FFT, warmup
+from gpyfft.cache import PlanCache, PlanSignature, plan_cache, signature_to_json, signature_from_json, \
+    load_manifest
+from gpyfft.test.util import get_contexts
+
+contexts = [(ctx,) for ctx in get_contexts()]
+
+class test_plan_cache(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = PlanCache(maxsize=2)
+        cache.get('a', lambda: 1)
+        cache.get('b', lambda: 2)
+        cache.get('a', lambda: 3) #hit, 'a' most recently used
+        cache.get('c', lambda: 4) #evicts 'b'
+        self.assertTrue('a' in cache)
+        self.assertFalse('b' in cache)
+        self.assertEqual(cache.cache_info(), (1, 3, 2, 2))
+
+        cache.maxsize = 0
+        self.assertEqual(len(cache), 0)
+
+    def test_concurrent_creation(self):
+        cache = PlanCache()
+        created = []
+        def create():
+            time.sleep(0.05)
+            created.append(threading.current_thread())
+            return 42
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda i: cache.get('a', create), range(8)))
+        self.assertEqual(results, [42]*8)
+        self.assertEqual(len(created), 1)
+        self.assertEqual(cache.cache_info(), (7, 1, 32, 1))
+
+    def test_failed_creation(self):
+        cache = PlanCache()
+        def fail():
+            raise RuntimeError('bake failed')
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = cache.get_future('a', fail, executor=executor)
+            self.assertRaises(RuntimeError, future.result)
+        self.assertFalse('a' in cache)
+        self.assertEqual(cache.get('a', lambda: 1), 1)
+
+    def test_manifest(self):
+        signature = PlanSignature(t_shape=(32, 8), strides_in=(1, 32), strides_out=(1, 17),
+                                  distances=(256, 136), batch_size=4, precision=1, layouts=(5, 3),
+                                  inplace=False, scales=None,
+                                  callbacks=(('pre', b'float pre(__global void* in, uint inoffset, __global void* userdata) { return 0; }', None),))
+        self.assertEqual(signature_from_json(signature_to_json(signature)), signature)
+
+        cache = PlanCache()
+        cache.get(('context', 'device', signature), lambda: 1)
+        cache.get(('context', 'device', signature._replace(callbacks=(('post', b'', 'buffer'),))), lambda: 2)
+        manifest = cache.manifest()
+        self.assertEqual(len(manifest['plans']), 1)
+        self.assertEqual(signature_from_json(manifest['plans'][0]), signature)
+
+    @parameterized.expand(contexts)
+    def test_warmup(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        plan_cache.clear()
+        cl_data = cla.zeros(queue, (4, 64), np.complex64)
+        FFT(ctx, queue, cl_data, axes=(1,))
+        FFT(ctx, queue, cla.zeros(queue, (4, 64), np.float32), cla.zeros(queue, (4, 33), np.complex64),
+            axes=(1,), norm='ortho')
+
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'plans.json')
+            plan_cache.save_manifest(filename)
+            signatures = load_manifest(filename)
+            self.assertEqual(len(signatures), 2)
+
+            plan_cache.clear()
+            futures = warmup(ctx, queue, filename)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(len(futures), 2)
+        self.assertEqual(plan_cache.misses, 2)
+        transform = FFT(ctx, queue, cl_data, axes=(1,))
+        self.assertTrue(transform.plan is futures[0].result())
+        self.assertEqual(plan_cache.hits, 1)
+
+    @parameterized.expand(contexts)
+    def test_shared_plan(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        plan_cache.clear()
+
+        nd_data = np.arange(4*32, dtype=np.complex64).reshape(4, 32)
+        cl_data = cla.to_device(queue, nd_data)
+        cl_data_transformed = cla.zeros_like(cl_data)
+
+        transform1 = FFT(ctx, queue, cl_data, cl_data_transformed, axes=(1,))
+        transform2 = FFT(ctx, queue, cl_data, cl_data_transformed, axes=(1,))
+        self.assertTrue(transform1.plan is transform2.plan)
+        self.assertEqual(plan_cache.hits, 1)
+        self.assertEqual(plan_cache.misses, 1)
+
+        transform2.enqueue()
+        assert np.allclose(cl_data_transformed.get(),
+                           np.fft.fft(nd_data, axis=1),
+                           rtol=1e-3, atol=1e-3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+from __future__ import print_function
+import unittest
+from parameterized import parameterized
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from gpyfft import FFT
+from gpyfft.callbacks import Window, Scale, Multiply, Conjugate, Magnitude, Power, Convert, compose
+from gpyfft.test.util import get_contexts
+
+contexts = [(ctx,) for ctx in get_contexts()]
+
+class test_callbacks(unittest.TestCase):
+
+    @parameterized.expand(contexts)
+    def test_window_filter(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        M, N = 8, 64
+        nd_data = (np.random.normal(size=(M, N)) + 1j*np.random.normal(size=(M, N))).astype(np.complex64)
+        nd_filter = (np.random.normal(size=(M, N)) + 1j*np.random.normal(size=(M, N))).astype(np.complex64)
+        window = np.hanning(N)
+        cl_data = cla.to_device(queue, nd_data)
+        cl_filter = cla.to_device(queue, nd_filter)
+        cl_result = cla.empty_like(cl_data)
+
+        transform = FFT(ctx, queue, cl_data, cl_result, axes=(1,),
+                        callbacks={'pre': [Window(window), Scale(2.)],
+                                   'post': [Multiply(cl_filter), Conjugate()]})
+        transform.enqueue()
+
+        nd_result = np.conj(np.fft.fft(2*nd_data*window, axis=1) * nd_filter)
+        assert np.allclose(cl_result.get(), nd_result, rtol=1e-3, atol=1e-3)
+
+    @parameterized.expand(contexts)
+    def test_power_output(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        N = 128
+        nd_data = np.random.normal(size=N).astype(np.float32)
+        cl_data = cla.to_device(queue, nd_data)
+        cl_result = cla.empty(queue, (N//2+1,), np.complex64)
+        cl_power = cla.empty(queue, (N//2+1,), np.float32)
+
+        transform = FFT(ctx, queue, cl_data, cl_result,
+                        callbacks={'post': [Power(out=cl_power)]})
+        transform.enqueue()
+
+        assert np.allclose(cl_power.get(), abs(np.fft.rfft(nd_data))**2, rtol=1e-3, atol=1e-2)
+
+    @parameterized.expand(contexts)
+    def test_convert_input(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        N = 64
+        nd_data = np.random.randint(-1000, 1000, size=N).astype(np.int16)
+        cl_data = cla.to_device(queue, nd_data)
+        cl_result = cla.empty(queue, (N//2+1,), np.complex64)
+        cl_magnitude = cla.empty(queue, (N//2+1,), np.float16)
+
+        transform = FFT(ctx, queue, cl_data, cl_result,
+                        callbacks={'post': [Scale(1./N), Magnitude(out=cl_magnitude)]})
+        transform.enqueue()
+
+        assert np.allclose(cl_magnitude.get(), abs(np.fft.rfft(nd_data))/N, rtol=1e-2, atol=1e-2)
+
+    @parameterized.expand(contexts)
+    def test_long_window(self, ctx):
+        # coefficients in userdata, beyond constant memory size; equal windows share plans
+        queue = cl.CommandQueue(ctx)
+        N = 2**15
+        nd_data = np.random.normal(size=(2, N)).astype(np.complex64)
+        window = np.hanning(N)
+        cl_data = cla.to_device(queue, nd_data)
+        cl_result = cla.empty_like(cl_data)
+
+        transform = FFT(ctx, queue, cl_data, cl_result, axes=(1,), callbacks={'pre': [Window(window)]})
+        transform.enqueue()
+        assert np.allclose(cl_result.get(), np.fft.fft(nd_data*window, axis=1), rtol=1e-3, atol=1e-2)
+
+        transform2 = FFT(ctx, queue, cl_data, cl_result, axes=(1,), callbacks={'pre': [Window(window.copy())]})
+        self.assertTrue(transform2.plan is transform.plan)
+
+    @parameterized.expand(contexts)
+    def test_userdata_stages(self, ctx):
+        # a single userdata buffer per callback: Window and Multiply only in different callbacks
+        queue = cl.CommandQueue(ctx)
+        data = cla.zeros(queue, (4, 8), np.complex64)
+        h = cla.zeros(queue, (4, 8), np.complex64)
+        self.assertRaises(ValueError, compose, [Window(np.hanning(8)), Multiply(h)], 'pre', data, 'complex')
+        self.assertRaises(ValueError, compose, [Multiply(h), Power(out=cla.zeros(queue, (4, 8), np.float32))],
+                          'post', data, 'complex')
+        source, userdata = compose([Window(np.hanning(8)), Scale(2.)], 'pre', data, 'complex')
+        self.assertEqual(userdata.shape, (1, 8))
+        source, userdata = compose([Multiply(h), Conjugate()], 'post', data, 'complex')
+        self.assertTrue(userdata is h)
+
+    def test_compose_errors(self):
+        data = np.zeros((4, 8), np.complex64)
+        self.assertRaises(ValueError, compose, [Multiply(data), Scale(np.zeros((4, 8), np.float32))],
+                          'pre', data, 'complex')
+        self.assertRaises(ValueError, compose, [Window(np.ones(5))], 'pre', data, 'complex')
+        self.assertRaises(ValueError, compose, [Conjugate()], 'post', data, 'real')
+        self.assertRaises(ValueError, compose, [Power(out=np.zeros((4, 8), np.float32)), Scale(2.)],
+                          'post', data, 'complex')
+        self.assertRaises(ValueError, compose, [Convert(np.zeros((4, 8), np.complex64))], 'pre', data, 'complex')
+
+
+if __name__ == '__main__':
+    unittest.main()
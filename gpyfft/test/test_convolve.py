@@ -0,0 +1,86 @@
+from __future__ import print_function
+import unittest
+from parameterized import parameterized
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from gpyfft.convolve import fftconvolve, correlate, BlockConvolution
+from gpyfft.cache import plan_cache
+from gpyfft.test.util import get_contexts
+
+contexts = [(ctx,) for ctx in get_contexts()]
+
+def convolve2d_full(a, b):
+    s = [n + m - 1 for n, m in zip(a.shape, b.shape)]
+    return np.fft.irfft2(np.fft.rfft2(a, s) * np.fft.rfft2(b, s), s)
+
+class test_convolve(unittest.TestCase):
+
+    @parameterized.expand(contexts)
+    def test_fftconvolve_1d(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        nd_a = np.random.normal(size=100).astype(np.float32)
+        nd_b = np.random.normal(size=11).astype(np.float32)
+        a = cla.to_device(queue, nd_a)
+        b = cla.to_device(queue, nd_b)
+        for mode in ('full', 'same', 'valid'):
+            result = fftconvolve(a, b, mode=mode)
+            assert np.allclose(result.get(), np.convolve(nd_a, nd_b, mode), rtol=1e-3, atol=1e-3)
+        for fast_len in (False, 'measure'):
+            result = fftconvolve(a, b, fast_len=fast_len)
+            assert np.allclose(result.get(), np.convolve(nd_a, nd_b), rtol=1e-3, atol=1e-3)
+
+    @parameterized.expand(contexts)
+    def test_fftconvolve_2d_batched(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        nd_a = np.random.normal(size=(3, 30, 20)).astype(np.float32)
+        nd_b = np.random.normal(size=(1, 5, 7)).astype(np.float32)
+        a = cla.to_device(queue, nd_a)
+        b = cla.to_device(queue, nd_b)
+        result = fftconvolve(a, b, axes=(1, 2))
+        self.assertEqual(result.shape, (3, 34, 26))
+        for i in range(3):
+            assert np.allclose(result.get()[i], convolve2d_full(nd_a[i], nd_b[0]), rtol=1e-3, atol=1e-3)
+
+    @parameterized.expand(contexts)
+    def test_correlate_complex(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        nd_a = (np.random.normal(size=50) + 1j*np.random.normal(size=50)).astype(np.complex64)
+        nd_b = (np.random.normal(size=9) + 1j*np.random.normal(size=9)).astype(np.complex64)
+        a = cla.to_device(queue, nd_a)
+        b = cla.to_device(queue, nd_b)
+        for mode in ('full', 'same', 'valid'):
+            result = correlate(a, b, mode=mode)
+            assert np.allclose(result.get(), np.correlate(nd_a, nd_b, mode), rtol=1e-3, atol=1e-3)
+
+    @parameterized.expand(contexts)
+    def test_fftconvolve_reuses_plans(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        nd_a = np.random.normal(size=(4, 77)).astype(np.float32)
+        a = cla.to_device(queue, nd_a)
+        plan_cache.clear()
+        fftconvolve(a, cla.to_device(queue, np.random.normal(size=(1, 13)).astype(np.float32)), axes=(1,))
+        misses = plan_cache.misses
+        nd_b = np.random.normal(size=(1, 13)).astype(np.float32)
+        result = fftconvolve(a, cla.to_device(queue, nd_b), axes=(1,))
+        self.assertEqual(plan_cache.misses, misses)
+        for i in range(4):
+            assert np.allclose(result.get()[i], np.convolve(nd_a[i], nd_b[0]), rtol=1e-3, atol=1e-3)
+
+    @parameterized.expand(contexts)
+    def test_block_convolution(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        nd_signal = np.random.normal(size=(2, 5000)).astype(np.float32)
+        nd_kernel = np.random.normal(size=31).astype(np.float32)
+        signal = cla.to_device(queue, nd_signal)
+        kernel = cla.to_device(queue, nd_kernel)
+        for method in ('save', 'add'):
+            convolution = BlockConvolution(ctx, queue, kernel, fft_size=128, method=method, n_blocks=8)
+            result = convolution(signal)
+            for i in range(2):
+                assert np.allclose(result.get()[i], np.convolve(nd_signal[i], nd_kernel),
+                                   rtol=1e-3, atol=1e-3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+from __future__ import print_function
+import unittest
+from parameterized import parameterized
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from gpyfft import FFT
+import gpyfft.gpyfftlib as gfft
+from gpyfft.cache import PlanSignature
+from gpyfft.cost import estimate, format_report
+from gpyfft.test.util import get_contexts
+
+contexts = [(ctx,) for ctx in get_contexts()]
+
+def signature(t_shape, strides, batch_size=1, layouts=None):
+    if layouts is None:
+        layouts = (gfft.clfftLayout_.CLFFT_COMPLEX_INTERLEAVED,)*2
+    return PlanSignature(t_shape=t_shape, strides_in=strides, strides_out=strides,
+                         distances=(0, 0), batch_size=batch_size,
+                         precision=gfft.clfftPrecision_.CLFFT_SINGLE, layouts=layouts,
+                         inplace=False, scales=None, callbacks=None)
+
+class test_cost(unittest.TestCase):
+
+    def test_estimate(self):
+        e = estimate(signature((1024,), (1,), batch_size=8))
+        self.assertEqual(e['passes'], 1)
+        self.assertEqual(e['flops'], 5*1024*10*8)
+        self.assertEqual(e['bytes'], 2*8*1024*8)
+        self.assertEqual(e['issues'], [])
+
+        e = estimate(signature((2**16,), (1,)))
+        self.assertEqual(e['axis_passes'], [2])
+        self.assertEqual(e['bytes'], 4*8*2**16) #input, output, intermediate written and read
+
+        real = estimate(signature((1024,), (1,), layouts=(gfft.clfftLayout_.CLFFT_REAL,
+                                                         gfft.clfftLayout_.CLFFT_HERMITIAN_INTERLEAVED)))
+        self.assertEqual(real['io_bytes'], 4*1024 + 8*513)
+
+    def test_stride_issues(self):
+        self.assertEqual(len(estimate(signature((1024, 1024), (1, 1024)))['issues']), 2)
+        self.assertEqual(estimate(signature((1024, 1024), (1, 1025)))['issues'], [])
+
+    @parameterized.expand(contexts)
+    def test_report(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        data = cla.to_device(queue, np.random.rand(64, 1024).astype(np.complex64))
+        transform = FFT(ctx, queue, data, axes=(-1,))
+        report = transform.report(n_run=5)
+        self.assertEqual(report['passes'], 1)
+        self.assertIn(report['bound'], ('memory', 'compute'))
+        self.assertTrue(report['time_ms'] > 0)
+        self.assertTrue(0 < report['efficiency'])
+        format_report(report)
+
+        report = transform.report(measure=False, peaks=dict(gbps=100., gflops=1000.))
+        self.assertEqual(report['bound'], 'memory')
+        self.assertNotIn('time_ms', report)
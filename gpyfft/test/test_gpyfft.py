@@ -1,10 +1,12 @@
 from __future__ import print_function
 import unittest
+import threading
 from parameterized import parameterized
 import numpy as np
 import pyopencl as cl
 import pyopencl.array as cla
 from gpyfft import FFT
+from gpyfft.arrays import empty_padded, padded_shape, complex_view
 from gpyfft.test.util import get_contexts, has_double
 
 
@@ -151,5 +153,191 @@ class test_fft(unittest.TestCase):
                            rtol=1e-8, atol=1e-8)
 
 
+    @parameterized.expand(contexts)
+    def test_4d_out_of_place(self, ctx):
+        queue = cl.CommandQueue(ctx)
+
+        shape = (6, 8, 4, 16)
+        nd_data = (np.random.normal(size=shape) + 1j*np.random.normal(size=shape)).astype(np.complex64)
+        cl_data = cla.to_device(queue, nd_data)
+        cl_data_transformed = cla.zeros_like(cl_data)
+
+        transform = FFT(ctx, queue,
+                        cl_data,
+                        cl_data_transformed,
+                        )
+        self.assertEqual(len(transform.stages), 2)
+        transform.enqueue()
+
+        assert np.allclose(cl_data_transformed.get(),
+                           np.fft.fftn(nd_data),
+                           rtol=1e-3, atol=1e-3)
+
+        transform.enqueue(forward=False)
+        assert np.allclose(cl_data_transformed.get(),
+                           nd_data,
+                           rtol=1e-3, atol=1e-3)
+
+    @parameterized.expand(contexts)
+    def test_4d_real_to_complex(self, ctx):
+        queue = cl.CommandQueue(ctx)
+
+        shape = (6, 8, 4, 16)
+        nd_data = np.random.normal(size=shape).astype(np.float32)
+        cl_data = cla.to_device(queue, nd_data)
+        cl_data_transformed = cla.zeros(queue, (6, 8, 4, 9), dtype = np.complex64)
+
+        transform = FFT(ctx, queue,
+                        cl_data,
+                        cl_data_transformed,
+                        axes = (3, 2, 1, 0),
+                        )
+        transform.enqueue()
+
+        assert np.allclose(cl_data_transformed.get(),
+                           np.fft.rfftn(nd_data),
+                           rtol=1e-3, atol=1e-3)
+
+    @parameterized.expand(contexts)
+    def test_2d_planar(self, ctx):
+        queue = cl.CommandQueue(ctx)
+
+        shape = (16, 32)
+        nd_re = np.random.normal(size=shape).astype(np.float32)
+        nd_im = np.random.normal(size=shape).astype(np.float32)
+        cl_data = (cla.to_device(queue, nd_re), cla.to_device(queue, nd_im))
+        cl_data_transformed = (cla.zeros_like(cl_data[0]), cla.zeros_like(cl_data[1]))
+
+        transform = FFT(ctx, queue,
+                        cl_data,
+                        cl_data_transformed,
+                        )
+        transform.enqueue()
+
+        nd_result = np.fft.fft2(nd_re + 1j*nd_im)
+        assert np.allclose(cl_data_transformed[0].get(), nd_result.real, rtol=1e-3, atol=1e-3)
+        assert np.allclose(cl_data_transformed[1].get(), nd_result.imag, rtol=1e-3, atol=1e-3)
+
+    @parameterized.expand(contexts)
+    def test_1d_real_to_complex_planar(self, ctx):
+        queue = cl.CommandQueue(ctx)
+
+        N = 32
+        nd_data = np.random.normal(size=N).astype(np.float32)
+        cl_data = cla.to_device(queue, nd_data)
+        cl_data_transformed = (cla.zeros(queue, (N//2+1,), np.float32),
+                               cla.zeros(queue, (N//2+1,), np.float32))
+
+        transform = FFT(ctx, queue,
+                        cl_data,
+                        cl_data_transformed,
+                        )
+        transform.enqueue()
+
+        nd_result = np.fft.rfft(nd_data)
+        assert np.allclose(cl_data_transformed[0].get(), nd_result.real, rtol=1e-3, atol=1e-3)
+        assert np.allclose(cl_data_transformed[1].get(), nd_result.imag, rtol=1e-3, atol=1e-3)
+
+    @parameterized.expand(contexts)
+    def test_2d_real_to_complex_inplace(self, ctx):
+        queue = cl.CommandQueue(ctx)
+
+        M = 16
+        N = 30
+        nd_data = np.random.normal(size=(M, N)).astype(np.float32)
+        nd_storage = np.zeros(padded_shape((M, N)), np.float32)
+        nd_storage[:, :N] = nd_data
+        cl_data = empty_padded(queue, (M, N))
+        cl.enqueue_copy(queue, cl_data.base_data, nd_storage)
+
+        transform = FFT(ctx, queue, cl_data, axes=(1, 0))
+        self.assertIs(transform.result.base_data, cl_data.base_data)
+        transform.enqueue()
+
+        cl.enqueue_copy(queue, nd_storage, cl_data.base_data)
+        assert np.allclose(nd_storage.view(np.complex64),
+                           np.fft.rfft2(nd_data),
+                           rtol=1e-3, atol=1e-3)
+
+        # complex-to-real, in-place
+        transform = FFT(ctx, queue, complex_view(cl_data), axes=(1, 0), real=True)
+        transform.enqueue(forward=False)
+
+        cl.enqueue_copy(queue, nd_storage, cl_data.base_data)
+        assert np.allclose(nd_storage[:, :N], nd_data, rtol=1e-3, atol=1e-3)
+
+    @parameterized.expand(contexts)
+    def test_enqueue_many(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        nd_data = np.random.normal(size=(5, 4, 64)).astype(np.complex64)
+        cl_data = cla.to_device(queue, nd_data)
+        cl_result = cla.zeros_like(cl_data)
+        transform = FFT(ctx, queue, cl_data[0], cl_result[0], axes=(1,))
+        events = transform.enqueue_many([(cl_data[i], cl_result[i]) for i in range(5)])
+        self.assertEqual(len(events), 1)
+        events[0].wait()
+        assert np.allclose(cl_result.get(), np.fft.fft(nd_data, axis=2), rtol=1e-3, atol=1e-3)
+
+        # in-place
+        transform = FFT(ctx, queue, cl_data[0], axes=(1,))
+        transform.enqueue_many([(cl_data[i], None) for i in range(5)])
+        assert np.allclose(cl_data.get(), np.fft.fft(nd_data, axis=2), rtol=1e-3, atol=1e-3)
+
+    @parameterized.expand(contexts)
+    def test_update_arrays(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        nd_data = np.random.normal(size=(6, 4, 64)).astype(np.complex64)
+        cl_ring = cla.to_device(queue, nd_data)
+        cl_result = cla.zeros_like(cl_ring)
+        transform = FFT(ctx, queue, cl_ring[0], cl_result[0], axes=(1,))
+        plan = transform.plan
+        for k in range(12):
+            i = k % 6
+            transform.update_arrays(cl_ring[i], cl_result[i])
+            transform.enqueue()
+        self.assertIs(transform.plan, plan)
+        # one sub-buffer for each slot with non-zero offset, reused
+        self.assertEqual(len(transform._sub_buffers), 2*5)
+        assert np.allclose(cl_result.get(), np.fft.fft(nd_data, axis=2), rtol=1e-3, atol=1e-3)
+        transform.clear_sub_buffers()
+        self.assertEqual(len(transform._sub_buffers), 0)
+
+        # cache size per transform
+        transform = FFT(ctx, queue, cl_ring[0], cl_result[0], axes=(1,), sub_buffer_cache_size=3)
+        for i in range(6):
+            transform.update_arrays(cl_ring[i], cl_result[i])
+            transform.enqueue()
+        self.assertEqual(len(transform._sub_buffers), 3)
+        self.assertEqual(FFT.sub_buffer_cache_size, 64)
+
+        self.assertRaises(AssertionError, transform.update_arrays, cl_ring[0, :2], cl_result[0, :2])
+        self.assertRaises(ValueError, transform.update_arrays, cl_ring[0], cl_ring[0])
+
+    @parameterized.expand(contexts)
+    def test_concurrent_enqueue(self, ctx):
+        nd_data = np.random.normal(size=(8, 64)).astype(np.complex64)
+        errors = []
+
+        def worker():
+            try:
+                queue = cl.CommandQueue(ctx)
+                cl_data = cla.to_device(queue, nd_data)
+                cl_result = cla.empty_like(cl_data)
+                transform = FFT(ctx, queue, cl_data, cl_result, axes=(1,))
+                for i in range(50):
+                    transform.enqueue()
+                assert np.allclose(cl_result.get(), np.fft.fft(nd_data, axis=1), rtol=1e-3, atol=1e-3)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+
+
 if __name__ == '__main__':
     unittest.main()
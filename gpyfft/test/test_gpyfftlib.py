@@ -1,5 +1,10 @@
 from __future__ import print_function
 import unittest
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 import numpy as np
 import pyopencl as cl
 import pyopencl.array as cla
@@ -10,6 +15,17 @@ from gpyfft.test.util import get_contexts
 Some basic tests
 """
 
+_bake_script = """
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from gpyfft import FFT
+from gpyfft.test.util import get_contexts
+ctx = get_contexts()[0]
+queue = cl.CommandQueue(ctx)
+FFT(ctx, queue, cla.zeros(queue, (4, 64), np.complex64), axes=(1,))
+"""
+
 class test_basic(unittest.TestCase):
     
     def test_basic(self):
@@ -17,6 +33,21 @@ class test_basic(unittest.TestCase):
         print('clFFT version:', G.get_version())
         del G
 
+    def test_kernel_cache_dir(self):
+        # clFFT is set up on import, bake a plan in a fresh process
+        cache_dir = tempfile.mkdtemp()
+        try:
+            env = dict(os.environ, GPYFFT_CACHE_DIR=cache_dir)
+            root = os.path.dirname(os.path.dirname(os.path.abspath(gpyfftlib.__file__)))
+            subprocess.check_call([sys.executable, '-c', _bake_script], env=env, cwd=root)
+            binaries = [name for path, dirs, files in os.walk(cache_dir) for name in files]
+            self.assertTrue(len(binaries) > 0)
+
+            # already initialized, other cache directory cannot take effect
+            self.assertRaises(RuntimeError, gpyfftlib.GpyFFT, cache_dir=cache_dir)
+        finally:
+            shutil.rmtree(cache_dir)
+
     #@unittest.skip('segfaults with pytest')
     def test_create_plan(self):
         G = gpyfftlib.GpyFFT()
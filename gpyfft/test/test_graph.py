@@ -0,0 +1,46 @@
+from __future__ import print_function
+import unittest
+from parameterized import parameterized
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from gpyfft import FFT
+from gpyfft.graph import Graph
+from gpyfft.test.util import get_contexts
+
+contexts = [(ctx,) for ctx in get_contexts()]
+
+class test_graph(unittest.TestCase):
+
+    @parameterized.expand(contexts)
+    def test_replay(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        scale = cl.Program(ctx, """
+            __kernel void scale(__global float2 *a, float s) { a[get_global_id(0)] *= s; }
+            """).build().scale
+
+        host_data = np.empty((4, 3, 32), np.complex64)
+        host_result = np.empty_like(host_data)
+        data = cla.empty(queue, host_data.shape, np.complex64)
+        result = cla.empty_like(data)
+        # sliced arrays: loop over enqueues of several offsets
+        forward = FFT(ctx, queue, data[:, 1:], result[:, 1:], axes=(2,))
+        inverse = FFT(ctx, queue, result[:, 1:], axes=(2,))
+
+        graph = Graph(queue)
+        graph.add_copy(data, host_data)
+        graph.add_copy(result, data)
+        graph.add_fft(forward)
+        graph.add_kernel(scale, (result.size,), None, result, np.float32(2))
+        graph.add_fft(inverse, forward=False)
+        graph.add_copy(host_result, result)
+        self.assertEqual(len(graph), 6)
+
+        for i in range(3):
+            host_data[:] = np.random.normal(size=host_data.shape) + 1j*np.random.normal(size=host_data.shape)
+            graph.replay().wait()
+            assert np.allclose(host_result, 2*host_data, rtol=1e-3, atol=1e-3)
+
+
+if __name__ == '__main__':
+    unittest.main()
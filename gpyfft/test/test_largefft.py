@@ -0,0 +1,34 @@
+from __future__ import print_function
+import unittest
+from parameterized import parameterized
+import numpy as np
+import pyopencl as cl
+from gpyfft.largefft import FourStepFFT, factor_four_step
+from gpyfft.test.util import get_contexts
+
+contexts = [(ctx,) for ctx in get_contexts()]
+
+class test_four_step(unittest.TestCase):
+
+    def test_factor(self):
+        self.assertEqual(factor_four_step(2**20), (1024, 1024))
+        self.assertEqual(factor_four_step(2*3*5*7*11*13), (165, 182))
+        self.assertRaises(ValueError, factor_four_step, 17*32)
+
+    @parameterized.expand(contexts)
+    def test_four_step(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        N = 2**12 * 3
+        nd_data = (np.random.normal(size=N) + 1j*np.random.normal(size=N)).astype(np.complex64)
+
+        # small tiles, incl. partial tiles
+        transform = FourStepFFT(ctx, queue, N, max_tile_bytes=5000)
+        result = transform.run(nd_data)
+        assert np.allclose(result, np.fft.fft(nd_data), rtol=1e-3, atol=1e-2)
+
+        result = transform.run(nd_data, forward=False)
+        assert np.allclose(result, np.fft.ifft(nd_data), rtol=1e-3, atol=1e-4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+from __future__ import print_function
+import unittest
+from parameterized import parameterized
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from gpyfft import numpy_fft
+from gpyfft.test.util import get_contexts
+
+contexts = [(ctx,) for ctx in get_contexts()]
+
+class test_numpy_fft(unittest.TestCase):
+
+    def assert_matches(self, result, expected):
+        self.assertEqual(result.shape, expected.shape)
+        assert np.allclose(result.get(), expected, rtol=1e-3, atol=1e-3)
+
+    @parameterized.expand(contexts)
+    def test_c2c(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        nd_data = np.random.normal(size=(8, 16, 32)).astype(np.complex64)
+        cl_data = cla.to_device(queue, nd_data)
+
+        self.assert_matches(numpy_fft.fft(cl_data), np.fft.fft(nd_data))
+        self.assert_matches(numpy_fft.ifft(cl_data, n=24), np.fft.ifft(nd_data, n=24))
+        self.assert_matches(numpy_fft.fft2(cl_data, norm='ortho'), np.fft.fft2(nd_data, norm='ortho'))
+        self.assert_matches(numpy_fft.fftn(cl_data, norm='forward'), np.fft.fftn(nd_data, norm='forward'))
+        self.assert_matches(numpy_fft.ifftn(cl_data, s=(10, 40), axes=(0, 2)),
+                            np.fft.ifftn(nd_data, s=(10, 40), axes=(0, 2)))
+
+        # input is not modified
+        assert np.all(cl_data.get() == nd_data)
+
+    @parameterized.expand(contexts)
+    def test_pools(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        other_queue = cl.CommandQueue(ctx)
+        nd_data = np.random.normal(size=(4, 32)).astype(np.complex64)
+
+        # one pool per context, also for arrays with pending events
+        cl_data = cla.empty(other_queue, nd_data.shape, np.complex64)
+        cl_data.set(nd_data, async_=True)
+        self.assert_matches(numpy_fft.fft(cl_data), np.fft.fft(nd_data))
+        self.assertIs(numpy_fft._allocator(queue), numpy_fft._allocator(other_queue))
+
+    @parameterized.expand(contexts)
+    def test_real(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        nd_data = np.random.normal(size=(16, 32)).astype(np.float32)
+        cl_data = cla.to_device(queue, nd_data)
+
+        self.assert_matches(numpy_fft.fft(cl_data), np.fft.fft(nd_data))
+        self.assert_matches(numpy_fft.rfft(cl_data), np.fft.rfft(nd_data))
+        self.assert_matches(numpy_fft.rfft2(cl_data, s=(16, 30)), np.fft.rfft2(nd_data, s=(16, 30)))
+
+        nd_spectrum = np.fft.rfftn(nd_data)
+        cl_spectrum = cla.to_device(queue, nd_spectrum.astype(np.complex64))
+        self.assert_matches(numpy_fft.irfftn(cl_spectrum), np.fft.irfftn(nd_spectrum))
+        self.assert_matches(numpy_fft.irfft(cl_spectrum, n=33), np.fft.irfft(nd_spectrum, n=33))
+
+
+if __name__ == '__main__':
+    unittest.main()
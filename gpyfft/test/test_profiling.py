@@ -0,0 +1,59 @@
+from __future__ import print_function
+import unittest
+import json
+from parameterized import parameterized
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from gpyfft import FFT
+from gpyfft import profiling
+from gpyfft.profiling import Profiler
+from gpyfft.test.util import get_contexts
+
+contexts = [(ctx,) for ctx in get_contexts()]
+
+class test_profiling(unittest.TestCase):
+
+    @parameterized.expand(contexts)
+    def test_profiler(self, ctx):
+        queue = cl.CommandQueue(ctx, properties=cl.command_queue_properties.PROFILING_ENABLE)
+        nd_data = np.random.rand(16, 1024).astype(np.complex64)
+        data = cla.to_device(queue, nd_data)
+        result = cla.empty_like(data)
+        transform = FFT(ctx, queue, data, result, axes=(-1,))
+
+        profiler = Profiler()
+        with profiler:
+            self.assertIs(profiling.active, profiler)
+            for i in range(10):
+                transform.enqueue()
+            transform.enqueue_many([(data, result)]*5)
+        self.assertIsNone(profiling.active)
+        transform.enqueue() #not recorded
+        queue.finish()
+
+        records = profiler.records()
+        self.assertEqual(len(records), 11)
+        for record in records:
+            self.assertTrue(record['end'] >= record['start'] >= record['queued'])
+
+        summary, = profiler.summary()
+        self.assertEqual(summary['count'], 15)
+        self.assertEqual(summary['signature'], transform.signature)
+        self.assertTrue(summary['p99_ms'] >= summary['p50_ms'] > 0)
+        self.assertTrue(summary['gflops'] > 0)
+
+        trace = json.loads(json.dumps(profiler.chrome_trace()))
+        self.assertEqual(len([e for e in trace['traceEvents'] if e.get('cat') == 'transform']), 11)
+
+    @parameterized.expand(contexts)
+    def test_no_profiling_queue(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        data = cla.zeros(queue, (4, 64), np.complex64)
+        transform = FFT(ctx, queue, data, axes=(-1,))
+        with Profiler() as profiler:
+            transform.enqueue()
+        summary, = profiler.summary()
+        self.assertEqual(summary['count'], 1)
+        self.assertIsNone(summary['p50_ms'])
+        self.assertTrue(summary['dispatch_us'] > 0)
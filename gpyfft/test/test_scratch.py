@@ -0,0 +1,63 @@
+from __future__ import print_function
+import gc
+import unittest
+from parameterized import parameterized
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from gpyfft import FFT
+from gpyfft.scratch import ScratchBuffer, scratch_buffer, scratch_footprint, _scratch_buffers
+from gpyfft.test.util import get_contexts
+
+contexts = [(ctx,) for ctx in get_contexts()]
+
+class test_scratch(unittest.TestCase):
+
+    @parameterized.expand(contexts)
+    def test_grow(self, ctx):
+        scratch = ScratchBuffer(ctx)
+        self.assertTrue(scratch.get(0) is None)
+        buf = scratch.get(1024)
+        self.assertTrue(scratch.get(512) is buf)
+        self.assertTrue(scratch.get(4096) is not buf)
+        self.assertEqual(scratch.size, 4096)
+
+    @parameterized.expand(contexts)
+    def test_shared_per_queue(self, ctx):
+        queue1 = cl.CommandQueue(ctx)
+        queue2 = cl.CommandQueue(ctx)
+        self.assertTrue(scratch_buffer(queue1) is scratch_buffer(queue1))
+        self.assertTrue(scratch_buffer(queue1) is not scratch_buffer(queue2))
+
+    @parameterized.expand(contexts)
+    def test_released_with_users(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        scratch = scratch_buffer(queue)
+        scratch.reserve(1024)
+        self.assertTrue(scratch_footprint() >= 1024)
+        key = queue.int_ptr
+        del scratch
+        gc.collect()
+        self.assertFalse(key in _scratch_buffers)
+
+    @parameterized.expand(contexts)
+    def test_other_queue_reused(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        queue_ooo = cl.CommandQueue(ctx, properties=cl.command_queue_properties.OUT_OF_ORDER_EXEC_MODE_ENABLE)
+        # large non-power-of-two transforms need a temporary buffer
+        for shape in [(3**9, 5**2*7), (2, 3**10), (2, 5**7)]:
+            cl_data = cla.zeros(queue, shape, np.complex64)
+            transform = FFT(ctx, queue, cl_data, axes=(1, 0) if shape[0] > 2 else (1,))
+            if transform.temp_size:
+                break
+        self.assertTrue(transform.temp_size > 0)
+        queue1, buf1 = transform._queue_temp_buffer(queue_ooo)
+        queue2, buf2 = transform._queue_temp_buffer(queue_ooo)
+        self.assertTrue(buf1 is not None)
+        self.assertTrue(buf1 is buf2)
+        self.assertTrue(buf1 is not transform.temp_buffer)
+        self.assertTrue(transform._queue_scratch[queue_ooo] is not transform._scratch)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+from __future__ import print_function
+import unittest
+from parameterized import parameterized
+import numpy as np
+import pyopencl as cl
+from gpyfft.shard import ShardedFFT, _split
+from gpyfft.test.util import get_contexts
+
+contexts = [(ctx,) for ctx in get_contexts()]
+
+class test_shard(unittest.TestCase):
+
+    def test_split(self):
+        self.assertEqual(_split(10, [1, 1, 1]), [4, 3, 3])
+        self.assertEqual(_split(10, [3, 1]), [8, 2])
+        self.assertEqual(sum(_split(101, [0.3, 0.5, 0.2])), 101)
+
+    @parameterized.expand(contexts)
+    def test_sharded(self, ctx):
+        # two queues on the same device act as two shards
+        queues = [cl.CommandQueue(ctx), cl.CommandQueue(ctx)]
+        nd_data = np.random.normal(size=(9, 32, 16)).astype(np.complex64)
+
+        transform = ShardedFFT(queues, nd_data.shape, nd_data.dtype)
+        transform.calibrate(n_run=2)
+        self.assertEqual(sum(shard.count for shard in transform.shards), 9)
+
+        transform.set(nd_data)
+        events = transform.enqueue()
+        self.assertEqual(len(events), len(transform.shards))
+        result = transform.get()
+        assert np.allclose(result, np.fft.fft2(nd_data), rtol=1e-3, atol=1e-3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+from __future__ import print_function
+import unittest
+from parameterized import parameterized
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from gpyfft import FFT
+from gpyfft.sizes import next_fast_len, is_supported, RADICES, storage_shape, empty, zeros, to_device
+from gpyfft.test.util import get_contexts
+
+contexts = [(ctx,) for ctx in get_contexts()]
+
+class test_sizes(unittest.TestCase):
+
+    def test_next_fast_len(self):
+        self.assertEqual([next_fast_len(n) for n in (1, 11, 13, 97, 1000, 1025)],
+                         [1, 12, 14, 98, 1000, 1029])
+        self.assertEqual([next_fast_len(n, radices=RADICES) for n in (11, 13, 97, 131)],
+                         [11, 13, 98, 132])
+        for n in range(1, 500):
+            m = next_fast_len(n)
+            self.assertTrue(m >= n and is_supported(m, (2, 3, 5, 7)))
+            self.assertFalse(any(is_supported(k, (2, 3, 5, 7)) for k in range(n, m)))
+        self.assertRaises(ValueError, next_fast_len, 100, radices=(2, 17))
+
+    def test_is_supported(self):
+        self.assertTrue(is_supported(2*3*5*7*11*13))
+        self.assertFalse(is_supported(17))
+        self.assertFalse(is_supported(0))
+
+    @parameterized.expand(contexts)
+    def test_measured(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        for real in (False, True):
+            n = next_fast_len(1000, real=real, queue=queue)
+            self.assertTrue(1000 <= n <= 1024 and is_supported(n))
+            self.assertEqual(next_fast_len(1000, real=real, queue=queue), n) #cached
+
+    def test_storage_shape(self):
+        self.assertEqual(storage_shape((256, 256, 256), np.complex64), (256, 257, 257))
+        self.assertEqual(storage_shape((256, 256, 256), np.float32, inplace=True), (256, 257, 258))
+        self.assertEqual(storage_shape((16, 1024, 1024), np.complex64, axes=(1, 2)), (16, 1024, 1025))
+        self.assertEqual(storage_shape((1024, 1024), np.complex64, axes=(1,)), (1024, 1024))
+        self.assertEqual(storage_shape((100, 100), np.complex64), (100, 100))
+        self.assertRaises(ValueError, storage_shape, (64, 64), np.float32, axes=(0,), inplace=True)
+
+    @parameterized.expand(contexts)
+    def test_padded_arrays(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        nd_data = np.random.normal(size=(4, 256, 256)).astype(np.complex64)
+        data = to_device(queue, nd_data, axes=(1, 2))
+        self.assertEqual(data.shape, nd_data.shape)
+        self.assertEqual(data.strides, (256*257*8, 257*8, 8))
+        result = zeros(queue, data.shape, data.dtype, axes=(1, 2))
+        transform = FFT(ctx, queue, data, result, axes=(2, 1))
+        self.assertIs(transform.data, data)
+        transform.enqueue()
+        storage = np.empty(storage_shape(data.shape, data.dtype, (1, 2)), data.dtype)
+        cl.enqueue_copy(queue, storage, result.base_data)
+        assert np.allclose(storage[:, :, :256], np.fft.fftn(nd_data, axes=(1, 2)), rtol=1e-3, atol=1e-2)
+
+        # in-place real
+        nd_real = np.random.normal(size=(128, 128)).astype(np.float32)
+        real = to_device(queue, nd_real, inplace=True, measure=True)
+        transform = FFT(ctx, queue, real)
+        transform.enqueue()
+        storage = np.empty(real.base_data.size//4, np.float32)
+        cl.enqueue_copy(queue, storage, real.base_data)
+        spectrum = transform.result
+        storage = storage.view(np.complex64)[:spectrum.shape[0]*spectrum.strides[0]//8]
+        storage = storage.reshape(spectrum.shape[0], -1)[:, :spectrum.shape[1]]
+        assert np.allclose(storage, np.fft.rfft2(nd_real), rtol=1e-3, atol=1e-2)
+
+        self.assertEqual(empty(queue, (8, 8), np.float32).shape, (8, 8))
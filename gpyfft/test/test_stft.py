@@ -0,0 +1,70 @@
+from __future__ import print_function
+import unittest
+from parameterized import parameterized
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from gpyfft.stft import STFT, stft, istft
+from gpyfft.callbacks import Power
+from gpyfft.test.util import get_contexts
+
+contexts = [(ctx,) for ctx in get_contexts()]
+
+def frames(x, frame_length, hop):
+    n_frames = 1 + (x.shape[-1] - frame_length)//hop
+    return np.stack([x[..., f*hop:f*hop + frame_length] for f in range(n_frames)], axis=-2)
+
+class test_stft(unittest.TestCase):
+
+    @parameterized.expand(contexts)
+    def test_stft(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        nd_signal = np.random.normal(size=(2, 1000)).astype(np.float32)
+        signal = cla.to_device(queue, nd_signal)
+        window = np.hanning(64)
+        for w in (None, window):
+            spectrum = stft(signal, 64, 16, window=w)
+            nd_frames = frames(nd_signal, 64, 16)
+            if w is not None:
+                nd_frames = nd_frames * w
+            self.assertEqual(spectrum.shape, (2, 59, 33))
+            assert np.allclose(spectrum.get(), np.fft.rfft(nd_frames), rtol=1e-3, atol=1e-3)
+
+    @parameterized.expand(contexts)
+    def test_spectrogram_int16(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        nd_signal = (1000*np.random.normal(size=4096)).astype(np.int16)
+        signal = cla.to_device(queue, nd_signal)
+        window = np.hanning(256)
+        power = cla.empty(queue, (31, 129), np.float32)
+        transform = STFT(ctx, queue, signal, 256, 128, window=window, post=[Power(out=power)])
+        transform.enqueue()
+        nd_power = abs(np.fft.rfft(frames(nd_signal.astype(np.float32), 256, 128)*window))**2
+        assert np.allclose(power.get(), nd_power, rtol=1e-3, atol=1e-5*nd_power.max())
+
+    @parameterized.expand(contexts)
+    def test_istft(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        nd_signal = np.random.normal(size=(3, 1024 + 3*128)).astype(np.float32)
+        signal = cla.to_device(queue, nd_signal)
+        window = np.hanning(512)
+        spectrum = stft(signal, 512, 128, window=window)
+        result = istft(spectrum, 128, window=window)
+        self.assertEqual(result.shape, signal.shape)
+        # first and last samples have window weight (close to) zero
+        assert np.allclose(result.get()[:, 128:-128], nd_signal[:, 128:-128], rtol=1e-3, atol=1e-3)
+
+    @parameterized.expand(contexts)
+    def test_istft_preserves_spectrum(self, ctx):
+        # non power of 2 complex-to-real transforms may overwrite their input
+        queue = cl.CommandQueue(ctx)
+        nd_signal = np.random.normal(size=(2, 1200)).astype(np.float32)
+        spectrum = stft(cla.to_device(queue, nd_signal), 240, 80, window=np.hanning(240))
+        nd_spectrum = spectrum.get()
+        result = istft(spectrum, 80, window=np.hanning(240))
+        result.finish()
+        assert np.all(spectrum.get() == nd_spectrum)
+
+
+if __name__ == '__main__':
+    unittest.main()
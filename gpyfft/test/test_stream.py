@@ -0,0 +1,36 @@
+from __future__ import print_function
+import unittest
+from parameterized import parameterized
+import numpy as np
+import pyopencl as cl
+from gpyfft.stream import StreamingFFT
+from gpyfft.test.util import get_contexts
+
+contexts = [(ctx,) for ctx in get_contexts()]
+
+class test_stream(unittest.TestCase):
+
+    @parameterized.expand(contexts)
+    def test_complex(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        nd_data = np.random.normal(size=(10, 64, 32)).astype(np.complex64)
+
+        transform = StreamingFFT(ctx, queue, nd_data.shape, nd_data.dtype, chunk_size=3)
+        result = transform.run(nd_data)
+        print('%.3f GB/s' % transform.last_gbps)
+
+        assert np.allclose(result, np.fft.fft2(nd_data), rtol=1e-3, atol=1e-3)
+
+    @parameterized.expand(contexts)
+    def test_real_to_complex(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        nd_data = np.random.normal(size=(7, 64)).astype(np.float32)
+
+        transform = StreamingFFT(ctx, queue, nd_data.shape, nd_data.dtype, chunk_size=2, n_slots=2)
+        result = transform.run(nd_data)
+
+        assert np.allclose(result, np.fft.rfft(nd_data), rtol=1e-3, atol=1e-3)
+
+
+if __name__ == '__main__':
+    unittest.main()
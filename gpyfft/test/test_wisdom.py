@@ -0,0 +1,88 @@
+from __future__ import print_function
+import os
+import tempfile
+import unittest
+from parameterized import parameterized
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from gpyfft import FFT
+from gpyfft.wisdom import Wisdom
+from gpyfft.cache import plan_cache
+from gpyfft.test.util import get_contexts
+
+contexts = [(ctx,) for ctx in get_contexts()]
+
+class test_wisdom(unittest.TestCase):
+
+    @parameterized.expand(contexts)
+    def test_tune(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        wisdom = Wisdom()
+
+        nd_data = np.random.normal(size=(4, 64, 32)).astype(np.complex64)
+        cl_data = cla.to_device(queue, nd_data)
+        cl_data_transformed = cla.zeros_like(cl_data)
+
+        transform = FFT(ctx, queue, cl_data, cl_data_transformed, axes=(1, 2),
+                        wisdom=wisdom, tune=True)
+        decision = wisdom.lookup(queue.device, cl_data, cl_data_transformed, (2, 1))
+        self.assertEqual(sorted(decision['axes']), [1, 2])
+
+        # tuning must not touch data
+        assert np.all(cl_data.get() == nd_data)
+
+        transform.enqueue()
+        assert np.allclose(cl_data_transformed.get(),
+                           np.fft.fft2(nd_data, axes=(1, 2)),
+                           rtol=1e-3, atol=1e-3)
+
+        fd, filename = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            wisdom.save(filename)
+            wisdom_loaded = Wisdom()
+            wisdom_loaded.load(filename)
+        finally:
+            os.remove(filename)
+        self.assertEqual(wisdom_loaded.lookup(queue.device, cl_data, cl_data_transformed, (1, 2)),
+                         decision)
+
+        # offset of arrays (e.g. slots of a ring buffer) does not matter
+        cl_ring = cla.zeros(queue, (2,) + nd_data.shape, np.complex64)
+        self.assertEqual(wisdom.lookup(queue.device, cl_ring[1], cl_data_transformed, (1, 2)),
+                         decision)
+
+    @parameterized.expand(contexts)
+    def test_tune_real(self, ctx):
+        queue = cl.CommandQueue(ctx)
+        wisdom = Wisdom()
+        plan_cache.clear()
+
+        # real-to-complex: hermitian axis 3 stays first
+        nd_data = np.random.normal(size=(4, 8, 16, 32)).astype(np.float32)
+        cl_data = cla.to_device(queue, nd_data)
+        cl_data_transformed = cla.zeros(queue, (4, 8, 16, 17), np.complex64)
+        transform = FFT(ctx, queue, cl_data, cl_data_transformed, axes=(3, 1, 2),
+                        wisdom=wisdom, tune=True)
+        decision = wisdom.lookup(queue.device, cl_data, cl_data_transformed, (3, 2, 1))
+        self.assertEqual(decision['axes'][0], 3)
+        self.assertEqual(len(plan_cache), 1) #plans of other candidates removed
+
+        transform.enqueue()
+        nd_transformed = np.fft.rfftn(nd_data, axes=(1, 2, 3))
+        assert np.allclose(cl_data_transformed.get(), nd_transformed, rtol=1e-3, atol=1e-3)
+
+        # complex-to-real
+        cl_result = cla.zeros_like(cl_data)
+        transform = FFT(ctx, queue, cl_data_transformed, cl_result, axes=(3, 2, 1), real=True,
+                        wisdom=wisdom, tune=True)
+        decision = wisdom.lookup(queue.device, cl_data_transformed, cl_result, (3, 1, 2), real=True)
+        self.assertEqual(decision['axes'][0], 3)
+
+        transform.enqueue()
+        assert np.allclose(cl_result.get(), nd_data, rtol=1e-3, atol=1e-3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,213 @@
+"""
+Empirical tuning of transform parameters ('wisdom').
+
+The order in which the axes of a multidimensional transform are
+processed has a large impact on performance (3x-4x), which depends on
+memory layout and device. `Wisdom.tune` measures all candidate axes
+orders on the actual device and records the fastest. `FFT` applies
+recorded decisions, wisdom can be saved to and loaded from a JSON file
+so that production processes do not need to measure again.
+
+Only parameters that do not change the result or its memory layout
+are tuned, i.e. the axes order. In-place vs. out-of-place, transposed
+output and padded strides are fixed by the arrays passed to `FFT`
+and are not candidates. For real-to-complex and complex-to-real transforms the
+first transform axis (the axis with hermitian symmetry) is kept fixed.
+Plans of candidates other than the fastest are removed from the plan
+cache after tuning.
+"""
+
+from __future__ import absolute_import, division, print_function
+import itertools
+import json
+import threading
+import timeit
+import numpy as np
+import pyopencl as cl
+import pyopencl.array as cla
+from .gpyfftlib import GpyFFT_Error
+from .arrays import _component
+from .cache import plan_cache
+from .callbacks import transform_dtype
+
+
+WISDOM_VERSION = 1
+
+
+def _layout(array):
+    if array is None:
+        return 'None'
+    if isinstance(array, tuple): #planar
+        return '(%s)' % ','.join(_layout(a) for a in array)
+    return '%s%s/%s' % (array.dtype.str, array.shape, array.strides) #offset does not change the plan
+
+
+def _kind(in_array, real):
+    """'r2c', 'c2r' or 'complex'"""
+    if real:
+        return 'c2r'
+    if not isinstance(in_array, tuple) and transform_dtype(in_array.dtype).kind == 'f':
+        return 'r2c'
+    return 'complex'
+
+
+def _plan_keys(context, queue, transform):
+    stages = [stage for stage, source, target in transform.stages] if transform.stages else [transform]
+    return set((context, queue.device, stage.signature) for stage in stages)
+
+
+class Wisdom(object):
+    """Collection of tuning decisions, keyed by device and transform signature"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock() #FFTs are also created by background bake threads
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    @staticmethod
+    def key(device, in_array, out_array=None, axes=None, real=False):
+        """key identifying a transform: device, array layouts and set of transform axes"""
+        ndim = _component(in_array).ndim
+        if axes is None:
+            axes = range(ndim)
+        axes = [int(a) % ndim for a in axes]
+        kind = _kind(in_array, real)
+        if kind != 'complex':
+            # first axis has to stay fixed for real transforms
+            axes = axes[:1] + sorted(axes[1:])
+        else:
+            axes = sorted(axes)
+        inplace = out_array is None or _component(in_array).base_data is _component(out_array).base_data
+        return '|'.join((device.name.strip(),
+                         device.driver_version.strip(),
+                         _layout(in_array),
+                         _layout(out_array),
+                         'inplace' if inplace else 'outofplace',
+                         kind,
+                         str(axes),
+                         ))
+
+    def lookup(self, device, in_array, out_array=None, axes=None, real=False):
+        """return recorded decision (dict) for transform, None if not known"""
+        key = self.key(device, in_array, out_array, axes, real)
+        with self._lock:
+            return self._entries.get(key)
+
+    def record(self, device, in_array, out_array, axes, real, decision):
+        key = self.key(device, in_array, out_array, axes, real)
+        with self._lock:
+            self._entries[key] = decision
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def save(self, filename):
+        """write wisdom to JSON file"""
+        with self._lock:
+            entries = dict(self._entries)
+        with open(filename, 'w') as f:
+            json.dump({'version': WISDOM_VERSION,
+                       'entries': entries},
+                      f, indent=1, sort_keys=True)
+
+    def load(self, filename):
+        """read wisdom from JSON file, merge with existing entries"""
+        with open(filename) as f:
+            data = json.load(f)
+        if data.get('version') != WISDOM_VERSION:
+            raise ValueError('unsupported wisdom version %s' % data.get('version'))
+        with self._lock:
+            self._entries.update(data['entries'])
+
+    def tune(self, context, queue, in_array, out_array=None, axes=None, real=False, n_run=10):
+        """measure all candidate axes orders for transform, record and return fastest
+
+        Transforms are performed on scratch arrays with the same
+        memory layout as `in_array` and `out_array`, their content
+        is not modified.
+
+        Returns
+        -------
+        decision : dict
+            'axes': fastest axes order, 'time_ms': time per transform
+        """
+        from .fft import FFT
+
+        ndim = _component(in_array).ndim
+        if axes is None:
+            axes = range(ndim)[::-1]
+        axes = [int(a) % ndim for a in axes]
+        if _kind(in_array, real) != 'complex':
+            candidates = [axes[:1] + list(p) for p in itertools.permutations(axes[1:])]
+        else:
+            candidates = [list(p) for p in itertools.permutations(axes)]
+
+        in_scratch, out_scratch = _scratch_like(context, queue, in_array, out_array)
+
+        cached = set(plan_cache.keys())
+        candidate_keys = {}
+        timings = []
+        for candidate in candidates:
+            try:
+                transform = FFT(context, queue, in_scratch, out_scratch,
+                                axes=candidate, real=real, wisdom=False)
+            except GpyFFT_Error:
+                continue
+            candidate_keys[tuple(candidate)] = _plan_keys(context, queue, transform)
+            transform.enqueue()[-1].wait() #warmup
+            tic = timeit.default_timer()
+            for i in range(n_run):
+                events = transform.enqueue()
+            for e in events:
+                e.wait()
+            toc = timeit.default_timer()
+            timings.append((1e3*(toc-tic)/n_run, candidate))
+
+        # remove plans of candidates from plan cache, except the fastest (used next)
+        t_ms, best = min(timings) if timings else (None, None)
+        for candidate, keys in candidate_keys.items():
+            if candidate != tuple(best or ()):
+                for key in keys - cached:
+                    plan_cache.discard(key)
+
+        if not timings:
+            raise RuntimeError('no valid transform configuration found')
+        decision = {'axes': best, 'time_ms': t_ms}
+        self.record(queue.device, in_array, out_array, axes, real, decision)
+        return decision
+
+
+def _scratch_like(context, queue, in_array, out_array):
+    """zero-filled arrays with same layout (and buffer sharing) as given arrays"""
+    def new_buffer(array):
+        size = array.base_data.size
+        buf = cl.Buffer(context, cl.mem_flags.READ_WRITE, size)
+        cl.enqueue_fill_buffer(queue, buf, np.uint8(0), 0, size)
+        return buf
+
+    def view(array, buf):
+        return cla.Array(queue, array.shape, array.dtype,
+                         strides=array.strides, data=buf, offset=array.offset)
+
+    buffers = {} #original -> scratch buffer, keeps buffer sharing
+
+    def scratch(array):
+        if isinstance(array, tuple): #planar
+            return tuple(scratch(a) for a in array)
+        buf = buffers.get(array.base_data.int_ptr)
+        if buf is None:
+            buf = buffers[array.base_data.int_ptr] = new_buffer(array)
+        return view(array, buf)
+
+    out_scratch = None
+    in_scratch = scratch(in_array)
+    if out_array is not None:
+        out_scratch = scratch(out_array)
+    return in_scratch, out_scratch
+
+
+wisdom = Wisdom()